@@ -0,0 +1,11 @@
+"""Benchmarks for the hot paths of the pipeline. These run offline, using the
+CIF files in `test/files/cif` and synthetic data built from fixed random
+seeds, so the numbers are comparable between runs on the same machine.
+
+Run them with::
+
+    python -m benchmarks.run
+
+which prints the results as JSON and compares them to the stored baseline in
+`benchmarks/baseline.json`. See `benchmarks.run` for the options.
+"""
@@ -0,0 +1,160 @@
+"""The benchmarks to run. Each benchmark is a function decorated with
+`benchmark` which does any setup needed and returns a function of no arguments
+to time. Setup is not included in the timings.
+"""
+
+import os
+import itertools as it
+import collections as coll
+
+from fr3d.cif.reader import Cif
+
+from pymotifs import models as mod
+from pymotifs.core import savers
+from pymotifs.utils import connectedsets as cs
+from pymotifs.utils.naming import Namer
+from pymotifs.nr.builder import Builder
+from pymotifs.nr import orderBySimilarity as obs
+from pymotifs.nr.groups.simplified import Grouper
+from pymotifs.units.distances import Loader as DistancesLoader
+from pymotifs.units.rotation import Loader as RotationLoader
+from pymotifs.chain_chain.comparison import Loader as ComparisonLoader
+
+from benchmarks import fixtures
+
+
+"""All known benchmarks in the order they were defined."""
+BENCHMARKS = coll.OrderedDict()
+
+
+def benchmark(name, repeat=5):
+    """Register a benchmark.
+
+    Parameters
+    ----------
+    name : str
+        The name to report results under.
+    repeat : int, optional
+        The number of times to time the function.
+    """
+
+    def decorator(fn):
+        BENCHMARKS[name] = (fn, repeat)
+        return fn
+    return decorator
+
+
+def parsed(pdb):
+    """Parse one of the fixture CIF files.
+    """
+
+    with open(os.path.join(fixtures.CIF_DIR, pdb + '.cif'), 'rb') as raw:
+        return Cif(raw).structure()
+
+
+@benchmark('stage.structure.1GID', repeat=3)
+def structure(env):
+    loader = RotationLoader(env.config, env.session)
+    return lambda: loader.structure('1GID')
+
+
+@benchmark('units.distances.data.1GID', repeat=3)
+def distances(env):
+    loader = DistancesLoader(env.config, env.session)
+    structure = parsed('1GID')
+    return lambda: list(loader.data(structure))
+
+
+@benchmark('units.rotation.data.1GID')
+def rotation(env):
+    loader = RotationLoader(env.config, env.session)
+    structure = parsed('1GID')
+    return lambda: list(loader.data(structure))
+
+
+@benchmark('chain_chain.calculate_discrepancy.1500')
+def discrepancy(env):
+    loader = ComparisonLoader(env.config, env.session)
+    c1, c2, r1, r2 = fixtures.matched_chains(1500)
+    info1 = {'name': 'A', 'chain_id': 1, 'model': 1}
+    info2 = {'name': 'B', 'chain_id': 2, 'model': 1}
+    return lambda: loader.calculate_discrepancy(info1, info2, 1,
+                                                c1, c2, r1, r2)
+
+
+@benchmark('nr.treePenalizedPathLength.60', repeat=3)
+def ordering(env):
+    matrix = fixtures.distance_matrix(60)
+    return lambda: obs.treePenalizedPathLength(matrix, 100, seed=1)
+
+
+@benchmark('utils.find_connected.20000')
+def connected(env):
+    graph = fixtures.connections(20000)
+    # find_connected modifies its input, so each run gets a fresh copy
+    return lambda: cs.find_connected(dict((k, set(v)) for k, v in
+                                          graph.items()))
+
+
+@benchmark('nr.Grouper.group.600', repeat=3)
+def grouping(env):
+    grouper = Grouper(env.config, env.session)
+    chains, alignments, discrepancies = fixtures.nr_chains(600)
+    return lambda: grouper.group(chains, alignments, discrepancies)
+
+
+@benchmark('utils.Namer.5000', repeat=3)
+def naming(env):
+    namer = Namer(env.config, env.session)
+    groups, parents, handles = fixtures.nr_release(5000)
+    return lambda: namer(groups, parents, set(handles))
+
+
+@benchmark('nr.Builder.filter_attach.2000', repeat=3)
+def nr_builder(env):
+    builder = Builder(env.config, env.session)
+    groups, parents = fixtures.nr_named_release(2000)
+    cutoffs = sorted(parents)
+    return lambda: builder.attach_parents(
+        builder.filter_groups(groups, cutoffs), parents)
+
+
+class CsvStage(object):
+    """The parts of an exporter the CsvSaver needs."""
+
+    headers = ['unit_id_1', 'unit_id_2', 'distance']
+    allow_no_data = False
+    compressed = False
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def filename(self, entry, **kwargs):
+        return os.path.join(self.directory, entry + '.csv')
+
+
+def distance_rows(offset, size):
+    return [{'unit_id_1': 'BENCH|1|A|G|%i' % (offset + index),
+             'unit_id_2': 'BENCH|1|A|C|%i' % (offset + index),
+             'distance': index / 7.0} for index in xrange(size)]
+
+
+@benchmark('savers.CsvSaver.20000')
+def csv_saver(env):
+    saver = savers.CsvSaver(env.config, env.session,
+                            stage=CsvStage(env.directory))
+    rows = distance_rows(0, 20000)
+    return lambda: saver('BENCH', rows)
+
+
+@benchmark('savers.DatabaseSaver.sqlite.5000', repeat=3)
+def database_saver(env):
+    loader = DistancesLoader(env.config, env.session)
+    saver = savers.DatabaseSaver(env.config, env.session, stage=loader)
+    offsets = it.count(0, 5000)
+
+    # Each run writes new rows so the primary keys never collide
+    def save():
+        rows = distance_rows(next(offsets), 5000)
+        saver('BENCH', [mod.UnitPairsDistances(**row) for row in rows])
+    return save
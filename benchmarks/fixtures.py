@@ -0,0 +1,391 @@
+"""Fixtures used by the benchmarks. This builds a configuration that points at
+the CIF files in `test/files/cif`, a SQLite database holding the tables the
+benchmarked stages write to, and synthetic data sets built from fixed seeds.
+"""
+
+import os
+import itertools as it
+import random
+import shutil
+import tempfile
+
+import numpy as np
+
+from sqlalchemy import Table
+from sqlalchemy import Column
+from sqlalchemy import Float
+from sqlalchemy import String
+from sqlalchemy import Integer
+from sqlalchemy import MetaData
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from pymotifs import config as conf
+from pymotifs import models as mod
+from pymotifs import schema
+
+
+"""The root of the repository."""
+BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+"""The directory with the fixture CIF files."""
+CIF_DIR = os.path.join(BASE, 'test', 'files', 'cif')
+
+"""The PDB ids of the fixture CIF files, from smallest to largest."""
+PDBS = ['124D', '1A34', '1GID']
+
+"""The schema snapshot used for the database, if it has been recorded."""
+SNAPSHOT = os.path.join(BASE, 'conf', 'schema.json')
+
+"""The seed used for all synthetic data."""
+SEED = 1
+
+
+def workspace():
+    """Create a temporary directory laid out like the pipeline expects, with
+    the fixture CIF files in `PDBFiles`.
+
+    Returns
+    -------
+    directory : str
+        The path to the temporary directory. The caller must remove it.
+    """
+
+    directory = tempfile.mkdtemp(prefix='pymotifs-benchmarks-')
+    pdb_files = os.path.join(directory, 'FR3D', 'PDBFiles')
+    os.makedirs(pdb_files)
+    for pdb in PDBS:
+        shutil.copy(os.path.join(CIF_DIR, pdb + '.cif'), pdb_files)
+    return directory
+
+
+def configuration(directory):
+    """Build a configuration for running stages in the given workspace.
+
+    Parameters
+    ----------
+    directory : str
+        A directory created by `workspace`.
+
+    Returns
+    -------
+    config : dict
+        The configuration to build stages with.
+    """
+
+    return conf.merge(conf.defaults(), {
+        'db': {'uri': 'sqlite:///' + os.path.join(directory, 'bench.db')},
+        'locations': {
+            'base': directory,
+            'cache': os.path.join(directory, 'cache'),
+            'fr3d_root': os.path.join(directory, 'FR3D'),
+        },
+    })
+
+
+def define_tables(metadata):
+    """Define the tables the benchmarked stages write to.
+
+    Parameters
+    ----------
+    metadata : MetaData
+        The metadata to attach the tables to.
+    """
+
+    Table('unit_pairs_distances', metadata,
+          Column('unit_id_1', String(30), primary_key=True),
+          Column('unit_id_2', String(30), primary_key=True),
+          Column('distance', Float))
+
+    cells = [Column('cell_%i_%i' % (i, j), Float)
+             for i in range(3) for j in range(3)]
+    Table('unit_rotations', metadata,
+          Column('unit_id', String(30), primary_key=True),
+          Column('pdb_id', String(4)),
+          *cells)
+
+
+def database(config):
+    """Create the SQLite database for the benchmarks and reflect it into
+    `pymotifs.models`. The full schema is created from the snapshot made by
+    `pipeline.py db snapshot` if there is one, otherwise only the tables the
+    benchmarks write to are.
+
+    Parameters
+    ----------
+    config : dict
+        The configuration from `configuration`.
+
+    Returns
+    -------
+    session_maker : sqlalchemy.orm.sessionmaker
+        A session maker bound to the database.
+    """
+
+    engine = create_engine(config['db']['uri'])
+    if os.path.exists(SNAPSHOT):
+        schema.create(engine, schema.load_snapshot(SNAPSHOT))
+    else:
+        metadata = MetaData()
+        define_tables(metadata)
+        metadata.create_all(engine)
+    mod.reflect(engine)
+    return sessionmaker(bind=engine)
+
+
+def distance_matrix(size, seed=SEED):
+    """Build a symmetric distance matrix between random points, like the
+    discrepancy matrices of an equivalence class.
+
+    Parameters
+    ----------
+    size : int
+        The number of rows and columns.
+
+    Returns
+    -------
+    matrix : numpy.array
+        A `size` x `size` matrix with a zero diagonal.
+    """
+
+    state = np.random.RandomState(seed)
+    points = state.rand(size, 5)
+    diff = points[:, np.newaxis, :] - points[np.newaxis, :, :]
+    return np.sqrt((diff ** 2).sum(axis=2))
+
+
+def rotations(size, state):
+    """Build random rotation matrices.
+    """
+
+    matrices = []
+    for _ in range(size):
+        q, r = np.linalg.qr(state.randn(3, 3))
+        matrices.append(q * np.sign(np.diag(r)))
+    return np.array(matrices)
+
+
+def matched_chains(size, seed=SEED):
+    """Build centers and rotations for two chains of matched nucleotides, the
+    second being a noisy rigid motion of the first.
+
+    Parameters
+    ----------
+    size : int
+        The number of matched nucleotides.
+
+    Returns
+    -------
+    data : tuple
+        The centers and rotations of both chains, as `c1, c2, r1, r2`.
+    """
+
+    state = np.random.RandomState(seed)
+    c1 = state.rand(size, 3) * 50.0
+    r1 = rotations(size, state)
+    motion = rotations(1, state)[0]
+    c2 = np.dot(c1, motion.T) + state.randn(size, 3) * 0.5
+    r2 = np.array([np.dot(motion, r) for r in r1])
+    return c1, c2, r1, r2
+
+
+def connections(size, links=2, seed=SEED):
+    """Build a random graph in the form given to
+    `pymotifs.utils.connectedsets.find_connected`.
+
+    Parameters
+    ----------
+    size : int
+        The number of vertices.
+    links : int
+        The number of random links from each vertex.
+
+    Returns
+    -------
+    graph : dict
+        A mapping from vertex to a set of connected vertices.
+    """
+
+    rand = random.Random(seed)
+    graph = {}
+    for vertex in range(size):
+        graph[vertex] = set(rand.randrange(size) for _ in range(links))
+    return graph
+
+
+def nr_chains(size, families=50, seed=SEED):
+    """Build synthetic IFEs, alignments and discrepancies in the form used by
+    `pymotifs.nr.groups.simplified.Grouper.group`. Chains are drawn from a
+    number of families, chains in the same family align and have low
+    discrepancies.
+
+    Parameters
+    ----------
+    size : int
+        The number of IFEs.
+    families : int
+        The number of families to draw them from.
+
+    Returns
+    -------
+    data : tuple
+        The chains, alignments and discrepancies.
+    """
+
+    rand = random.Random(seed)
+    chains = []
+    for index in range(size):
+        family = rand.randrange(families)
+        chains.append({
+            'id': '%04i|1|%s' % (index, chr(65 + family % 26)),
+            'db_id': index,
+            'family': family,
+            'name': 'chain-%i' % index,
+            'length': 40 + family * 3,
+            'bp': rand.randrange(40),
+            'resolution': 1.5 + rand.random() * 2,
+            'method': 'X-RAY DIFFRACTION',
+            'species': 500 + family % 7,
+        })
+
+    alignments = {}
+    discrepancies = {}
+    for chain1 in chains:
+        alignments[chain1['db_id']] = {}
+        discrepancies[chain1['db_id']] = {}
+        for chain2 in chains:
+            if chain1['family'] == chain2['family']:
+                alignments[chain1['db_id']][chain2['db_id']] = True
+                discrepancies[chain1['db_id']][chain2['db_id']] = \
+                    rand.random() * 0.5
+    return chains, alignments, discrepancies
+
+
+def nr_release(size, members=4, seed=SEED):
+    """Build two synthetic releases of NR classes in the form used by
+    `pymotifs.utils.naming.Namer`. The second release reuses most classes of
+    the first, some with members added or removed, and adds some new ones.
+
+    Parameters
+    ----------
+    size : int
+        The number of classes in each release.
+    members : int
+        The average number of members of each class.
+
+    Returns
+    -------
+    data : tuple
+        The classes, the parent classes and the set of known handles.
+    """
+
+    rand = random.Random(seed)
+    ids = it.count()
+
+    def member():
+        return {'id': 'IFE|%i' % next(ids)}
+
+    parents = []
+    for index in range(size):
+        count = rand.randint(1, 2 * members - 1)
+        parents.append({
+            'members': [member() for _ in range(count)],
+            'name': {'handle': '%05i' % index, 'version': 1},
+        })
+
+    groups = []
+    for parent in parents:
+        kept = [m for m in parent['members'] if rand.random() > 0.1]
+        if rand.random() < 0.1:
+            kept.append(member())
+        if kept:
+            groups.append({'members': kept})
+
+    while len(groups) < size:
+        groups.append({'members': [member() for _ in range(members)]})
+
+    handles = set(p['name']['handle'] for p in parents)
+    return groups, parents, handles
+
+
+def nr_named_release(size, members=6, cutoffs=None, seed=SEED):
+    """Build a synthetic release of named NR groups, as produced by
+    `pymotifs.nr.builder.Builder.name_groups`, and the classes of a parent
+    release for each resolution cutoff.
+
+    Parameters
+    ----------
+    size : int
+        The number of groups.
+    members : int
+        The average number of members of each group.
+    cutoffs : list, optional
+        The resolution cutoffs, defaults to
+        `pymotifs.constants.RESOLUTION_GROUPS`.
+
+    Returns
+    -------
+    data : tuple
+        The named groups and a dict from cutoff to the parent classes.
+    """
+
+    from pymotifs.constants import RESOLUTION_GROUPS
+
+    cutoffs = cutoffs or RESOLUTION_GROUPS
+    rand = random.Random(seed)
+    ids = it.count()
+
+    def chain(pdb, name):
+        length = rand.randint(20, 3000)
+        return {
+            'name': name,
+            'pdb': pdb,
+            'db_id': next(ids),
+            'sequence': ''.join(rand.choice('ACGU') for _ in range(length)),
+            'length': length,
+            'bp': rand.randint(0, length // 2),
+            'species': 562,
+            'method': 'X-RAY DIFFRACTION',
+            'resolution': rand.choice([None, rand.uniform(1.0, 30.0)]),
+            'is_integral': 1,
+            'is_accompanying': 0,
+        }
+
+    def member():
+        pdb = '%04X' % next(ids)
+        chains = [chain(pdb, name) for name in 'AB'[:rand.randint(1, 2)]]
+        return {
+            'id': '+'.join('%s|1|%s' % (pdb, c['name']) for c in chains),
+            'pdb': pdb,
+            'length': chains[0]['length'],
+            'bp': chains[0]['bp'],
+            'species': 562,
+            'method': 'X-RAY DIFFRACTION',
+            'resolution': chains[0]['resolution'],
+            'chains': chains,
+        }
+
+    parents = {}
+    for cutoff in cutoffs:
+        parents[cutoff] = []
+        for index in range(size):
+            parents[cutoff].append({
+                'members': [],
+                'name': {
+                    'class_id': len(parents) * size + index,
+                    'full': 'NR_%s_%05i.1' % (cutoff, index),
+                    'handle': '%05i' % index,
+                    'version': 1,
+                    'cutoff': cutoff,
+                },
+            })
+
+    groups = []
+    for index in range(size):
+        count = rand.randint(1, 2 * members - 1)
+        groups.append({
+            'members': [member() for _ in range(count)],
+            'name': {'handle': '%05i' % index, 'version': 2},
+            'parents': [parents['all'][index]],
+        })
+    return groups, parents
@@ -0,0 +1,199 @@
+"""Run the benchmarks and compare them to a stored baseline.
+
+    python -m benchmarks.run [--baseline FILE] [--output FILE]
+                             [--save-baseline] [--tolerance 0.25] [NAME...]
+
+Results are written as JSON, to stdout unless an output file is given. Each
+benchmark reports the min, median and mean time of its runs. If a baseline
+exists each result is compared to it using the median and the command exits
+with a non zero status if any benchmark is slower than the baseline by more
+than the tolerance. Baselines are only meaningful on the machine they were
+recorded on, use `--save-baseline` to record one.
+"""
+
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+
+import click
+
+from benchmarks import fixtures
+from benchmarks.cases import BENCHMARKS
+
+
+"""The default location of the stored baseline."""
+BASELINE = 'benchmarks/baseline.json'
+
+
+class Environment(object):
+    """The shared state all benchmarks are built with.
+
+    Attributes
+    ----------
+    directory : str
+        The temporary workspace.
+    config : dict
+        The configuration to build stages with.
+    session : sqlalchemy.orm.sessionmaker
+        A session maker for the SQLite database.
+    """
+
+    def __init__(self):
+        self.directory = fixtures.workspace()
+        self.config = fixtures.configuration(self.directory)
+        self.session = fixtures.database(self.config)
+
+    def close(self):
+        shutil.rmtree(self.directory)
+
+
+def timings(fn, repeat):
+    """Time a function several times.
+
+    Parameters
+    ----------
+    fn : function
+        The function to time.
+    repeat : int
+        How many times to run it.
+
+    Returns
+    -------
+    result : dict
+        The min, median and mean time in seconds and the number of runs.
+    """
+
+    times = []
+    for _ in xrange(repeat):
+        start = time.time()
+        fn()
+        times.append(time.time() - start)
+    times.sort()
+    return {
+        'runs': repeat,
+        'min': times[0],
+        'median': times[len(times) // 2],
+        'mean': sum(times) / len(times),
+    }
+
+
+def run(names):
+    """Run the requested benchmarks.
+
+    Parameters
+    ----------
+    names : list
+        The benchmarks to run, all are run if empty.
+
+    Returns
+    -------
+    results : dict
+        A mapping from benchmark name to its timings.
+    """
+
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        raise click.BadParameter("Unknown benchmarks %s" %
+                                 ', '.join(sorted(unknown)))
+
+    env = Environment()
+    results = {}
+    try:
+        for name, (builder, repeat) in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            click.echo("Running %s" % name, err=True)
+            results[name] = timings(builder(env), repeat)
+    finally:
+        env.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Compare results to a baseline.
+
+    Parameters
+    ----------
+    results : dict
+        The results from `run`.
+    baseline : dict
+        The stored baseline results.
+    tolerance : float
+        The fraction a benchmark may be slower than the baseline.
+
+    Returns
+    -------
+    comparison : dict
+        A mapping from benchmark name to the ratio of its median time to that
+        of the baseline, and a flag for a regression. Benchmarks without a
+        baseline are left out.
+    """
+
+    comparison = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['median'] / max(baseline[name]['median'], 1e-9)
+        comparison[name] = {
+            'ratio': ratio,
+            'regression': ratio > 1.0 + tolerance,
+        }
+    return comparison
+
+
+@click.command(context_settings={'help_option_names': ['-h', '--help']})
+@click.option('--baseline', default=BASELINE, type=click.Path(dir_okay=False),
+              help='Baseline file to compare with')
+@click.option('--output', default=None, type=click.Path(dir_okay=False),
+              help='File to write results to')
+@click.option('--save-baseline', is_flag=True, default=False,
+              help='Store these results as the new baseline')
+@click.option('--tolerance', default=0.25, type=float,
+              help='Allowed slowdown relative to the baseline')
+@click.argument('names', nargs=-1)
+def main(baseline, output, save_baseline, tolerance, names):
+    """Run the pipeline benchmarks."""
+
+    logging.basicConfig(level=logging.ERROR)
+    results = run(names)
+
+    stored = {}
+    try:
+        with open(baseline, 'rb') as raw:
+            stored = json.load(raw)['results']
+    except IOError:
+        click.echo("No baseline at %s" % baseline, err=True)
+
+    comparison = compare(results, stored, tolerance)
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.node(),
+        'results': results,
+        'comparison': comparison,
+    }
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output:
+        with open(output, 'wb') as out:
+            out.write(text + '\n')
+    else:
+        click.echo(text)
+
+    if save_baseline:
+        with open(baseline, 'wb') as out:
+            json.dump({'machine': report['machine'], 'results': results}, out,
+                      indent=2, sort_keys=True)
+            out.write('\n')
+
+    regressions = sorted(n for n, c in comparison.items() if c['regression'])
+    if regressions and not save_baseline:
+        click.echo("Slower than baseline: %s" % ', '.join(regressions),
+                   err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -25,7 +25,9 @@ from pymotifs.email import Emailer
 from pymotifs import correct as _correct
 from pymotifs import models as mod
 from pymotifs import config as conf
+from pymotifs import schema as _schema
 from pymotifs import transfer as _transfer
+from pymotifs.core import metrics
 from pymotifs.version import __VERSION__
 from pymotifs.dispatcher import Dispatcher
 
@@ -54,7 +56,12 @@ def run(ctx, name, ids, config=None, engine=None, **kwargs):
     if kwargs.get('seed', None) is not None:
         random.seed(kwargs['seed'])
 
-    mod.reflect(engine)
+    metrics.recorder.instrument(engine)
+    if kwargs.get('metrics_file'):
+        metrics.recorder.open(kwargs['metrics_file'])
+
+    mod.reflect(engine, cache=config['locations']['cache'])
+    _schema.create_declared(engine)
 
     if kwargs.get('redo', False) is True:
         kwargs['recalculate'] = '.'
@@ -95,6 +102,7 @@ def run(ctx, name, ids, config=None, engine=None, **kwargs):
         logging.exception(error)
         ctx.exit(1)
     finally:
+        metrics.recorder.close()
         if kwargs['email']:
             mailer(name, ids=ids, error=error, **kwargs)
 
@@ -113,6 +121,11 @@ def run(ctx, name, ids, config=None, engine=None, **kwargs):
 @click.option('--email/--no-email', default=True, help='Send email')
 @click.option('--send-to', default=None, type=str,
               help='Set to address for emails')
+@click.option('--metrics-file', type=click.Path(dir_okay=False, resolve_path=True),
+              help="JSON lines file to write stage timings to")
+@click.option('--engine', 'engine_uri', default=None, type=str,
+              help="Database uri to use instead of the configured one, "
+              "like sqlite:///local.db")
 @click.version_option(__VERSION__)
 @click.pass_context
 def cli(ctx, **options):
@@ -124,12 +137,14 @@ def cli(ctx, **options):
     setup.logs(options)
     ctx.objs = options
     config = conf.load(options['config'])
+    if options.get('engine_uri'):
+        config['db']['uri'] = options['engine_uri']
     ctx.objs.update({
         'config_filename': options['config'],
         'config': config,
-        'engine': create_engine(config['db']['uri'],
-                                pool_size=config['db']['pool_size'],
-                                max_overflow=config['db']['max_overflow'])
+        'engine': _schema.local_engine(config['db']['uri'],
+                                       pool_size=config['db']['pool_size'],
+                                       max_overflow=config['db']['max_overflow'])
     })
 
 
@@ -194,7 +209,7 @@ def explore(ctx, name, ids, recalculate=None, **kwargs):
     kwargs.update(ctx.parent.objs)
     engine = kwargs['engine']
     config = kwargs['config']
-    mod.reflect(engine)
+    mod.reflect(engine, cache=config['locations']['cache'], lazy=True)
 
     try:
         setup.expand_stage_pattern(name, 'recalculate', kwargs)
@@ -251,7 +266,9 @@ def list(ctx, **kwargs):
     of the 'update' stage.
     """
 
-    mod.reflect(ctx.parent.objs['engine'])
+    mod.reflect(ctx.parent.objs['engine'],
+                cache=ctx.parent.objs['config']['locations']['cache'],
+                lazy=True)
     formatter = click.HelpFormatter(width=90)
     formatter.write_dl((s[0], s[1]) for s in introspect.stages())
     click.echo(formatter.getvalue(), nl=False)
@@ -265,7 +282,9 @@ def about(ctx, name=None, **kwargs):
     for each stage with the given name.
     """
 
-    mod.reflect(ctx.parent.objs['engine'])
+    mod.reflect(ctx.parent.objs['engine'],
+                cache=ctx.parent.objs['config']['locations']['cache'],
+                lazy=True)
 
     info = introspect.get_stage_info(name)
     if not info:
@@ -607,13 +626,16 @@ def transfer_chain_chain(ctx):
 
 
 @transfer_chain_chain.command('export', short_help='Dump chain chain data')
+@click.option('--chunk-size', type=int, default=_transfer.chain_chain.CHUNK_SIZE,
+              help="Number of comparisons to write at once")
 @click.argument('filename')
 @click.pass_context
 def transfer_chain_chain_dump(ctx, **kwargs):
     """Export the chain chain data for import later. Chain-chain comparisions
     can take a long time to compute and so sometimes we want to transfer them
     between machines. This dumps the data into the given file for future
-    import.
+    import. The file is a gzip compressed, chunked format which is written and
+    read one chunk at a time.
     """
     kwargs.update(ctx.parent.objs)
     _transfer.chain_chain.dump(**kwargs)
@@ -635,3 +657,64 @@ def transfer_chain_chain_import(ctx, **kwargs):
     """
     kwargs.update(ctx.parent.objs)
     _transfer.chain_chain.load(**kwargs)
+
+
+@cli.group('db', short_help='Build a local copy of the database')
+@click.pass_context
+def db(ctx):
+    """Commands for creating a local stand-in for the pipeline database.
+
+    A snapshot of the schema is recorded from the live database, along with a
+    dump of the rows for a few PDBs. These can then be used to create an
+    equivalent SQLite database, which can be used with the --engine option to
+    run stages offline.
+    """
+    ctx.objs = ctx.parent.objs
+
+
+@db.command('snapshot', short_help='Record the database schema')
+@click.argument('filename', default='conf/schema.json')
+@click.pass_context
+def db_snapshot(ctx, filename, **kwargs):
+    """Record the schema of the configured database into a JSON snapshot.
+    """
+    _schema.save_snapshot(ctx.parent.objs['engine'], filename)
+
+
+@db.command('migrate', short_help='Create declared tables')
+@click.pass_context
+def db_migrate(ctx, **kwargs):
+    """Create the tables declared in pymotifs.models, such as
+    unit_atom_counts, which do not exist yet in the configured database. The
+    run command does this as well before running any stage.
+    """
+    _schema.create_declared(ctx.parent.objs['engine'])
+
+
+@db.command('dump', short_help='Dump fixture rows for some PDBs')
+@click.option('--table', multiple=True, type=str,
+              help='Table to dump all rows of')
+@click.argument('filename')
+@click.argument('ids', nargs=-1, type=PDB)
+@click.pass_context
+def db_dump(ctx, filename, ids, table=None, **kwargs):
+    """Dump all rows for the given PDBs from tables with a pdb_id column, as
+    well as all rows of the given tables.
+    """
+    _schema.dump(ctx.parent.objs['engine'], ids, filename, tables=table)
+
+
+@db.command('create', short_help='Create a local database')
+@click.option('--snapshot', required=True, type=FILE,
+              help="Schema snapshot to create tables from, as written by "
+              "'db snapshot'")
+@click.option('--fixtures', default=None, type=FILE,
+              help='Fixture dump to load')
+@click.argument('uri')
+@click.pass_context
+def db_create(ctx, uri, snapshot=None, fixtures=None, **kwargs):
+    """Create the database at the given uri, like sqlite:///local.db, from a
+    schema snapshot and load the fixture dump into it. No snapshot is shipped
+    with the code, one must first be recorded with 'db snapshot'.
+    """
+    _schema.build(uri, snapshot, fixtures=fixtures)
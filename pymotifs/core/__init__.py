@@ -10,6 +10,8 @@ db
     Common tools for interacting with the database.
 savers
     Classes that abstract away saving to databases and files.
+metrics
+    Recording of timings and row counts for each stage.
 stages
     The core classes and logic for all stages in the pipeline.
 """
@@ -0,0 +1,326 @@
+"""This module contains the tools for recording how long each part of the
+pipeline takes. For each entry a stage processes we record the time spent in
+`should_process`, `data`, `store` and so forth, the number and total time of
+database queries, the number of rows saved and the peak memory usage of the
+process. Each record is written as one line of JSON to a metrics file, if one
+is configured, and totals for each stage are kept so they can be summarized
+at the end of a run.
+
+The pipeline uses the single module level `recorder`. Recording is done
+against the entry currently being processed in the calling thread, anything
+measured outside of an entry only counts towards the stage totals.
+"""
+
+import json
+import time
+import logging
+import resource
+import threading
+import collections as coll
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+def peak_rss():
+    """Get the peak resident set size of this process.
+
+    Returns
+    -------
+    rss : int
+        The peak RSS in kilobytes.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Recorder(object):
+    """Collects metrics for all stages of a pipeline run.
+
+    Attributes
+    ----------
+    filename : str
+        The JSON lines file records are written to, None if records are only
+        summarized.
+    totals : collections.OrderedDict
+        A mapping from stage name to the summed metrics of that stage.
+    """
+
+    def __init__(self, filename=None):
+        self.logger = logging.getLogger(__name__)
+        self.filename = None
+        self.totals = coll.OrderedDict()
+        self._engines = set()
+        self._handle = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if filename:
+            self.open(filename)
+
+    def open(self, filename, mode='a'):
+        """Start writing records to the given file. Any previously opened file
+        is closed.
+
+        Parameters
+        ----------
+        filename : str
+            The file to write to.
+        mode : str, optional
+            The mode to open the file with, defaults to appending.
+        """
+
+        self.close()
+        self.filename = filename
+        self._handle = open(filename, mode)
+
+    def close(self):
+        """Close the metrics file, if any.
+        """
+
+        if self._handle is not None:
+            self._handle.close()
+        self._handle = None
+        self.filename = None
+
+    def reset(self):
+        """Forget all recorded totals.
+        """
+        self.totals = coll.OrderedDict()
+
+    @property
+    def current(self):
+        """The record of the entry being processed in this thread, if any."""
+        return getattr(self._local, 'record', None)
+
+    def _totals(self, stage):
+        if stage not in self.totals:
+            self.totals[stage] = {
+                'stage': stage,
+                'entries': 0,
+                'wall': 0.0,
+                'total': 0.0,
+                'timings': coll.defaultdict(float),
+                'queries': 0,
+                'query_time': 0.0,
+                'rows': 0,
+                'peak_rss': 0,
+            }
+        return self.totals[stage]
+
+    def write(self, record):
+        """Write a single record as a line of JSON, if there is a file to
+        write to.
+
+        Parameters
+        ----------
+        record : dict
+            The record to write.
+        """
+
+        if self._handle is None:
+            return
+        with self._lock:
+            self._handle.write(json.dumps(record, sort_keys=True))
+            self._handle.write('\n')
+            self._handle.flush()
+
+    def add(self, record):
+        """Add a completed entry record to the stage totals and write it out.
+
+        Parameters
+        ----------
+        record : dict
+            The record produced by `entry`.
+        """
+
+        with self._lock:
+            totals = self._totals(record['stage'])
+            totals['entries'] += 1
+            totals['total'] += record['total']
+            totals['queries'] += record['queries']
+            totals['query_time'] += record['query_time']
+            totals['rows'] += record['rows']
+            totals['peak_rss'] = max(totals['peak_rss'], record['peak_rss'])
+            for step, duration in record['timings'].items():
+                totals['timings'][step] += duration
+        self.write(record)
+
+    @contextmanager
+    def entry(self, stage, entry):
+        """Record metrics for processing a single entry of a stage. Everything
+        measured in this thread inside of this context is attributed to this
+        entry.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage.
+        entry : object
+            The entry being processed.
+
+        Yields
+        ------
+        record : dict
+            The record that is being filled in.
+        """
+
+        record = {
+            'type': 'entry',
+            'stage': stage,
+            'entry': str(entry),
+            'timings': coll.defaultdict(float),
+            'queries': 0,
+            'query_time': 0.0,
+            'rows': 0,
+        }
+        previous = self.current
+        self._local.record = record
+        start = time.time()
+        try:
+            yield record
+        finally:
+            record['total'] = time.time() - start
+            record['peak_rss'] = peak_rss()
+            self._local.record = previous
+            self.add(record)
+
+    @contextmanager
+    def stage(self, stage):
+        """Record the wall clock time of running an entire stage.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage.
+        """
+
+        start = time.time()
+        try:
+            yield
+        finally:
+            duration = time.time() - start
+            with self._lock:
+                self._totals(stage)['wall'] += duration
+            self.write({
+                'type': 'stage',
+                'stage': stage,
+                'wall': duration,
+                'peak_rss': peak_rss(),
+            })
+
+    @contextmanager
+    def timer(self, step):
+        """Time one step of processing the current entry. Nested or repeated
+        steps of the same name are summed.
+
+        Parameters
+        ----------
+        step : str
+            The name of the step, like 'data' or 'store'.
+        """
+
+        start = time.time()
+        try:
+            yield
+        finally:
+            record = self.current
+            if record is not None:
+                record['timings'][step] += time.time() - start
+
+    def rows(self, count):
+        """Record that some rows were written for the current entry.
+
+        Parameters
+        ----------
+        count : int
+            The number of rows written.
+        """
+
+        record = self.current
+        if record is not None:
+            record['rows'] += count
+
+    def query(self, duration):
+        """Record that a query was executed for the current entry.
+
+        Parameters
+        ----------
+        duration : float
+            How long the query took in seconds.
+        """
+
+        record = self.current
+        if record is not None:
+            record['queries'] += 1
+            record['query_time'] += duration
+
+    def _before_execute(self, conn, cursor, statement, parameters, context,
+                        executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.time())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        starts = conn.info.get('metrics_query_start')
+        if starts:
+            self.query(time.time() - starts.pop())
+
+    def instrument(self, engine):
+        """Listen to all queries executed with the given engine. Doing so more
+        than once for an engine has no effect.
+
+        Parameters
+        ----------
+        engine : sqlalchemy.engine.Engine
+            The engine to instrument.
+        """
+
+        if id(engine) in self._engines:
+            return
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+        self._engines.add(id(engine))
+
+    def summary(self):
+        """Summarize the recorded metrics for each stage.
+
+        Returns
+        -------
+        summary : list
+            A list of dicts, one per stage, sorted from the slowest to fastest
+            stage.
+        """
+
+        with self._lock:
+            stages = []
+            for totals in self.totals.values():
+                current = dict(totals)
+                current['timings'] = dict(totals['timings'])
+                stages.append(current)
+        return sorted(stages, key=lambda s: max(s['wall'], s['total']),
+                      reverse=True)
+
+    def log_summary(self, logger=None):
+        """Log a summary of all stages, and write it to the metrics file.
+
+        Parameters
+        ----------
+        logger : logging.Logger, optional
+            The logger to use, defaults to the logger of this module.
+        """
+
+        logger = logger or self.logger
+        for stage in self.summary():
+            steps = ', '.join('%s: %.2fs' % (k, v) for k, v in
+                              sorted(stage['timings'].items()))
+            logger.info("Stage %s: %.2fs over %i entries (%s); %i queries "
+                        "in %.2fs; %i rows written; peak RSS %i kB",
+                        stage['stage'], max(stage['wall'], stage['total']),
+                        stage['entries'], steps, stage['queries'],
+                        stage['query_time'], stage['rows'],
+                        stage['peak_rss'])
+            summary = dict(stage)
+            summary['type'] = 'summary'
+            self.write(summary)
+
+
+"""The recorder used by the pipeline."""
+recorder = Recorder()
@@ -18,6 +18,7 @@ from contextlib import contextmanager
 
 from pymotifs import utils as ut
 
+from pymotifs.core import metrics
 from pymotifs.core.base import Base
 from pymotifs.core.exceptions import InvalidState
 
@@ -103,14 +104,17 @@ class Saver(Base):
         if not isinstance(to_save, coll.Iterable) or isinstance(to_save, dict):
             to_save = [data]
 
-        saved = False
+        saved = 0
         for index, chunk in enumerate(ut.grouper(self.insert_max, to_save)):
             chunk = list(chunk)
             kwargs['index'] = index
             with self._writer(pdb, **kwargs) as writer:
                 for entry in chunk:
                     writer(entry)
-                    saved = True
+                    saved += 1
+
+        if not kwargs.get('dry_run'):
+            metrics.recorder.rows(saved)
 
         if not saved:
             if not self.allow_no_data:
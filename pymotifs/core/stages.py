@@ -10,6 +10,11 @@ import pickle
 import datetime
 from contextlib import contextmanager
 
+from sqlalchemy import and_
+from sqlalchemy import inspect
+from sqlalchemy import bindparam
+from sqlalchemy.orm import Mapper
+
 from fr3d.data import Structure
 from fr3d.cif.reader import Cif
 from fr3d.cif.reader import ComplexOperatorException
@@ -21,6 +26,7 @@ from pymotifs.core.exceptions import InvalidState
 from pymotifs import utils as ut
 from pymotifs import models as mod
 from pymotifs.core import savers
+from pymotifs.core import metrics
 
 # Files that should be skipped.  Add others as necessary, and note reason
 # for exclusion when known.
@@ -85,6 +91,45 @@ class Stage(base.Base):
         self.skip.update(self.__class__.skip)
         self.skip.update(kwargs.get('skip_pdbs', []))
 
+    @classmethod
+    def configured_dependencies(cls, config):
+        """Compute the stages this stage depends upon when run with the given
+        config. By default this is `dependencies`, stages which only need some
+        dependencies for some options override this.
+
+        Parameters
+        ----------
+        config : dict
+            The config the stage will be built with.
+
+        Returns
+        -------
+        dependencies : set
+            The stages this depends upon.
+        """
+        return cls.dependencies
+
+    @classmethod
+    def configured_option(cls, config, name):
+        """Get an option of this stage from a config, or the default for it,
+        without building the stage.
+
+        Parameters
+        ----------
+        config : dict
+            The config to look in.
+        name : str
+            The name of the option, which is also the name of the attribute
+            holding the default.
+
+        Returns
+        -------
+        value : object
+            The configured value or the default.
+        """
+        stage = cls.__module__.replace('pymotifs.', '')
+        return config.get(stage, {}).get(name, getattr(cls, name))
+
     @abc.abstractmethod
     def is_missing(self, entry, **kwargs):
         """Determine if we do not have any data. If we have no data then we
@@ -448,37 +493,45 @@ class Stage(base.Base):
 
         failed = []
         processed = []
+        recorder = metrics.recorder
         for index, entry in enumerate(entries):
             self.logger.info("Processing %s: %s/%s", entry, index + 1,
                              len(entries))
 
-            try:
-                if not self.should_process(entry, **kwargs):
-                    self.logger.debug("No need to process %s", entry)
-                    continue
-                self.process(entry, **kwargs)
-
-            except Skip as err:
-                self.logger.warn("Skipping entry %s. Reason %s",
-                                 str(entry), str(err))
-                continue
-
-            except Exception as err:
-                self.logger.error("Error raised in processing of %s", entry)
-                self.logger.exception(err)
-
+            with recorder.entry(self.name, entry):
                 try:
-                    self.remove(entry, **kwargs)
-                except Exception as err:
-                    raise InvalidState("Could not cleanup failed data %s",
-                                       entry)
-                else:
-                    failed.append(entry)
+                    with recorder.timer('should_process'):
+                        should = self.should_process(entry, **kwargs)
+                    if not should:
+                        self.logger.debug("No need to process %s", entry)
+                        continue
+                    with recorder.timer('process'):
+                        self.process(entry, **kwargs)
+
+                except Skip as err:
+                    self.logger.warn("Skipping entry %s. Reason %s",
+                                     str(entry), str(err))
                     continue
 
-            if self.mark:
-                self.mark_processed(entry, **kwargs)
-            processed.append(entry)
+                except Exception as err:
+                    self.logger.error("Error raised in processing of %s",
+                                      entry)
+                    self.logger.exception(err)
+
+                    try:
+                        with recorder.timer('remove'):
+                            self.remove(entry, **kwargs)
+                    except Exception as err:
+                        raise InvalidState("Could not cleanup failed data %s",
+                                           entry)
+                    else:
+                        failed.append(entry)
+                        continue
+
+                if self.mark:
+                    with recorder.timer('mark_processed'):
+                        self.mark_processed(entry, **kwargs)
+                processed.append(entry)
 
         if failed:
             ids = ' '.join(str(f) for f in failed)
@@ -572,9 +625,11 @@ class Loader(Stage):
                 self.logger.debug("Skipping removal in dry run")
             else:
                 self.logger.debug("Removing old data for %s", entry)
-                self.remove(entry)
+                with metrics.recorder.timer('remove'):
+                    self.remove(entry)
 
-        data = self.data(entry, **kwargs)
+        with metrics.recorder.timer('data'):
+            data = self.data(entry, **kwargs)
 
         if not data:
             if not self.allow_no_data:
@@ -584,7 +639,8 @@ class Loader(Stage):
                 self.logger.warning("No data produced for %s", str(entry))
                 return
 
-        self.store(entry, data, **kwargs)
+        with metrics.recorder.timer('store'):
+            self.store(entry, data, **kwargs)
 
 
 class SimpleLoader(Loader):
@@ -596,6 +652,9 @@ class SimpleLoader(Loader):
 
     __metaclass__ = abc.ABCMeta
 
+    delete_max = 1000
+    """ Max number of rows to delete at once. """
+
     def has_data(self, args, **kwargs):
         """Check if we already have data.
         """
@@ -605,27 +664,102 @@ class SimpleLoader(Loader):
     def remove(self, args, **kwargs):
         """This will delete all entries for the given arguments. If the keyword
         argument dry_run is given then this will not actually delete anything.
-        This will also check if there is nothing to delete and do nothing in
-        that case. This also deals with the fact that SQLalchemly does not
-        support joins in delete for mysql by finding all data, and then
-        deleting each entry. This is very slow but does allow us to use joins
-        in the query method.
+        SQLalchemy does not support joins in delete for mysql, so this finds
+        the primary keys of all entries the query selects and then deletes
+        them in chunks of `delete_max` keys, each chunk in its own
+        transaction to keep locks short. If the query does not select a
+        single table, or the model has relationships which cascade deletes,
+        this falls back to loading and deleting each entry through the
+        session, which is very slow but does allow the cascades to happen.
 
         :param args: The argument to remove, generally a PDB id.
+        :returns: The number of rows removed, or for a dry run the number of
+        rows which would be removed.
         """
 
         self.logger.info("Removing data for %s", str(args))
         if kwargs.get('dry_run'):
-            return True
+            with self.session() as session:
+                return self.query(session, args).count()
 
         with self.session() as session:
             query = self.query(session, args)
-            if not query.count():
-                self.logger.info("Nothing to delete for %s", str(args))
-                return True
+            mapper = self.bulk_mapper(query)
+            if mapper is None:
+                removed = 0
+                for row in query:
+                    session.delete(row)
+                    removed += 1
+            else:
+                keys = query.with_entities(*mapper.primary_key).\
+                    distinct().\
+                    order_by(*mapper.primary_key)
+                keys = [tuple(key) for key in keys]
+
+        if mapper is not None:
+            removed = self.delete_keys(mapper, keys)
+
+        if not removed:
+            self.logger.info("Nothing to delete for %s", str(args))
+        else:
+            self.logger.info("Removed %i rows for %s", removed, str(args))
+        return removed
+
+    def bulk_mapper(self, query):
+        """Find the mapper of the table the query selects, if the entries it
+        selects can be removed with a bulk delete. This is only possible if
+        the query selects a single model, which has a primary key and no
+        relationships that cascade deletes.
+
+        :param query: The query to examine.
+        :returns: The mapper of the selected model or None.
+        """
+
+        entities = query.column_descriptions
+        if len(entities) != 1:
+            return None
+
+        if entities[0]['aliased']:
+            return None
+
+        mapper = inspect(entities[0]['type'], raiseerr=False)
+        if not isinstance(mapper, Mapper) or not mapper.primary_key:
+            return None
 
-            for row in query:
-                session.delete(row)
+        if any(rel.cascade.delete for rel in mapper.relationships):
+            return None
+        return mapper
+
+    def delete_keys(self, mapper, keys):
+        """Delete all rows with the given primary keys from the table of the
+        mapper. The keys are deleted in order, in chunks of `delete_max`, and
+        each chunk is committed separately. Single column keys are deleted
+        with one IN query per chunk, composite keys with one executemany per
+        chunk.
+
+        :param mapper: The mapper of the table to delete from.
+        :param keys: A list of primary key tuples, sorted.
+        :returns: The number of rows deleted.
+        """
+
+        table = mapper.local_table
+        columns = mapper.primary_key
+        names = ['key_%i' % index for index in xrange(len(columns))]
+        composite = table.delete().\
+            where(and_(*[c == bindparam(n) for c, n in zip(columns, names)]))
+
+        removed = 0
+        for chunk in ut.grouper(self.delete_max, keys):
+            with self.session() as session:
+                if len(columns) == 1:
+                    values = [key[0] for key in chunk]
+                    query = table.delete().where(columns[0].in_(values))
+                    removed += session.execute(query).rowcount
+                else:
+                    params = [dict(zip(names, key)) for key in chunk]
+                    session.execute(composite, params)
+                    removed += len(chunk)
+        return removed
 
     @abc.abstractmethod
     def query(self, session, entry):
@@ -810,6 +944,47 @@ class Reporter(Exporter):
         'delimiter': "\t"
     }
 
+    chunk_size = 1000
+    """Number of rows to fetch from the database at once when streaming."""
+
+    progress_every = 100000
+    """Number of streamed rows between progress messages."""
+
+    def stream(self, query, chunk_size=None):
+        """Iterate over the rows of a query without loading all of them into
+        memory. This asks for a server side cursor and fetches `chunk_size`
+        rows at a time, which can be set with the 'chunk_size' option of the
+        stage. Reports are written as they are produced, so returning this
+        from `data`, or a generator built on it, keeps memory use bounded no
+        matter how large the report is. The query must be used inside the
+        session that created it.
+
+        Parameters
+        ----------
+        query : sqlalchemy.orm.Query
+            The query to run.
+        chunk_size : int, optional
+            The number of rows to fetch at once.
+
+        Yields
+        ------
+        row : dict
+            Each row as a dictionary.
+        """
+
+        if chunk_size is None:
+            chunk_size = self.config[self.name].get('chunk_size',
+                                                    self.chunk_size)
+        query = query.execution_options(stream_results=True).\
+            yield_per(chunk_size)
+
+        count = 0
+        for count, result in enumerate(query, 1):
+            yield ut.row2dict(result)
+            if not count % self.progress_every:
+                self.logger.info("Streamed %i rows", count)
+        self.logger.info("Streamed %i rows in total", count)
+
     @contextmanager
     def file_handle(self, *args, **kwargs):
         # if kwargs.get('filename', None):
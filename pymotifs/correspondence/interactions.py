@@ -1,8 +1,14 @@
 """Determine which interactions correspond in structures.
+
+The interactions of the query structure are loaded once, and each unit in them
+is given an integer index. Every pair of units is then a single integer key.
+The unit mappings to all corresponding structures are loaded with one query.
+The interactions of each corresponding structure are translated into the same
+keys, so matching is a lookup of integers and the query structure is never
+reloaded or rehashed per partner.
 """
 
 from pymotifs import core
-from pymotifs import models as mod
 
 from pymotifs.models import UnitPairsInteractions as Ints
 from pymotifs.models import CorrespondenceInteractions as CorrInts
@@ -13,69 +19,144 @@ from pymotifs.utils.correspondence import Helper
 class Loader(core.Loader):
 
     def interactions(self, pdb):
+        """Load all interactions in a structure.
+
+        :param str pdb: The pdb to load interactions for.
+        :returns: A list of (interaction id, unit id 1, unit id 2) tuples.
+        """
+
         with self.session() as session:
-            query = session.query(Ints.unit_pairs_interactions_id, Ints.unit_id_1, Ints.unit_id_2).\
+            query = session.query(Ints.unit_pairs_interactions_id,
+                                  Ints.unit_id_1,
+                                  Ints.unit_id_2).\
                 filter(Ints.pdb_id == pdb)
 
-            data = []
-            for result in query:
-                data.append({
-                    'id': result.id,
-                    'unit1': result.unit_id_1,
-                    'unit2': result.unit_id_2
-                })
-            return data
+            return [(result.unit_pairs_interactions_id,
+                     result.unit_id_1,
+                     result.unit_id_2) for result in query]
 
     def has_data(self, pdb, **kwargs):
         with self.session() as session:
             query = session.query(CorrInts).\
-                join(Ints, Ints.id == CorrInts.interaction_id_1).\
+                join(Ints,
+                     Ints.unit_pairs_interactions_id ==
+                     CorrInts.interaction_id_1).\
                 filter(Ints.pdb_id == pdb)
 
             return bool(query.count())
 
     def remove(self, pdb, **kwargs):
         with self.session() as session:
-            query = session.query(Ints).\
+            query = session.query(Ints.unit_pairs_interactions_id).\
                 filter(Ints.pdb_id == pdb)
-            ids = [result.id for result in query]
+            ids = [result.unit_pairs_interactions_id for result in query]
 
         with self.session() as session:
             session.query(CorrInts).\
-                filter(CorrInts.correspondence_interactions_id.in_(ids)).\
+                filter(CorrInts.interaction_id_1.in_(ids)).\
                 delete(synchronize_session=False)
 
-    def compare(self, corr_id, first, second, mapping):
+    def index(self, interactions):
+        """Give each unit in the interactions an integer index.
+
+        :param list interactions: The (id, unit1, unit2) interactions.
+        :returns: A dict from unit id to index.
+        """
+
+        index = {}
+        for _, unit1, unit2 in interactions:
+            index.setdefault(unit1, len(index))
+            index.setdefault(unit2, len(index))
+        return index
+
+    def encode(self, interactions, index):
+        """Compute the integer key of each interaction.
+
+        :param list interactions: The (id, unit1, unit2) interactions.
+        :param dict index: The index of each unit, from `index`.
+        :returns: A list of (interaction id, key, index1, index2) tuples.
+        """
+
+        size = len(index)
+        encoded = []
+        for inter_id, unit1, unit2 in interactions:
+            first = index[unit1]
+            second = index[unit2]
+            encoded.append((inter_id, first * size + second, first, second))
+        return encoded
+
+    def compare(self, encoded, second, mapping, index):
+        """Match the interactions of the query structure to those of a
+        corresponding one.
+
+        :param list encoded: The encoded query interactions, from `encode`.
+        :param list second: The (id, unit1, unit2) interactions of the
+        corresponding structure.
+        :param list mapping: The (correspondence id, query unit, other unit)
+        mapping between the structures.
+        :param dict index: The index of each query unit.
+        :returns: A generator of dicts to create CorrespondenceInteractions
+        from. Query interactions with no aligned unit are not included.
+        """
+
+        size = len(index)
+        translate = {}
+        corr_ids = {}
+        for corr_id, unit1, unit2 in mapping:
+            position = index.get(unit1)
+            if position is not None:
+                translate[unit2] = position
+                corr_ids[position] = corr_id
+
         known = {}
-        for interaction in second:
-            unit1 = interaction['unit1']
-            unit2 = interaction['unit2']
-            if unit1 in mapping and unit2 in mapping:
-                known[(mapping[unit1], mapping[unit2])] = interaction
-
-        for interaction in first:
-            data = {
+        for inter_id, unit1, unit2 in second:
+            first = translate.get(unit1)
+            other = translate.get(unit2)
+            if first is not None and other is not None:
+                known[first * size + other] = inter_id
+
+        for inter_id, key, first, other in encoded:
+            corr_id = corr_ids.get(first, corr_ids.get(other))
+            if corr_id is None:
+                continue
+
+            yield {
                 'correspondence_id': corr_id,
-                'interaction_id_1': interaction['id'],
-                'interaction_id_2': None
+                'interaction_id_1': inter_id,
+                'interaction_id_2': known.get(key),
             }
 
-            key = (interaction['unit1'], interaction['unit2'])
-            if key in known:
-                data['interaction_id_2'] = known[key]['id']
+    def matches(self, pdb1, partners, mappings):
+        """Match the interactions of a structure against all corresponding
+        structures. Each partner has its interactions loaded once.
+        """
+
+        interactions1 = self.interactions(pdb1)
+        index = self.index(interactions1)
+        encoded = self.encode(interactions1, index)
+        for pdb2 in partners:
+            interactions2 = self.interactions(pdb2)
+            for pair in self.compare(encoded, interactions2, mappings[pdb2],
+                                     index):
+                yield CorrInts(**pair)
+
+    def partners(self, pdb1):
+        """Find the other structures with a good alignment to the given one.
+        A structure aligned to itself, as when it has two copies of a chain,
+        is left out like in `Helper.pdb_mappings`.
+        """
 
-            yield data
+        util = self._create(Helper)
+        return [pdb2 for pdb2 in util.pdbs(pdb1) if pdb2 != pdb1]
 
     def data(self, pdb1, **kwargs):
+        partners = self.partners(pdb1)
+        if not partners:
+            raise core.Skip("No corresponding structures for %s" % pdb1)
 
-        util = Helper(self.session.maker)
-        for pdb2 in util.pdbs(pdb1):
-            corr_id, mapping = util.pdb_mapping(pdb1, pdb2)
-            if not mapping:
-                raise core.InvalidState("No mapping for %s %s", (pdb1, pdb2))
+        mappings = self._create(Helper).pdb_mappings(pdb1)
+        for pdb2 in partners:
+            if not mappings.get(pdb2):
+                raise core.InvalidState("No mapping for %s %s" % (pdb1, pdb2))
 
-            interactions1 = self.interactions(pdb1)
-            interactions2 = self.interactions(pdb2)
-            for pair in self.compare(corr_id, interactions1, interactions2,
-                                     mapping):
-                yield CorrInts(**pair)
+        return self.matches(pdb1, partners, mappings)
@@ -7,6 +7,7 @@ import logging
 import itertools as it
 
 from pymotifs import core
+from pymotifs.core import metrics
 from pymotifs.cli import introspect as intro
 
 from pymotifs.utils import flatten
@@ -98,7 +99,9 @@ class Dispatcher(object):
             if issubclass(current, core.StageContainer):
                 stack.extend(current.stages)
             else:
-                current_deps = [process_stage(s) for s in current.dependencies]
+                config = self._args[0] if self._args else {}
+                current_deps = current.configured_dependencies(config)
+                current_deps = [process_stage(s) for s in current_deps]
                 current_deps = flatten(current_deps)
                 current_deps = set(current_deps)
                 deps[current] = current_deps
@@ -198,6 +201,9 @@ class Dispatcher(object):
         will determine what stages to run using the name property and then run
         them in the correct order.
 
+        Once all stages have run, or one has failed, a summary of the time
+        spent in each stage is logged, see `pymotifs.core.metrics`.
+
         :param list entries: The entries to use as input.
         :kwargs: Keyword arguments to pass to each stage.
         """
@@ -206,13 +212,17 @@ class Dispatcher(object):
         self.logger.info('Running stages: %s',
                          ', '.join(s.name for s in stages))
 
-        for stage in stages:
-            try:
-                self.logger.info("Running stage: %s", stage.name)
-                stage(entries, **kwargs)
-            except Exception as err:
-                self.logger.error("Uncaught exception with stage: %s",
-                                  self.name)
-                raise err
+        try:
+            for stage in stages:
+                try:
+                    self.logger.info("Running stage: %s", stage.name)
+                    with metrics.recorder.stage(stage.name):
+                        stage(entries, **kwargs)
+                except Exception as err:
+                    self.logger.error("Uncaught exception with stage: %s",
+                                      self.name)
+                    raise err
+        finally:
+            metrics.recorder.log_summary(self.logger)
 
         self.logger.info("Finished pipeline")
@@ -6,21 +6,40 @@ experimental sequence data for RNA chains.
 import operator as op
 import itertools as it
 import functools as ft
+import collections as coll
 
 from pymotifs import core
 
 from pymotifs import models as mod
 
+from pymotifs.utils import grouper
 from pymotifs.utils.structures import Structure
 
 from pymotifs.chains.info import Loader as ChainLoader
 from pymotifs.exp_seq.info import Loader as InfoLoader
 
-from sqlalchemy import case
+"""The entity type of experimental sequences for each macromolecule type of
+chains."""
+SIMPLIFY_TYPE = {
+    'Polydeoxyribonucleotide (DNA)': 'dna',
+    'Polyribonucleotide (RNA)': 'rna',
+    'polyribonucleotide': 'rna',
+    'polydeoxyribonucleotide': 'dna',
+    'polydeoxyribonucleotide/polyribonucleotide hybrid': 'hybrid',
+    'DNA/RNA Hybrid': 'hybrid',
+}
 
 
 class Loader(core.SimpleLoader):
-    dependencies = set([ChainLoader, InfoLoader])    
+    dependencies = set([ChainLoader, InfoLoader])
+
+    resolve_max = 1000
+    """Max number of chains to resolve with each query."""
+
+    def __init__(self, *args, **kwargs):
+        super(Loader, self).__init__(*args, **kwargs)
+        self._pending = []
+        self._exp_ids = {}
 
     def to_process_old(self, pdbs, **kwargs):
         """Compute all chain ids to process. This will extract all rna chain
@@ -80,7 +99,10 @@ class Loader(core.SimpleLoader):
             for result in query:
                 entry = result.chain_id
                 chain_id.append(entry)
-            return sorted(set(chain_id))
+
+        self._pending = sorted(set(chain_id))
+        self._exp_ids = {}
+        return list(self._pending)
 
     def query(self, session, chain_id):
         """Create a query to find all mapped chains. This will produce a query
@@ -129,32 +151,76 @@ class Loader(core.SimpleLoader):
                                         " experimental sequence")
             return query.one().exp_seq_id
         
-    def exp_id_two_queries(self, chain_id):
-        simplify_type = {}
-        simplify_type['Polydeoxyribonucleotide (DNA)'] = 'dna'
-        simplify_type['Polyribonucleotide (RNA)'] = 'rna'
-        simplify_type['polyribonucleotide'] = 'rna'
-        simplify_type['polydeoxyribonucleotide'] = 'dna'
-        simplify_type['polydeoxyribonucleotide/polyribonucleotide hybrid'] = 'hybrid'
-        simplify_type['DNA/RNA Hybrid'] = 'hybrid'
-        data = []
-        with self.session() as session:
-            query = session.query(mod.ChainInfo.sequence,mod.ChainInfo.entity_macromolecule_type).\
-                                    filter(mod.ChainInfo.chain_id == chain_id)
-            for result in query:
-                query2 = session.query(mod.ExpSeqInfo.exp_seq_id).\
-                        filter(mod.ExpSeqInfo.sequence == result.sequence).filter(mod.ExpSeqInfo.entity_type == simplify_type[result.entity_macromolecule_type])
-                if query2.count() != 1:
-                    raise core.InvalidState("There should be exactly one matching"
-                                            " experimental sequence")
-                else:
-                    data.append(result2.exp_seq_id for result2 in query2)
-            return data  
+    def resolve(self, chain_ids):
+        """Find the experimental sequences of many chains at once. The
+        sequence and simplified entity type of each chain are loaded and hashed
+        with `pymotifs.exp_seq.info.Loader.md5`, and then all experimental
+        sequences with any of these hashes are loaded. Chains are matched to
+        them in memory, by hash, entity type and the full sequence. This takes
+        two queries per `resolve_max` chains.
+
+        Parameters
+        ----------
+        chain_ids : list
+            The chain ids to resolve.
+
+        Returns
+        -------
+        exp_seq_ids : dict
+            A dict from each chain id to a list of the matching experimental
+            sequence ids.
+        """
+
+        info = InfoLoader(self.config, self.session)
+        resolved = {}
+        for chunk in grouper(self.resolve_max, chain_ids):
+            chains = {}
+            with self.session() as session:
+                query = session.query(mod.ChainInfo.chain_id,
+                                      mod.ChainInfo.sequence,
+                                      mod.ChainInfo.entity_macromolecule_type,
+                                      ).\
+                    filter(mod.ChainInfo.chain_id.in_(chunk))
+                for result in query:
+                    entity_type = SIMPLIFY_TYPE.get(
+                        result.entity_macromolecule_type)
+                    if entity_type is None:
+                        continue
+                    key = (info.md5(result.sequence), entity_type)
+                    chains[result.chain_id] = (key, result.sequence)
+
+            known = coll.defaultdict(list)
+            hashes = sorted(set(key[0] for key, _ in chains.values()))
+            if hashes:
+                with self.session() as session:
+                    exp = mod.ExpSeqInfo
+                    query = session.query(exp.exp_seq_id,
+                                          exp.md5,
+                                          exp.entity_type,
+                                          exp.sequence,
+                                          ).\
+                        filter(exp.md5.in_(hashes))
+                    for result in query:
+                        key = (result.md5, result.entity_type)
+                        known[key].append((result.exp_seq_id,
+                                           result.sequence))
+
+            for chain_id in chunk:
+                resolved[chain_id] = []
+                if chain_id not in chains:
+                    continue
+                key, sequence = chains[chain_id]
+                resolved[chain_id] = [exp_id for exp_id, seq in known[key]
+                                      if seq == sequence]
+        return resolved
 
     def exp_id(self, chain_id):
         """Compute the experimetnal sequence id for the given chain id. This
         will look up all experimental sequences with the same sequence and entity types
-        as thegiven chain id.
+        as thegiven chain id. The first time a chain is looked up all chains
+        from the last call to `to_process` are resolved together with
+        `resolve`.
+
         Parameters
         ----------
         chain_id : int
@@ -162,29 +228,21 @@ class Loader(core.SimpleLoader):
 
         Returns
         -------
-        exp_seq_ids : list
-            List of int experimental sequence ids
+        exp_seq_id : int
+            The experimental sequence id.
         """
-        simplify_type = {}
-        simplify_type['Polydeoxyribonucleotide (DNA)'] = 'dna'
-        simplify_type['Polyribonucleotide (RNA)'] = 'rna'
-        simplify_type['polyribonucleotide'] = 'rna'
-        simplify_type['polydeoxyribonucleotide'] = 'dna'
-        simplify_type['polydeoxyribonucleotide/polyribonucleotide hybrid'] = 'hybrid'
-        simplify_type['DNA/RNA Hybrid'] = 'hybrid'  
-
-        with self.session() as session:
-            exp = mod.ExpSeqInfo
-            query = session.query(exp.exp_seq_id).\
-                join(mod.ChainInfo,
-                     # (mod.ChainInfo.sequence == exp.sequence) & (simplify_type[mod.ChainInfo.entity_macromolecule_type] == exp.entity_type)).\
-                     (mod.ChainInfo.sequence == exp.sequence) & (case(simplify_type, value = mod.ChainInfo.entity_macromolecule_type) == exp.entity_type)).\
-                filter(mod.ChainInfo.chain_id == chain_id)
 
-            if query.count() != 1:
-                raise core.InvalidState("There should be exactly one matching"
-                                        " experimental sequence and entity type")
-            return query.one().exp_seq_id            
+        if chain_id not in self._exp_ids:
+            pending = [c for c in self._pending if c not in self._exp_ids]
+            if chain_id not in pending:
+                pending.append(chain_id)
+            self._exp_ids.update(self.resolve(pending))
+
+        matches = self._exp_ids[chain_id]
+        if len(matches) != 1:
+            raise core.InvalidState("There should be exactly one matching"
+                                    " experimental sequence and entity type")
+        return matches[0]
 
     def data(self, chain_id, **kwargs):
         """Compute the mapping between the chain and an experimental sequence.
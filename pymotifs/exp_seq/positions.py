@@ -1,9 +1,16 @@
 """Load data about each experimental sequence positions. This will process all
 experimental sequences and write data on each position in the sequence.
+
+All sequences which have no stored positions are loaded with one query and
+their positions are written together, see `Loader.bulk`. Only sequences whose
+positions must be recomputed are processed one at a time.
 """
 
+import itertools as it
+
 from pymotifs import core
 from pymotifs import models as mod
+from pymotifs.utils import grouper
 
 from pymotifs.exp_seq.info import Loader as InfoLoader
 from pymotifs.exp_seq.chain_mapping import Loader as ExpMappingLoader
@@ -11,6 +18,7 @@ from pymotifs.exp_seq.chain_mapping import Loader as ExpMappingLoader
 
 class Loader(core.SimpleLoader):
     dependencies = set([ExpMappingLoader, InfoLoader])
+    mark = False
 
     @property
     def table(self):
@@ -77,6 +85,120 @@ class Loader(core.SimpleLoader):
             exp = session.query(mod.ExpSeqInfo).get(exp_seq_id)
             return exp.sequence
 
+    @property
+    def info(self):
+        """The `pymotifs.exp_seq.info.Loader` used to normalize units. This is
+        kept so the translation table is only loaded once.
+        """
+
+        if not hasattr(self, '_info'):
+            self._info = InfoLoader(self.config, self.session)
+        return self._info
+
+    def sequences(self, exp_seq_ids):
+        """Get the sequences of many experimental sequences with one query per
+        `insert_max` ids.
+
+        Parameters
+        ----------
+        exp_seq_ids : list
+            The ids to load.
+
+        Returns
+        -------
+        sequences : dict
+            A dict from experimental sequence id to sequence.
+        """
+
+        sequences = {}
+        for chunk in grouper(self.insert_max, exp_seq_ids):
+            with self.session() as session:
+                query = session.query(mod.ExpSeqInfo.exp_seq_id,
+                                      mod.ExpSeqInfo.sequence).\
+                    filter(mod.ExpSeqInfo.exp_seq_id.in_(chunk))
+                sequences.update((r.exp_seq_id, r.sequence) for r in query)
+        return sequences
+
+    def missing(self, exp_seq_ids):
+        """Find which of the given experimental sequences have no stored
+        positions.
+
+        Parameters
+        ----------
+        exp_seq_ids : list
+            The ids to check.
+
+        Returns
+        -------
+        missing : list
+            The ids without any positions, in the given order.
+        """
+
+        known = set()
+        for chunk in grouper(self.insert_max, exp_seq_ids):
+            with self.session() as session:
+                query = session.query(mod.ExpSeqPosition.exp_seq_id).\
+                    filter(mod.ExpSeqPosition.exp_seq_id.in_(chunk)).\
+                    distinct()
+                known.update(r.exp_seq_id for r in query)
+        return [exp_id for exp_id in exp_seq_ids if exp_id not in known]
+
+    def bulk(self, exp_seq_ids, dry_run=False, **kwargs):
+        """Write the positions of many experimental sequences in a single
+        transaction, with executemany inserts of `insert_max` rows.
+
+        Parameters
+        ----------
+        exp_seq_ids : list
+            The ids to write positions for.
+        dry_run : bool, optional
+            If set nothing is written.
+
+        Returns
+        -------
+        count : int
+            The number of positions written.
+        """
+
+        if not exp_seq_ids:
+            return 0
+
+        sequences = self.sequences(exp_seq_ids)
+        unknown = [e for e in exp_seq_ids if e not in sequences]
+        if unknown:
+            raise core.InvalidState("Unknown experimental sequences %s" %
+                                    unknown)
+
+        positions = it.chain.from_iterable(
+            self.positions(exp_id, sequences[exp_id])
+            for exp_id in exp_seq_ids)
+
+        if dry_run:
+            count = sum(1 for _ in positions)
+        else:
+            count = 0
+            table = self.table.__table__
+            with self.session() as session:
+                for chunk in grouper(self.insert_max, positions):
+                    session.execute(table.insert(), list(chunk))
+                    count += len(chunk)
+
+        self.logger.info("Wrote %i positions for %i sequences", count,
+                         len(exp_seq_ids))
+        return count
+
+    def __call__(self, given, **kwargs):
+        """Write positions for all sequences in the given structures. Sequences
+        which have no positions are written together with `bulk`, unless
+        recomputing, and the rest is processed as usual.
+        """
+
+        ids = self.to_process(given, **kwargs)
+        fresh = [exp_id for exp_id in ids
+                 if not self.must_recompute(exp_id, **kwargs)]
+        self.bulk(self.missing(fresh), **kwargs)
+        return super(Loader, self).__call__(given, **kwargs)
+
     def positions(self, exp_id, sequence):
         """Compute a dictonary for each position in an experimental sequence.
         Each dictionary in the resulting list will have the a 'exp_seq_id',
@@ -99,7 +221,7 @@ class Loader(core.SimpleLoader):
         """
 
         positions = []
-        info = InfoLoader(self.config, self.session)
+        info = self.info
         for index, char in enumerate(sequence):
             norm_char = info.translate(char)
 
@@ -1,9 +1,161 @@
+"""Export the discrepancy of every pair of IFEs to a tab separated file.
+
+Each line of the file has the two IFE ids and their discrepancy. The rows are
+streamed from the database with a server side cursor and written as they
+arrive, so the memory used does not depend on the size of the
+chain_chain_similarity table. The file is written to a temporary name and
+moved into place once complete, so readers never see a partial file.
+
+The stage has several options:
+
+    path : where to write, defaults to `DEFAULT_PATH`. If this ends in '.gz'
+        the file is gzip compressed.
+    shard : if true, instead write one file per NR class of a release,
+        containing only the pairs between members of the class. The files are
+        named after the class, as in 'NR_1.5_09579.1.txt', and placed in the
+        directory given by 'shard_directory', which defaults to the directory
+        of 'path'. These are used by `pymotifs.nr.ordering` when present.
+    nr_release_id : the release to shard by, defaults to the latest.
+    chunk_size : the number of rows to fetch from the database at once.
+"""
+
+import os
+import gzip
+
+from sqlalchemy import desc
 from sqlalchemy.orm import aliased
+
 from pymotifs import core
 from pymotifs import models as mod
 
 from pymotifs.chain_chain.comparison import Loader as ChainComparisons
 
+"""The file the discrepancies are written to and read from by default."""
+DEFAULT_PATH = '/var/www/html/discrepancy/IFEdiscrepancy.txt'
+
+
+def opener(filename, mode='r', compressed=None):
+    """Open a discrepancy file, using gzip if the name ends with '.gz'.
+
+    Parameters
+    ----------
+    filename : str
+        The file to open.
+    mode : str, optional
+        The mode to open with.
+    compressed : bool, optional
+        If the file is compressed, by default this is found from the name.
+
+    Returns
+    -------
+    handle : file
+        The opened file.
+    """
+
+    if compressed is None:
+        compressed = filename.endswith('.gz')
+    if compressed:
+        return gzip.open(filename, mode + 'b')
+    return open(filename, mode)
+
+
+def write(rows, filename):
+    """Write rows of (ife1, ife2, discrepancy) to a file. The rows are written
+    to a temporary file which is renamed once all rows are written.
+
+    Parameters
+    ----------
+    rows : iterable
+        The rows to write, this may be a generator.
+    filename : str
+        The file to write to.
+
+    Returns
+    -------
+    count : int
+        The number of rows written.
+    """
+
+    count = 0
+    temp = filename + '.tmp'
+    with opener(temp, 'w', compressed=filename.endswith('.gz')) as out:
+        for count, (ife1, ife2, discrepancy) in enumerate(rows, 1):
+            out.write('%s\t%s\t%s\n' % (ife1, ife2, discrepancy))
+    os.rename(temp, filename)
+    return count
+
+
+def write_shards(rows, directory, suffix='.txt'):
+    """Write rows of (class name, ife1, ife2, discrepancy) to one file per
+    class. The rows must be ordered by class name, so only one file is open at
+    a time.
+
+    Parameters
+    ----------
+    rows : iterable
+        The rows to write, this may be a generator.
+    directory : str
+        The directory to write the files in.
+    suffix : str, optional
+        The suffix of each file, use '.txt.gz' to compress them.
+
+    Returns
+    -------
+    count : int
+        The number of rows written.
+    """
+
+    def by_class():
+        current = None
+        for name, ife1, ife2, discrepancy in rows:
+            if name != current:
+                if current is not None:
+                    yield current, None
+                current = name
+            yield current, (ife1, ife2, discrepancy)
+        if current is not None:
+            yield current, None
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    count = 0
+    out = None
+    for name, row in by_class():
+        if out is None:
+            filename = os.path.join(directory, name + suffix)
+            out = opener(filename + '.tmp', 'w',
+                         compressed=filename.endswith('.gz'))
+        if row is None:
+            out.close()
+            os.rename(filename + '.tmp', filename)
+            out = None
+            continue
+        out.write('%s\t%s\t%s\n' % row)
+        count += 1
+    return count
+
+
+def read(filename):
+    """Read a file written by `write`.
+
+    Parameters
+    ----------
+    filename : str
+        The file to read.
+
+    Yields
+    ------
+    row : tuple
+        A tuple of (ife1, ife2, discrepancy) with the discrepancy as a float.
+    """
+
+    with opener(filename) as raw:
+        for line in raw:
+            ife1, ife2, discrepancy = line.rstrip('\n').split('\t')
+            yield ife1, ife2, float(discrepancy)
+
+
 class Exporter(core.Exporter):
     '''Export discrepancy values of every possible ife id combination.
     '''
@@ -11,24 +163,91 @@ class Exporter(core.Exporter):
     # General setup
 
     dependencies = set([ChainComparisons])
+    mark = False
+
+    path = DEFAULT_PATH
+    """Default file to write to."""
+
+    shard = False
+    """If we should write one file per NR class by default."""
+
+    shard_directory = None
+    """Default directory for the files of each class, None to use the
+    directory of path."""
+
+    nr_release_id = None
+    """Default release to shard by, None for the latest."""
+
+    chunk_size = 10000
+    """Default number of rows to fetch from the database at once."""
+
+    progress_every = 1000000
+    """Number of streamed rows between progress messages."""
+
+    def option(self, name):
+        """Get a configured option of this stage, or the default for it.
+        """
+        return self.config[self.name].get(name, getattr(self, name))
 
     def filename(self, *args, **kwargs):
-        """This will always return the configured path at
-        locations.interactions_gz and is where the interaction export will be
-        written.
+        """Get the configured file to write the discrepancies of all pairs
+        to.
 
         Returns
         -------
         filename : str
             The path to write to.
         """
-        return None
+        return self.option('path')
+
+    def directory(self):
+        """Get the directory to write the file of each NR class to.
+
+        Returns
+        -------
+        directory : str
+            The directory.
+        """
+
+        directory = self.option('shard_directory')
+        if directory is None:
+            directory = os.path.dirname(self.filename())
+        return directory
+
+    def suffix(self):
+        """Get the suffix of the file of each NR class. These are compressed
+        when the file of all pairs is.
+
+        Returns
+        -------
+        suffix : str
+            The suffix.
+        """
+
+        if self.filename().endswith('.gz'):
+            return '.txt.gz'
+        return '.txt'
+
+    def shard_filename(self, nr_class_name):
+        """Compute the file the discrepancies of the given class are written
+        to when sharding.
+
+        Parameters
+        ----------
+        nr_class_name : str
+            The NR class name, like 'NR_1.5_09579.1'.
+
+        Returns
+        -------
+        filename : str
+            The path of the file.
+        """
+        return os.path.join(self.directory(), nr_class_name + self.suffix())
 
     def to_process(self, pdbs, **kwargs):
 
         return ["pretend_PDB_ID"]
 
-
     def process(self, pdb, **kwargs):
         """ override the process method to simply load data,
         which takes care of the writing, and nothing else
@@ -37,52 +256,184 @@ class Exporter(core.Exporter):
 
         data = self.data(pdb)
 
-    def data(self, pdb, **kwargs):
+    def query(self, session):
+        """Build the query for the discrepancy between the first chain of
+        each pair of IFEs.
+
+        Parameters
+        ----------
+        session : pymotifs.core.db.Session
+            The session to use.
+
+        Returns
+        -------
+        query : Query
+            A query producing discrepancy, ife1 and ife2, ordered by ife1 and
+            ife2.
+        """
+
+        IC1 = aliased(mod.IfeChains)
+        IC2 = aliased(mod.IfeChains)
+        CCS = mod.ChainChainSimilarity
+
+        return session.query(CCS.discrepancy,
+                             IC1.ife_id.label('ife1'),
+                             IC2.ife_id.label('ife2')).\
+            join(IC1, IC1.chain_id == CCS.chain_id_1).\
+            join(IC2, IC2.chain_id == CCS.chain_id_2).\
+            filter(IC1.index == 0).\
+            filter(IC2.index == 0).\
+            filter(IC1.chain_id != IC2.chain_id).\
+            order_by(IC1.ife_id, IC2.ife_id).\
+            distinct()
+
+    def sharded_query(self, session, nr_release_id):
+        """Build the query for the discrepancy between each pair of IFEs in
+        the same NR class of a release.
+
+        Parameters
+        ----------
+        session : pymotifs.core.db.Session
+            The session to use.
+        nr_release_id : str
+            The release to use the classes of.
+
+        Returns
+        -------
+        query : Query
+            A query producing name, discrepancy, ife1 and ife2, ordered by
+            class name, ife1 and ife2.
+        """
+
+        IC1 = aliased(mod.IfeChains)
+        IC2 = aliased(mod.IfeChains)
+        NC1 = aliased(mod.NrChains)
+        NC2 = aliased(mod.NrChains)
+        CCS = mod.ChainChainSimilarity
+
+        return session.query(mod.NrClasses.name,
+                             CCS.discrepancy,
+                             IC1.ife_id.label('ife1'),
+                             IC2.ife_id.label('ife2')).\
+            select_from(CCS).\
+            join(IC1, IC1.chain_id == CCS.chain_id_1).\
+            join(IC2, IC2.chain_id == CCS.chain_id_2).\
+            join(NC1, NC1.ife_id == IC1.ife_id).\
+            join(NC2, NC2.ife_id == IC2.ife_id).\
+            join(mod.NrClasses,
+                 mod.NrClasses.nr_class_id == NC1.nr_class_id).\
+            filter(NC2.nr_class_id == NC1.nr_class_id).\
+            filter(mod.NrClasses.nr_release_id == nr_release_id).\
+            filter(IC1.index == 0).\
+            filter(IC2.index == 0).\
+            filter(IC1.chain_id != IC2.chain_id).\
+            order_by(mod.NrClasses.name, IC1.ife_id, IC2.ife_id).\
+            distinct()
+
+    def release(self):
+        """Get the NR release to shard by, which is the configured one or the
+        latest.
 
-        '''This method dumps the discrepancy for every possible combination of ife ids into a file for later import.
-        The data is pickled for easy reading and writing in python.
+        Raises
+        ------
+        core.InvalidState
+            If there are no NR releases.
 
-            :results: list of lists of the the two ife ids and their corresponding discrepancy.
+        Returns
+        -------
+        nr_release_id : str
+            The release id.
+        """
+
+        configured = self.option('nr_release_id')
+        if configured:
+            return configured
+
+        with self.session() as session:
+            query = session.query(mod.NrReleases.nr_release_id).\
+                order_by(desc(mod.NrReleases.index)).\
+                limit(1)
+            result = query.first()
+            if result is None:
+                raise core.InvalidState("No NR release to shard by")
+            return result.nr_release_id
+
+    def stream(self, query):
+        """Iterate over the rows of a query with a server side cursor,
+        fetching `chunk_size` rows at a time.
+
+        Parameters
+        ----------
+        query : Query
+            The query to run.
+
+        Yields
+        ------
+        row : tuple
+            Each row of the query.
+        """
+
+        query = query.execution_options(stream_results=True).\
+            yield_per(self.option('chunk_size'))
+
+        count = 0
+        for count, result in enumerate(query, 1):
+            yield result
+            if not count % self.progress_every:
+                self.logger.info("Streamed %i discrepancies", count)
+
+    def data(self, pdb, **kwargs):
+        '''This method writes the discrepancy for every pair of ife ids into
+        the configured file, or one file per NR class if sharding. The rows
+        are written as they are read from the database.
+
+        Returns
+        -------
+        results : list
+            Always empty, as the rows are written here.
         '''
 
         with self.session() as session:
-            self.logger.info("ife_discrepancy_dump: Inside data retrieval routine")
-            self.logger.info("ife_discrepancy_dump: Setting aliases")
-
-            IC1 = aliased(mod.IfeChains)
-            IC2 = aliased(mod.IfeChains)
-            CCS = mod.ChainChainSimilarity
-
-            self.logger.info("ife_discrepancy_dump: Building Query")
-
-            query = session.query(CCS.discrepancy,
-                                  IC1.ife_id.label('ife1'),
-                                  IC2.ife_id.label('ife2')).\
-                                  join(IC1, IC1.chain_id == CCS.chain_id_1).\
-                                  join(IC2, IC2.chain_id == CCS.chain_id_2).\
-                                  filter(IC1.index == 0).\
-                                  filter(IC2.index == 0).\
-                                  filter(IC1.chain_id != IC2.chain_id).\
-                                  order_by(IC1.ife_id, IC2.ife_id).\
-                                  distinct()
-#            query.all()
-
-            self.logger.info("ife_discrepancy_dump: Query Built")
-
-            count = query.count()
-            if not count:
-                self.logger.warning("No discrepancies found.")
+            if self.option('shard'):
+                release = self.release()
+                directory = self.directory()
+                self.logger.info("Writing discrepancies of each class in %s "
+                                 "to %s", release, directory)
+                query = self.sharded_query(session, release)
+                rows = ((r.name, r.ife1, r.ife2, r.discrepancy)
+                        for r in self.stream(query))
+                count = write_shards(rows, directory, suffix=self.suffix())
             else:
-                self.logger.info("Found %s discrepancies.", count)
+                filename = self.filename()
+                self.logger.info("Writing discrepancies to %s", filename)
+                rows = ((r.ife1, r.ife2, r.discrepancy)
+                        for r in self.stream(self.query(session)))
+                count = write(rows, filename)
+
+        if not count:
+            self.logger.warning("No discrepancies found.")
+        else:
+            self.logger.info("Wrote %s discrepancies.", count)
 
-            # create a list of lists made of the query results
+        return []
 
-            results = [[r.ife1, r.ife2, r.discrepancy] for r in query]
+    def discrepancies(self, nr_class_name=None):
+        """Read the exported discrepancies. If the file for the given class
+        exists it is used, otherwise the file of all pairs is.
 
-            # write into a file
-            with open('/var/www/html/discrepancy/IFEdiscrepancy.txt', 'w') as f:
-                self.logger.info("ife_discrepancy_dump: File Open")
-                for r in results:
-                    f.write('%s\t%s\t%s\n' % (r[0], r[1], r[2]))
+        Parameters
+        ----------
+        nr_class_name : str, optional
+            The NR class the discrepancies are needed for.
 
-        return []
+        Returns
+        -------
+        rows : generator
+            A generator of (ife1, ife2, discrepancy), see `read`.
+        """
+
+        if nr_class_name:
+            filename = self.shard_filename(nr_class_name)
+            if os.path.exists(filename):
+                return read(filename)
+        return read(self.filename())
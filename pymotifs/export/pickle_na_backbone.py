@@ -1,9 +1,13 @@
 """Module for export of nt backbone centers in pickle format for FR3D.
+
+One file is written for each IFE-chain, but the data for all chains of a PDB
+is loaded with a single query.
 """
 
 import numpy as np
 import os
 import pickle
+import itertools as it
 
 from pymotifs import core
 from pymotifs import models as mod
@@ -21,7 +25,7 @@ from os import path
 
 class Exporter(core.Loader):
     """Export unit data in pickle format, one file per
-    IFE-chain.
+    IFE-chain. Each entry processed is a PDB with all of its IFE-chains.
     """
 
     # General Setup
@@ -32,14 +36,29 @@ class Exporter(core.Loader):
 
 
     def has_data(self, entry, *args, **kwargs):
-        self.logger.info("has_data: entry: %s" % str(entry))
-        filename = self.filename(entry)
-        self.logger.info("has_data: filename: %s" % filename)
-        if os.path.exists(filename) is True:
-            self.logger.info("has_data: filename %s exists" % filename)
-            return True
-        self.logger.info("has_data: filename %s is missing" % filename)
-        return False
+        """Check if the files for all IFE-chains of the entry exist.
+
+        Parameters
+        ----------
+        entry : tuple
+            A PDB ID and the (model, chain) pairs to export, as produced by
+            `to_process`.
+
+        Returns
+        -------
+        has_data : bool
+            True if every file exists.
+        """
+
+        pdb, chains = entry
+        for mdl, chn in chains:
+            filename = self.filename((pdb, mdl, chn))
+            if not os.path.exists(filename):
+                self.logger.info("has_data: filename %s is missing" % filename)
+                return False
+        self.logger.info("has_data: all %d files for %s exist" %
+                         (len(chains), pdb))
+        return True
 
 
     def remove():
@@ -76,35 +95,41 @@ class Exporter(core.Loader):
         return os.path.join(self.config['locations']['fr3d_pickle_base'],"units",chain_string + "_NA_phosphate_sugar.pickle")
 
 
-    def data(self, ichain, **kwargs):
-        """Get all unit listings for the given IFE-chain, centers and
-        rotations, and format them for convenient use by FR3D.
+    def data(self, entry, **kwargs):
+        """Get all unit listings for the IFE-chains of a PDB, centers and
+        rotations, and format them for convenient use by FR3D. This uses a
+        single query for all the chains.
 
         Parameters
         ----------
-        ichain : tuple
-            The IFE-chain for which to look up centers and rotation data.
+        entry : tuple
+            A PDB ID and the (model, chain) pairs to look up, as produced by
+            `to_process`.
 
         Returns
         -------
-        resultset : list of dicts
+        resultsets : list
+            A list of (IFE-chain, resultset) tuples, in the order of the given
+            chains. Each IFE-chain is a (PDB ID, model, chain) tuple and each
+            resultset a list of units, positions, phosphate centers and sugar
+            centers. Chains without any units have empty lists.
         """
 
-        pdb = ichain[0]
-        mdl = ichain[1]
-        chn = ichain[2]
+        pdb, chains = entry
 
         with self.session() as session:
             self.logger.debug("na_backbone: Inside data retrieval routine")
             self.logger.debug("na_backbone: building query")
 
-            unit_type_ids = ['rna','dna']
-            centers = ['nt_phosphate','nt_sugar']
-
             centers1 = aliased(mod.UnitCenters)   # first reference for nt_phosphate
             centers2 = aliased(mod.UnitCenters)   # second reference for nt_sugar
 
+            models = sorted(set(str(mdl) for mdl, _ in chains))
+            names = sorted(set(chn for _, chn in chains))
+
             query = session.query(mod.UnitInfo.unit_id,
+                               mod.UnitInfo.model,
+                               mod.UnitInfo.chain,
                                mod.ExpSeqPosition.index.label('position_order'),
                                centers1.x,
                                centers1.y,
@@ -121,38 +146,39 @@ class Exporter(core.Loader):
                      filter(centers1.name == 'nt_phosphate').\
                      filter(centers2.name == 'nt_sugar').\
                      filter(mod.UnitInfo.pdb_id == pdb).\
-                     filter(mod.UnitInfo.model == str(mdl)).\
-                     filter(mod.UnitInfo.chain == chn).\
-                     order_by(mod.ExpSeqPosition.index)
+                     filter(mod.UnitInfo.model.in_(models)).\
+                     filter(mod.UnitInfo.chain.in_(names)).\
+                     order_by(mod.UnitInfo.model,
+                              mod.UnitInfo.chain,
+                              mod.ExpSeqPosition.index,
+                              mod.UnitInfo.unit_id)
 
             self.logger.debug("na_backbone: query built")
 
-            units = []
-            order = []
-            phos  = []
-            sugar = []
-            rttns = []
-            rsset = []
-
+            found = {}
             for row in query:
+                key = (str(row.model), row.chain)
+                if key not in found:
+                    found[key] = [[], [], [], []]
+                units, order, phos, sugar = found[key]
                 units.append(row.unit_id)
                 order.append(row.position_order)
                 phos.append( np.asarray([row.x, row.y, row.z]))
                 sugar.append(np.asarray([row.xx, row.yy, row.zz]))
 
-            rsset = [ units, order, phos, sugar ]
-
-            self.logger.debug("na_backbone: units: %s" % str(units))
-            self.logger.debug("na_backbone: order: %s" % str(order))
-            self.logger.debug("na_backbone: phos : %s" % str(phos))
-            self.logger.debug("na_backbone: sugar: %s" % str(sugar))
-            self.logger.debug("na_backbone: rsset: %s" % str(rsset))
-
-            return rsset
+        resultsets = []
+        for mdl, chn in chains:
+            rsset = found.get((str(mdl), chn), [[], [], [], []])
+            self.logger.debug("na_backbone: %s|%s|%s: %d units" %
+                              (pdb, mdl, chn, len(rsset[0])))
+            resultsets.append(((pdb, mdl, chn), rsset))
+        return resultsets
 
 
     def to_process(self, pdbs, **kwargs):
-        """Look up the list of IFE-chains to process.  Ignores the pdbs input.
+        """Look up the IFE-chains to process, grouped by PDB. If only a few
+        PDBs are given then only their chains are used, otherwise all chains
+        are.
 
         Parameters
         ----------
@@ -161,8 +187,9 @@ class Exporter(core.Loader):
 
         Returns
         -------
-        (pdb_id, model, chain) : tuple
-            The components of the IFE-chains to be processed.
+        entries : list
+            A list of (pdb_id, chains) tuples, where chains is a tuple of the
+            (model, chain) pairs of the IFE-chains in the PDB.
         """
 
         self.logger.info("Given %d pdbs to process" % len(pdbs))
@@ -178,37 +205,37 @@ class Exporter(core.Loader):
 
             # if only a few pdbs are requested, focus on those, otherwise do all
             if len(pdbs) < 10:
-                all_pdbs = [(r.pdb_id, r.model, r.chain) for r in query if r.pdb_id in pdbs]
-            else:
-                all_pdbs = [(r.pdb_id, r.model, r.chain) for r in query]
+                query = query.filter(mod.UnitInfo.pdb_id.in_(pdbs))
+
+            query = query.order_by(mod.UnitInfo.pdb_id,
+                                   mod.UnitInfo.model,
+                                   mod.UnitInfo.chain)
 
-            self.logger.info("Found %d pdbs to process" % len(all_pdbs))
+            entries = []
+            for pdb, rows in it.groupby(query, lambda r: r.pdb_id):
+                entries.append((pdb, tuple((r.model, r.chain) for r in rows)))
 
-            return all_pdbs
+            self.logger.info("Found %d chains in %d pdbs to process" %
+                             (sum(len(e[1]) for e in entries), len(entries)))
+
+            return entries
 
 
     def process(self, entry, **kwargs):
-        """Load centers/rotations data for the given IFE-chain.
+        """Load centers/rotations data for the IFE-chains of a PDB and write
+        one file for each.
 
         Parameters
         ----------
-        entry : object
-            The entry to process.
+        entry : tuple
+            A PDB ID and the (model, chain) pairs to write.
         **kwargs : dict
             Generic keyword arguments.
         """
 
-        webroot = self.config['locations']['fr3d_pickle_base'] + "/units/"
-
-        filename = self.filename(entry)
-
-        uinfo = self.data(entry)
-
-        with open(filename, 'wb') as fh:
-            self.logger.debug("process: filename open: %s" % filename)
-            # Use 2 for "HIGHEST_PROTOCOL" for Python 2.3+ compatibility.
-            pickle.dump(uinfo, fh, 2)
-
-#        os.system("rsync -u %s %s" % (filename, webroot))
-#        self.logger.debug("rsync -u %s %s" % (filename, webroot))
-
+        for ichain, uinfo in self.data(entry):
+            filename = self.filename(ichain)
+            with open(filename, 'wb') as fh:
+                self.logger.debug("process: filename open: %s" % filename)
+                # Use 2 for "HIGHEST_PROTOCOL" for Python 2.3+ compatibility.
+                pickle.dump(uinfo, fh, 2)
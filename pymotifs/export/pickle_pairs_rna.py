@@ -1,12 +1,25 @@
 """Module for export of pairs data in pickle format for FR3D.
+
+Which files need to be rebuilt is tracked in a manifest stored next to the
+pickle files. For each PDB the manifest records a fingerprint of the rows in
+`unit_pairs_interactions` and `unit_pairs_flanking` that the file was built
+from. Only PDBs whose fingerprint has changed, or whose file is missing, are
+regenerated and this is done using a pool of workers.
 """
 
 import numpy as np
 import os
+import json
 import pickle
+import hashlib
+from multiprocessing.pool import ThreadPool
 
 from pymotifs import core
+from pymotifs import utils as ut
 from pymotifs import models as mod
+from pymotifs.core import metrics
+from pymotifs.core.exceptions import StageFailed
+from pymotifs.core.exceptions import InvalidState
 
 from pymotifs.chains.info import Loader as ChainLoader
 from pymotifs.units.centers import Loader as CentersLoader
@@ -36,22 +49,270 @@ class Exporter(core.Loader):
     dependencies = set([ChainLoader, CentersLoader, RotationsLoader, 
                         PositionLoader, IfeInfoLoader, MappingLoader])
 
+    manifest_name = 'RNA_pairs_manifest.json'
+    """Name of the file recording the fingerprint each pickle was built from"""
+
+    workers = 4
+    """Default number of workers used when regenerating files"""
+
+    fingerprint_chunk = 100
+    """Number of PDBs to fingerprint per query"""
+
 
     def has_data(self, pdb, *args, **kwargs):
+        """Check if the pickle file for the PDB exists and was built from the
+        current contents of the interaction tables.
+        """
         self.logger.info("has_data: pdb: %s" % str(pdb))
         filename = self.filename(pdb)
         self.logger.info("has_data: filename: %s" % filename)
-        if os.path.exists(filename) is True:
-            self.logger.info("has_data: filename %s exists" % filename)
-            return True
-        self.logger.info("has_data: filename %s is missing" % filename)
-        return False
+        if os.path.exists(filename) is not True:
+            self.logger.info("has_data: filename %s is missing" % filename)
+            return False
+
+        known = self.manifest().get(pdb)
+        current = self.fingerprints([pdb])[pdb]
+        if known != current:
+            self.logger.info("has_data: filename %s is stale" % filename)
+            return False
 
+        self.logger.info("has_data: filename %s exists" % filename)
+        return True
 
-    def remove():
+
+    def remove(self, *args, **kwargs):
         pass
 
 
+    def manifest_filename(self):
+        """Compute the path to the manifest file.
+
+        Returns
+        -------
+        filename : str
+            The path to the manifest.
+        """
+        return os.path.join("pickle-FR3D", self.manifest_name)
+
+
+    def manifest(self):
+        """Load the manifest of exported files.
+
+        Returns
+        -------
+        manifest : dict
+            A mapping from PDB id to the fingerprint the file was built from.
+            This is empty if no manifest has been written yet, or if it cannot
+            be read, so that all files are rebuilt.
+        """
+
+        filename = self.manifest_filename()
+        if not os.path.exists(filename):
+            return {}
+        with open(filename, 'rb') as raw:
+            try:
+                manifest = json.load(raw)
+            except ValueError:
+                self.logger.warning("Ignoring unreadable manifest %s",
+                                    filename)
+                return {}
+        if not isinstance(manifest, dict):
+            self.logger.warning("Ignoring malformed manifest %s", filename)
+            return {}
+        return manifest
+
+
+    def save_manifest(self, manifest, dry_run=False, **kwargs):
+        """Write the manifest atomically.
+
+        Parameters
+        ----------
+        manifest : dict
+            The mapping from PDB id to fingerprint to write.
+        """
+
+        if dry_run:
+            self.logger.debug("Not writing manifest in dry run")
+            return
+        with ut.atomic_open(self.manifest_filename()) as out:
+            json.dump(manifest, out, indent=1, sort_keys=True)
+
+
+    def fingerprints(self, pdbs):
+        """Compute a fingerprint of the source rows for each PDB. This reads
+        the columns used to build the pickle files directly from
+        `unit_pairs_interactions` and `unit_pairs_flanking`, without the joins
+        used to build the data, and hashes them in a stable order.
+
+        Parameters
+        ----------
+        pdbs : list
+            The PDB ids to fingerprint.
+
+        Returns
+        -------
+        fingerprints : dict
+            A mapping from PDB id to a hex digest. PDBs with no pairs get the
+            digest of no data.
+        """
+
+        hashes = dict((pdb, hashlib.md5()) for pdb in pdbs)
+        upi = mod.UnitPairsInteractions
+        upf = mod.UnitPairsFlanking
+        sources = [
+            ('interactions', upi, [upi.f_lwbp, upi.f_stacks, upi.f_bphs,
+                                   upi.f_brbs, upi.f_crossing]),
+            ('flanking', upf, [upf.flanking]),
+        ]
+
+        with self.session() as session:
+            for chunk in ut.grouper(self.fingerprint_chunk, sorted(hashes)):
+                for name, table, columns in sources:
+                    query = session.query(table.pdb_id,
+                                          table.unit_id_1,
+                                          table.unit_id_2,
+                                          *columns).\
+                        filter(table.pdb_id.in_(chunk)).\
+                        order_by(table.pdb_id,
+                                 table.unit_id_1,
+                                 table.unit_id_2)
+
+                    for row in query:
+                        values = [name] + [str(v) for v in row[1:]]
+                        hashes[row.pdb_id].update('\t'.join(values) + '\n')
+
+        return dict((pdb, md5.hexdigest()) for pdb, md5 in hashes.items())
+
+
+    def stale(self, pdbs, fingerprints, **kwargs):
+        """Determine which PDBs must have their files regenerated. This is
+        those we are told to recompute, those without a file and those whose
+        fingerprint differs from the one in the manifest.
+
+        Parameters
+        ----------
+        pdbs : list
+            The PDB ids to check.
+        fingerprints : dict
+            The current fingerprint of each PDB.
+
+        Returns
+        -------
+        stale : list
+            The PDB ids to rebuild, in the given order.
+        """
+
+        manifest = self.manifest()
+        stale = []
+        for pdb in pdbs:
+            if self.must_recompute(pdb, **kwargs) or \
+                    not os.path.exists(self.filename(pdb)) or \
+                    manifest.get(pdb) != fingerprints[pdb]:
+                stale.append(pdb)
+        return stale
+
+
+    def rebuild(self, pdbs, workers=None, **kwargs):
+        """Regenerate the files for all PDBs whose source data has changed.
+        Files are built in a pool of workers, each with its own database
+        session, and the manifest is updated once all workers are done. The
+        manifest only records PDBs which were written successfully, so failed
+        ones will be retried in the next run. Each PDB is recorded in the
+        metrics and marked as processed like in `pymotifs.core.stages.Stage`.
+
+        Parameters
+        ----------
+        pdbs : list
+            The PDB ids to consider.
+        workers : int, optional
+            The number of workers to use. Defaults to the configured value for
+            this stage or `workers`.
+
+        Returns
+        -------
+        processed : list
+            The PDB ids which were regenerated.
+        """
+
+        fingerprints = self.fingerprints(pdbs)
+        stale = self.stale(pdbs, fingerprints, **kwargs)
+        self.logger.info("%i of %i pair files must be rebuilt",
+                         len(stale), len(pdbs))
+        if not stale:
+            return []
+
+        if workers is None:
+            workers = self.config[self.name].get('workers', self.workers)
+
+        recorder = metrics.recorder
+
+        def build(pdb):
+            with recorder.entry(self.name, pdb):
+                try:
+                    with recorder.timer('process'):
+                        self.process(pdb, **kwargs)
+                except core.Skip as err:
+                    self.logger.warn("Skipping entry %s. Reason %s",
+                                     pdb, str(err))
+                    return pdb, None
+                except Exception as err:
+                    self.logger.error("Error raised in processing of %s", pdb)
+                    self.logger.exception(err)
+                    with recorder.timer('remove'):
+                        self.remove(pdb, **kwargs)
+                    return pdb, False
+
+                if self.mark:
+                    with recorder.timer('mark_processed'):
+                        self.mark_processed(pdb, **kwargs)
+            return pdb, True
+
+        failed = []
+        processed = []
+        manifest = self.manifest()
+        pool = ThreadPool(max(1, min(workers, len(stale))))
+        try:
+            for index, (pdb, success) in \
+                    enumerate(pool.imap_unordered(build, stale)):
+                self.logger.info("Rebuilt %s: %s/%s", pdb, index + 1,
+                                 len(stale))
+                if success:
+                    manifest[pdb] = fingerprints[pdb]
+                    processed.append(pdb)
+                elif success is False:
+                    failed.append(pdb)
+        finally:
+            pool.close()
+            pool.join()
+            self.save_manifest(manifest, **kwargs)
+
+        if failed:
+            ids = ' '.join(sorted(failed))
+            raise StageFailed("Stage %s failed on these inputs %s" %
+                              (self.name, ids))
+
+        return processed
+
+
+    def __call__(self, given, **kwargs):
+        """Regenerate the pair files of all given PDBs that are out of date.
+        This replaces the one at a time processing of
+        `pymotifs.core.stages.Stage` with `rebuild`, but otherwise behaves the
+        same way.
+        """
+
+        try:
+            pdbs = self.to_process(given, **kwargs)
+        except core.Skip as err:
+            self.logger.warn("Skipping this stage. Reason %s", str(err))
+            return []
+
+        if not pdbs:
+            self.logger.critical("Nothing to process")
+            raise InvalidState("Nothing to process")
+        return self.rebuild(pdbs, **kwargs)
+
+
     def filename(self, pdb, **kwargs):
         """Create the filename for the given PDB.
 
@@ -228,7 +489,7 @@ class Exporter(core.Loader):
 
         self.logger.debug("process: raw data: %s" % pinfo)
 
-        with open(filename, 'wb') as fh:
+        with ut.atomic_open(filename) as fh:
             self.logger.info("process: filename open: %s" % filename)
             # Use 2 for "HIGHEST_PROTOCOL" for Python 2.3+ compatibility.
             pickle.dump(pinfo, fh, 2)
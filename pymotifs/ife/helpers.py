@@ -16,12 +16,13 @@ from pymotifs.utils.sorting import total_ordering
 
 class IfeLoader(core.Base):
 
-    def best_model(self, pdb, sym_op):
+    def best_model(self, pdb, sym_op, counts=None):
         """Determine what model to use for ifes. We will use the model with the
         most basepairs. It tiebreaks on model number, lower is better.
 
         :pdb: The pdb id to use.
         :sym_op: The symmetry operator to use.
+        :counts: The `BasePairCounts` of the structure, if already loaded.
         :returns: The model number to use.
         """
 
@@ -35,12 +36,24 @@ class IfeLoader(core.Base):
             if len(models) == 1:
                 return models[0]
 
-        helper = st.BasePairQueries(self.session)
-        count = ft.partial(helper.representative, pdb, None, count=True,
-                           sym_op=sym_op)
+        if counts is None:
+            counts = self.counts(pdb, sym_op)
+        count = ft.partial(counts.representative, None)
         models = [(count(model=model), -1 * model) for model in models]
         return -1 * max(models)[1]
 
+    def counts(self, pdb, sym_op):
+        """Load the basepair counts between all chains in all models of a
+        structure. Everything needed to build the ifes is counted from this.
+
+        :pdb: The pdb id to use.
+        :sym_op: The symmetry operator to use.
+        :returns: A `BasePairCounts` of the structure.
+        """
+
+        helper = st.BasePairQueries(self.session.maker)
+        return helper.counts(pdb, sym_op=sym_op)
+
     def sym_op(self, pdb):
         """Pick a symmetry operator to work with. It doesn't really matter
         which one we use since they all have the same interactions by
@@ -59,7 +72,7 @@ class IfeLoader(core.Base):
                 one().\
                 sym_op
 
-    def load(self, pdb, chain, model=1, sym_op='1_555'):
+    def load(self, pdb, chain, model=1, sym_op='1_555', counts=None):
         """This loads all information about a chain into a dictionary. This
         will load generic information about a chain, such as resolved, length,
         database id, the source and information about basepairing. The
@@ -67,6 +80,7 @@ class IfeLoader(core.Base):
 
         :pdb: The pdb to search.
         :chain: The chain to search.
+        :counts: The `BasePairCounts` of the structure, if already loaded.
         :returns: A dictionary with
         """
 
@@ -95,32 +109,30 @@ class IfeLoader(core.Base):
             if result:
                 data['length'] = result.count
 
-        helper = st.BasePairQueries(self.session)
-        rep = helper.representative
-        data['internal'] = rep(data['pdb'], data['chain'], count=True,
-                               family='cWW', sym_op=sym_op)
-        data['bps'] = rep(data['pdb'], data['chain'], count=True,
-                          model=model, sym_op=sym_op)
+        if counts is None:
+            counts = self.counts(data['pdb'], sym_op)
+        data['internal'] = counts.representative(data['chain'], family='cWW')
+        data['bps'] = counts.representative(data['chain'], model=model)
 
         return IfeChain(**data)
 
-    def cross_chain_interactions(self, ifes, sym_op='1_555'):
+    def cross_chain_interactions(self, ifes, sym_op='1_555', counts=None):
         """Create a dictionary of the interactions between the listed chains.
         This will get only the counts.
 
         :chains: A list of chain dictionaries.
+        :counts: The `BasePairCounts` of the structure, if already loaded.
         :returns: A dictionary of like { 'A': { 'B': 10 }, 'B': { 'A': 10 } }.
         """
 
         if not ifes:
             raise core.InvalidState("No ifes to get interactions between")
 
-        pdb = ifes[0].pdb
-        helper = st.BasePairQueries(self.session)
+        if counts is None:
+            counts = self.counts(ifes[0].pdb, sym_op)
         interactions = coll.defaultdict(dict)
         pairs = it.product((ife.chain for ife in ifes), repeat=2)
-        counter = ft.partial(helper.cross_chain, pdb, count=True, family='cWW',
-                             sym_op=sym_op)
+        counter = ft.partial(counts.cross_chain, family='cWW')
         for name1, name2 in pairs:
             count = counter(name1, name2)
             if name1 == name2:
@@ -133,10 +145,13 @@ class IfeLoader(core.Base):
         helper = st.Structure(self.session.maker)
         names = helper.na_chains(pdb)
         sym_op = self.sym_op(pdb)
-        model = self.best_model(pdb, sym_op)
-        load = ft.partial(self.load, pdb, model=model, sym_op=sym_op)
+        counts = self.counts(pdb, sym_op)
+        model = self.best_model(pdb, sym_op, counts=counts)
+        load = ft.partial(self.load, pdb, model=model, sym_op=sym_op,
+                          counts=counts)
         ifes = [load(name) for name in names]
-        return ifes, self.cross_chain_interactions(ifes, sym_op=sym_op)
+        return ifes, self.cross_chain_interactions(ifes, sym_op=sym_op,
+                                                   counts=counts)
 
 
 @total_ordering
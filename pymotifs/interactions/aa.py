@@ -1,14 +1,27 @@
 """Import NA/AA interactions
+
+Only nucleotides and amino acids close enough to interact are given to the
+classifier. Each residue is bounded by a sphere around the mean of its atoms,
+and residues are candidates if their sphere comes within `Loader.cutoff` of
+the sphere of a residue of the other kind. As every center of a residue lies
+in its sphere, this keeps every pair whose centers, or atoms, are within the
+cutoff. Hydrogens are then only inferred for the candidates. This can be turned
+off with the 'prefilter' option of this stage.
 """
 
 import operator as op
 
+import numpy as np
+from scipy.spatial import cKDTree
+
 from pymotifs import core
 from pymotifs import models as mod
+from pymotifs.utils.units import component_type
 
 from pymotifs.units.info import Loader as UnitLoader
 from pymotifs.pdbs.info import Loader as PdbLoader
 
+from fr3d.data import Structure
 from fr3d.classifiers.base_aafg import Classifier
 
 
@@ -16,6 +29,14 @@ class Loader(core.SimpleLoader):
     allow_no_data = True
     dependencies = set([UnitLoader, PdbLoader])
 
+    cutoff = 12.0
+    """Largest distance between a nucleotide and an amino acid that are given
+    to the classifier. This must not be less than the distance the classifier
+    screens centers with, plus the length of bonds to hydrogens."""
+
+    prefilter = True
+    """If only nearby residues should be classified by default"""
+
     @property
     def table(self):
         return mod.UnitAaInteractions
@@ -26,6 +47,102 @@ class Loader(core.SimpleLoader):
     def must_recompute(self, *args, **kwargs):
         return True
 
+    def is_nucleotide(self, residue):
+        """Check if a residue should be treated as a nucleotide, which is any
+        RNA or DNA unit or anything with a base center, like modified
+        nucleotides.
+        """
+
+        if component_type(residue) in ('rna', 'dna'):
+            return True
+        return 'base' in residue.centers
+
+    def spheres(self, coordinates):
+        """Compute a bounding sphere for each residue.
+
+        :coordinates: A list with an array of atom coordinates per residue.
+        :returns: An array of the centers and an array of the radii.
+        """
+
+        centers = np.zeros((len(coordinates), 3))
+        radii = np.zeros(len(coordinates))
+        for index, coords in enumerate(coordinates):
+            coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+            centers[index] = coords.mean(axis=0)
+            radii[index] = np.sqrt(((coords - centers[index]) ** 2).
+                                   sum(axis=1)).max()
+        return centers, radii
+
+    def reachable(self, first, second):
+        """Find the spheres of two groups which are within `cutoff` of a
+        sphere in the other group.
+
+        :first: The centers and radii of the first group, as from `spheres`.
+        :second: The centers and radii of the second group.
+        :returns: A set of indexes into the first group and one into the
+        second.
+        """
+
+        centers1, radii1 = first
+        centers2, radii2 = second
+        if not len(centers1) or not len(centers2):
+            return set(), set()
+
+        cutoff = self.config[self.name].get('cutoff', self.cutoff)
+        tree = cKDTree(centers2)
+        largest = radii2.max()
+        found1 = set()
+        found2 = set()
+        for index, (center, radius) in enumerate(zip(centers1, radii1)):
+            near = tree.query_ball_point(center, cutoff + radius + largest)
+            if not near:
+                continue
+            near = np.array(near)
+            distances = np.sqrt(((centers2[near] - center) ** 2).sum(axis=1))
+            near = near[distances <= cutoff + radius + radii2[near]]
+            if len(near):
+                found1.add(index)
+                found2.update(near.tolist())
+        return found1, found2
+
+    def candidates(self, structure):
+        """Create a structure with only the nucleotides and other residues
+        which are close enough to interact. Water is never used.
+
+        :structure: The structure to filter.
+        :returns: A new structure with the candidate residues in their
+        original order.
+        """
+
+        residues = []
+        coordinates = []
+        for residue in structure.residues(polymeric=None):
+            if residue.sequence == 'HOH':
+                continue
+            coords = residue.coordinates()
+            if not len(coords):
+                continue
+            residues.append(residue)
+            coordinates.append(coords)
+
+        is_nt = [self.is_nucleotide(residue) for residue in residues]
+        nts = [index for index, flag in enumerate(is_nt) if flag]
+        others = [index for index, flag in enumerate(is_nt) if not flag]
+
+        spheres = self.spheres(coordinates)
+        found_nts, found_others = self.reachable(
+            (spheres[0][nts], spheres[1][nts]),
+            (spheres[0][others], spheres[1][others]))
+
+        keep = set(nts[index] for index in found_nts)
+        keep.update(others[index] for index in found_others)
+        kept = [residue for index, residue in enumerate(residues)
+                if index in keep]
+
+        self.logger.info("Classifying %i of %i residues in %s", len(kept),
+                         len(residues), structure.pdb)
+        return Structure(kept, pdb=structure.pdb)
+
     def annotations(self, structure):
         classifier = Classifier()
         pairs = []
@@ -41,5 +158,7 @@ class Loader(core.SimpleLoader):
 
     def data(self, pdb, **kwargs):
         structure = self.structure(pdb)
+        if self.config[self.name].get('prefilter', self.prefilter):
+            structure = self.candidates(structure)
         structure.infer_hydrogens()
         return self.annotations(structure)
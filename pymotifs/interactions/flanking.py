@@ -1,12 +1,23 @@
 """Import all flanking interactions.
 
-Runs fr3d on the given files to determine all flankng interactions and then
-imports them into the database.
+Determines all flanking interactions and then imports them into the database.
+Two nucleotides of a chain are flanking if both make a nested cWW basepair
+and they are the ends of a strand of nucleotides which do not, or they are
+neighbors but their pairs do not stack as a continuous helix. These are the
+pairs which bound hairpin, internal and junction loops.
+
+By default these are computed by running fr3d in Matlab. Setting the 'backend'
+option of this stage to 'python' instead computes them from the stored pairwise
+interactions and the order of units in each chain, which does not need Matlab.
+Matlab files are then not generated for this stage.
 """
 
 import os
 import csv
+import itertools as it
+import collections as coll
 
+import numpy as np
 
 from pymotifs import core
 from pymotifs.utils import matlab
@@ -15,6 +26,7 @@ from pymotifs import models as mod
 from pymotifs.mat_files import Loader as MatLoader
 from pymotifs.units.info import Loader as UnitLoader
 from pymotifs.pdbs.info import Loader as PdbLoader
+from pymotifs.interactions.pairwise import Loader as InterLoader
 
 
 class Loader(core.SimpleLoader):
@@ -24,7 +36,22 @@ class Loader(core.SimpleLoader):
 
     allow_no_data = True
 
-    dependencies = set([MatLoader, UnitLoader, PdbLoader])
+    dependencies = set([UnitLoader, PdbLoader, InterLoader])
+
+    backend = 'matlab'
+    """Default way to compute flanking pairs, either 'python' or 'matlab'. The
+    'python' backend is experimental, it is only checked against Matlab on
+    1GID."""
+
+    @classmethod
+    def configured_dependencies(cls, config):
+        """Matlab files are only needed when using the 'matlab' backend.
+        """
+
+        dependencies = set(cls.dependencies)
+        if cls.configured_option(config, 'backend') == 'matlab':
+            dependencies.add(MatLoader)
+        return dependencies
 
     @property
     def table(self):
@@ -59,12 +86,121 @@ class Loader(core.SimpleLoader):
 
         return data
 
-    def data(self, pdb, **kwargs):
-        """Compute the interaction annotations for a pdb file.
+    def units(self, pdb):
+        """Load all nucleotides in a structure, in chain order. Modified
+        nucleotides are included if they make a basepair.
+
+        :pdb: The pdb id.
+        :returns: A list of (unit id, model, chain, sym_op) tuples sorted by
+        model, symmetry operator, chain and position in the chain.
+        """
+
+        with self.session() as session:
+            units = mod.UnitInfo
+            inter = mod.UnitPairsInteractions
+            paired = session.query(inter.unit_id_1).\
+                filter(inter.pdb_id == pdb).\
+                filter(inter.f_lwbp != None)
+            query = session.query(units.unit_id,
+                                  units.model,
+                                  units.chain,
+                                  units.sym_op,
+                                  units.chain_index,
+                                  ).\
+                filter(units.pdb_id == pdb).\
+                filter(units.chain_index != None).\
+                filter(units.unit_type_id.in_(['rna', 'dna']) |
+                       units.unit_id.in_(paired.subquery()))
+
+            key = lambda r: (r.model, r.sym_op, r.chain, r.chain_index,
+                             r.unit_id)
+            return [tuple(r[0:4]) for r in sorted(query, key=key)]
+
+    def nested_pairs(self, pdb):
+        """Load all nested cWW basepairs in a structure.
+
+        :pdb: The pdb id.
+        :returns: A list of (unit id, unit id) tuples.
+        """
+
+        with self.session() as session:
+            inter = mod.UnitPairsInteractions
+            query = session.query(inter.unit_id_1, inter.unit_id_2).\
+                filter(inter.pdb_id == pdb).\
+                filter(inter.f_lwbp == 'cWW').\
+                filter(inter.f_crossing == 0)
+            return sorted(tuple(r) for r in query)
+
+    def flanking(self, units, pairs):
+        """Find all flanking pairs. Units must be given in chain order. For each
+        chain the units with a nested cWW pair are found and each one is
+        compared to the next such unit in the chain, both for the gap between
+        them and for if their partners are neighbors as well, as they would
+        be in a helix.
+
+        :units: A list of (unit id, model, chain, sym_op) tuples, as from
+        `units`.
+        :pairs: A list of nested cWW basepairs, as from `nested_pairs`.
+        :returns: A list of (unit id, unit id) tuples of flanking units. The
+        first unit always comes first in its chain.
+        """
+
+        if not units:
+            return []
+
+        position = dict((unit[0], index) for index, unit in enumerate(units))
+        chains = coll.defaultdict(it.count().next)
+        chain = np.array([chains[unit[1:4]] for unit in units])
+
+        partner = np.full(len(units), -1, dtype=int)
+        for unit1, unit2 in pairs:
+            if unit1 in position and unit2 in position:
+                index = position[unit1]
+                if partner[index] == -1:
+                    partner[index] = position[unit2]
+
+        paired = np.flatnonzero(partner >= 0)
+        first = paired[:-1]
+        second = paired[1:]
+        same_chain = chain[first] == chain[second]
+
+        gap = (second - first) > 1
+        partner1 = partner[first]
+        partner2 = partner[second]
+        helix = (partner2 == partner1 - 1) & \
+            (chain[partner1] == chain[np.maximum(partner2, 0)])
+
+        flanking = same_chain & (gap | ~helix)
+        return [(units[i][0], units[j][0]) for i, j in
+                zip(first[flanking], second[flanking])]
+
+    def python_data(self, pdb):
+        """Compute the flanking pairs of a structure using the stored
+        interactions.
 
         :pdb: The pdb id to process.
-        :kwargs: Keyword arguments.
-        :returns: The interaction annotations.
+        :returns: A list of flanking interaction dictionaries.
+        """
+
+        units = self.units(pdb)
+        if not units:
+            raise core.Skip('PDB file %s has no nucleotides' % pdb)
+
+        pairs = self.flanking(units, self.nested_pairs(pdb))
+        if not pairs:
+            raise core.Skip('PDB file %s has no flanking interactions' % pdb)
+
+        return [{'unit_id_1': unit1,
+                 'unit_id_2': unit2,
+                 'flanking': 1,
+                 'pdb_id': pdb} for unit1, unit2 in pairs]
+
+    def matlab_data(self, pdb):
+        """Compute the flanking pairs of a structure by running fr3d in
+        Matlab.
+
+        :pdb: The pdb id to process.
+        :returns: A list of flanking interaction dictionaries.
         """
         mlab = matlab.Matlab(str(self.config['locations']['fr3d_root']))
 
@@ -81,3 +217,19 @@ class Loader(core.SimpleLoader):
             raise core.Skip('PDB file %s has no flanking interactions' % pdb)
         raise core.InvalidState('Matlab error code %i when analyzing %s' %
                                 status, pdb)
+
+    def data(self, pdb, **kwargs):
+        """Compute the interaction annotations for a pdb file, using the
+        configured backend.
+
+        :pdb: The pdb id to process.
+        :kwargs: Keyword arguments.
+        :returns: The interaction annotations.
+        """
+
+        backend = self.config[self.name].get('backend', self.backend)
+        if backend == 'matlab':
+            return self.matlab_data(pdb)
+        if backend == 'python':
+            return self.python_data(pdb)
+        raise core.InvalidState("Unknown flanking backend %s" % backend)
@@ -7,8 +7,16 @@ as for general querying and summarizing.
 
 import collections as coll
 
+from sqlalchemy import and_
+from sqlalchemy import case
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy import literal
+from sqlalchemy import union_all
+
 from pymotifs import core
 from pymotifs import models as mod
+from pymotifs.utils import exact
 from pymotifs.constants import LONG_RANGE
 from pymotifs.interactions.pairwise import IGNORE
 
@@ -140,19 +148,92 @@ class Loader(core.SimpleLoader):
         """
 
         if name and name[0] != 'n':
-            current[name] += 1
-            current['total'] += 1
-            current[family] += 1
-            lr_inc = int(crossing > LONG_RANGE)
-            current['lr_' + name] += lr_inc
-            current['lr_total'] += lr_inc
-            current['lr_' + family] += lr_inc
+            self.add(current, family, name, 1, int(crossing > LONG_RANGE))
         return current
 
+    def add(self, current, family, name, count, long_range):
+        """Add a number of annotations of the given name to the counts. This
+        adds to the totals as well as the long range counts.
+
+        Parameters
+        ----------
+        current : dict
+            The current counts
+        family : str
+            The family of interaction, like 'bp', or 'bph', etc
+        name : str
+            The annotation to add
+        count : int
+            The number of annotations to add.
+        long_range : int
+            How many of the annotations are long range.
+
+        Returns
+        -------
+        counts : dict
+            The updated counts.
+        """
+
+        current[name] += count
+        current['total'] += count
+        current[family] += count
+        current['lr_' + name] += long_range
+        current['lr_total'] += long_range
+        current['lr_' + family] += long_range
+        return current
+
+    def annotations(self, pdb_id, dialect=None):
+        """Build a query that finds all annotations that should be counted for
+        the given structure. This applies the same rules as the `increment_*`
+        methods, except that near annotations are left to the caller to skip
+        since LIKE is not case sensitive in all databases. Each row is the
+        first unit of an interaction, the family and name of the annotation
+        and if it is long range. Names are compared by their exact value, see
+        `pymotifs.utils.exact`.
+
+        Parameters
+        ----------
+        pdb_id : str
+            The pdb id.
+        dialect : str, optional
+            The name of the database dialect the query will run on.
+
+        Returns
+        -------
+        query : Select
+            A union of the basepair, stacking and base phosphate annotations.
+        """
+
+        inter = mod.UnitPairsInteractions.__table__
+        lwbp = exact(inter.c.f_lwbp, dialect)
+        long_range = case([(inter.c.f_crossing > LONG_RANGE, 1)], else_=0)
+
+        def counted(family, column, *conditions):
+            column = exact(column, dialect)
+            return select([inter.c.unit_id_1.label('unit_id'),
+                           literal(family).label('family'),
+                           column.label('name'),
+                           long_range.label('long_range'),
+                           ]).\
+                where(inter.c.pdb_id == pdb_id).\
+                where(column != None).\
+                where(column != '').\
+                where(and_(*conditions))
+
+        return union_all(
+            counted('bps', inter.c.f_lwbp,
+                    ~lwbp.in_(sorted(self.ignore_bp))),
+            counted('stacks', inter.c.f_stacks),
+            counted('bphs', inter.c.f_bphs,
+                    inter.c.unit_id_1 != inter.c.unit_id_2,
+                    exact(inter.c.f_bphs, dialect) != '0BPh'),
+        )
+
     def data(self, pdb_id, **kwargs):
         """Compute the summary for all units in the given pdb. This will look
         up all RNA bases in the given structure and compute a summary of the
-        number of interactions for each unit.
+        number of interactions for each unit. The annotations are counted by
+        the database so only one row per unit and annotation is loaded.
 
         Parameters
         ----------
@@ -166,18 +247,31 @@ class Loader(core.SimpleLoader):
         """
 
         with self.session() as session:
-            query = session.query(mod.UnitInfo.unit_id.label('unit_id_1'),
+            dialect = session.get_bind().dialect.name
+            annotations = self.annotations(pdb_id, dialect=dialect).\
+                alias('annotations')
+            counts = select([annotations.c.unit_id,
+                             annotations.c.family,
+                             annotations.c.name,
+                             annotations.c.long_range,
+                             func.count().label('count'),
+                             ]).\
+                group_by(annotations.c.unit_id,
+                         annotations.c.family,
+                         annotations.c.name,
+                         annotations.c.long_range).\
+                alias('counts')
+
+            query = session.query(mod.UnitInfo.unit_id,
                                   mod.UnitInfo.model,
                                   mod.UnitInfo.chain,
                                   mod.UnitInfo.pdb_id,
-                                  mod.UnitPairsInteractions.unit_id_2,
-                                  mod.UnitPairsInteractions.f_lwbp,
-                                  mod.UnitPairsInteractions.f_bphs,
-                                  mod.UnitPairsInteractions.f_stacks,
-                                  mod.UnitPairsInteractions.f_crossing,
+                                  counts.c.family,
+                                  counts.c.name,
+                                  counts.c.long_range,
+                                  counts.c.count,
                                   ).\
-                outerjoin(mod.UnitPairsInteractions,
-                          mod.UnitInfo.unit_id == mod.UnitPairsInteractions.unit_id_1).\
+                outerjoin(counts, counts.c.unit_id == mod.UnitInfo.unit_id).\
                 filter(mod.UnitInfo.pdb_id == pdb_id)
                 # removed on 3/15 for for adding dna structures
                 # filter(mod.UnitInfo.unit_type_id == 'rna').\
@@ -185,16 +279,14 @@ class Loader(core.SimpleLoader):
 
             data = coll.defaultdict(lambda: coll.defaultdict(int))
             for result in query:
-                current = data[result.unit_id_1]
-                current['unit_id'] = result.unit_id_1
+                current = data[result.unit_id]
+                current['unit_id'] = result.unit_id
                 current['pdb_id'] = result.pdb_id
                 current['model'] = result.model
                 current['chain'] = result.chain
-                crossing = result.f_crossing
-                self.increment_bp(current, result.f_lwbp, crossing)
-                self.increment_stacks(current, result.f_stacks, crossing)
-                self.increment_bphs(current, result.unit_id_1,
-                                    result.unit_id_2, result.f_bphs, crossing)
-                data[current['unit_id']] = current
+                if result.name and result.name[0] != 'n':
+                    long_range = result.count if result.long_range else 0
+                    self.add(current, result.family, result.name,
+                             result.count, long_range)
 
             return [(dict(v)) for v in data.values()]
@@ -18,6 +18,7 @@ nucleotides. The disqualification codes are:
 from collections import defaultdict
 from collections import namedtuple as nt
 
+import bisect
 import operator as op
 import functools as ft
 import collections as coll
@@ -52,7 +53,8 @@ COMPLEMENTARY = {
 }
 
 
-class AssessmentData(nt('AssessmentData', ['incomplete', 'pairs', 'rsrz'])):
+class AssessmentData(nt('AssessmentData', ['incomplete', 'pairs', 'rsrz',
+                                            'positions', 'non_cww'])):
     """Just a value class to store some assessment related data.
 
     Attributes
@@ -64,10 +66,148 @@ class AssessmentData(nt('AssessmentData', ['incomplete', 'pairs', 'rsrz'])):
         interactions
     rsrz : dict
         Data on rsrz data for all nucleotides
+    positions : PositionIndex
+        The experimental sequence positions of all units
+    non_cww : dict
+        Dict mapping from unit id to the units it forms a non-cWW basepair
+        with
     """
     pass
 
 
+class PositionIndex(object):
+    """An in memory index of the experimental sequence positions of all units
+    in a structure. This is built from a single query and can then answer
+    what position a unit is at, which units are between two units and if
+    there are unobserved positions between two units.
+
+    Parameters
+    ----------
+    rows : iterable
+        Rows with the unit_id, mapped_chain, index and exp_seq_id of each
+        mapped position as well as the pdb_id, model, chain, sym_op, number,
+        unit, alt_id and ins_code of the unit, if the position is observed.
+    """
+
+    def __init__(self, rows=()):
+        self._positions = {}
+        self._alternates = defaultdict(list)
+        units = defaultdict(list)
+        missing = defaultdict(list)
+        for row in rows:
+            if row.unit_id is None:
+                missing[(row.exp_seq_id, row.mapped_chain)].append(row.index)
+                continue
+            if row.pdb_id is None:
+                continue
+
+            position = {
+                'index': row.index,
+                'exp_seq_id': row.exp_seq_id,
+                'chain': row.chain,
+                'model': row.model,
+                'sym_op': row.sym_op,
+            }
+            self._positions.setdefault(row.unit_id, position)
+            self._alternates[self.__base_id__(row.unit_id)].append(row.unit_id)
+
+            key = (row.exp_seq_id, row.chain, row.model, row.sym_op)
+            entry = Entry(row.pdb_id, row.model, row.chain, row.number,
+                          row.unit, row.alt_id, row.ins_code)
+            units[key].append((row.index, entry))
+
+        self._units = {}
+        for key, entries in units.items():
+            entries.sort()
+            self._units[key] = ([e[0] for e in entries],
+                                [e[1] for e in entries])
+        self._missing = dict((k, sorted(v)) for k, v in missing.items())
+
+    def __contains__(self, unit):
+        return unit in self._positions
+
+    def __base_id__(self, unit):
+        return '|'.join(unit.split('|')[0:5])
+
+    def position(self, unit):
+        """Get the position of a unit. If the unit itself is not mapped, the
+        position of an alternate id for it, one which has the same pdb, model,
+        chain, sequence and number, is used.
+
+        Parameters
+        ----------
+        unit : str
+            The unit id to look up.
+
+        Returns
+        -------
+        position : dict
+            A dict of the index, exp_seq_id, chain, model and sym_op of the
+            unit or None if it is not mapped.
+        """
+
+        if unit in self._positions:
+            return self._positions[unit]
+
+        prefix = unit + '|'
+        for other in self._alternates.get(self.__base_id__(unit), []):
+            if other.startswith(prefix):
+                return self._positions[other]
+        return None
+
+    def between(self, start, stop):
+        """Get all units between two positions, inclusive. This only finds
+        units with the same chain, model and symmetry operator as the start.
+
+        Parameters
+        ----------
+        start : dict
+            The starting position, as from `position`.
+        stop : dict
+            The ending position.
+
+        Returns
+        -------
+        units : list
+            A list of the distinct `Entry` of each unit, ordered by index.
+        """
+
+        key = (start['exp_seq_id'], start['chain'], start['model'],
+               start['sym_op'])
+        indices, entries = self._units.get(key, ([], []))
+        lower = bisect.bisect_left(indices, start['index'])
+        upper = bisect.bisect_right(indices, stop['index'])
+
+        seen = set()
+        units = []
+        for entry in entries[lower:upper]:
+            if entry not in seen:
+                seen.add(entry)
+                units.append(entry)
+        return units
+
+    def has_missing(self, start, stop):
+        """Check if there are any unobserved positions in the chain of the
+        start position, between the two positions.
+
+        Parameters
+        ----------
+        start : dict
+            The starting position, as from `position`.
+        stop : dict
+            The ending position.
+
+        Returns
+        -------
+        missing : bool
+            True if any position in the range is not observed.
+        """
+
+        indices = self._missing.get((start['exp_seq_id'], start['chain']), [])
+        lower = bisect.bisect_left(indices, start['index'])
+        return lower < len(indices) and indices[lower] <= stop['index']
+
+
 class Loader(core.SimpleLoader):
     dependencies = set([InfoLoader, PositionLoader,
                         ExpSeqPositionLoader, ExpSeqMappingLoader,
@@ -258,101 +398,127 @@ class Loader(core.SimpleLoader):
                 loop['endpoints'] = [(e1, e2) for (e1, e2) in grouper(2, ends)]
             return sorted(loops, key=op.itemgetter('id'))
 
-    def position_info(self, unit):
-        """Get the information about a position in an experimental sequence
-        using a unit id.
-        """
+    def positions(self, pdb):
+        """Load the experimental sequence positions of all units in a
+        structure.
 
-        self.logger.debug("Finding position for %s", unit)
-        try:
-            with self.session() as session:
-                pos = mod.ExpSeqPosition
-                mapping = mod.ExpSeqUnitMapping
-                result = session.query(pos.index,
-                                       pos.exp_seq_id,
-                                       mod.UnitInfo.chain,
-                                       mod.UnitInfo.model,
-                                       mod.UnitInfo.sym_op,
-                                       ).\
-                    join(mapping,
-                         mapping.exp_seq_position_id == pos.exp_seq_position_id).\
-                    join(mod.UnitInfo,
-                         mod.UnitInfo.unit_id == mapping.unit_id).\
-                    filter(mapping.unit_id == unit).\
-                    one()
-
-            return row2dict(result)
-        except:
-            # handle the case where the unit id in the database table ends with ||A or ||B
-            # but that is not being stored in unit.  Not sure why not.
-            self.logger.info('Looking up sequence position of alternates of '+unit)
-            newunit = '%' + unit + '%'
-            with self.session() as session:
-                pos = mod.ExpSeqPosition
-                mapping = mod.ExpSeqUnitMapping
-                result = session.query(pos.index,
-                                       pos.exp_seq_id,
-                                       mod.UnitInfo.chain,
-                                       mod.UnitInfo.model,
-                                       mod.UnitInfo.sym_op,
-                                       ).\
-                    join(mapping,
-                         mapping.exp_seq_position_id == pos.exp_seq_position_id).\
-                    join(mod.UnitInfo,
-                         mod.UnitInfo.unit_id == mapping.unit_id).\
-                    filter(mapping.unit_id.like(newunit)).\
-                    first()
-
-            if not result:
-                self.logger.info('No experimental sequence position for ' + unit)
-
-            return row2dict(result)
-
-
-    def units_between(self, unit1, unit2):
-        """Get a list of all units between two units. This assumes they are on
-        the same chain and have the same symmetry operator.
+        Parameters
+        ----------
+        pdb : str
+            The pdb id to use.
+
+        Returns
+        -------
+        positions : PositionIndex
+            The index of all positions in the structure.
         """
 
-        start = self.position_info(unit1)
-        stop = self.position_info(unit2)
         with self.session() as session:
-            units = mod.UnitInfo
-            mapping = mod.ExpSeqUnitMapping
             pos = mod.ExpSeqPosition
-            query = session.query(units.pdb_id,
+            mapping = mod.ExpSeqUnitMapping
+            chains = mod.ExpSeqChainMapping
+            units = mod.UnitInfo
+            query = session.query(mapping.unit_id,
+                                  mapping.chain.label('mapped_chain'),
+                                  pos.index,
+                                  pos.exp_seq_id,
+                                  units.pdb_id,
                                   units.model,
                                   units.chain,
+                                  units.sym_op,
                                   units.number,
                                   units.unit,
                                   units.alt_id,
                                   units.ins_code,
                                   ).\
-                join(mapping,
-                     mapping.unit_id == units.unit_id).\
                 join(pos,
                      mapping.exp_seq_position_id == pos.exp_seq_position_id).\
-                filter(pos.exp_seq_id == start['exp_seq_id']).\
-                filter(pos.index >= start['index']).\
-                filter(pos.index <= stop['index']).\
-                filter(units.chain == start['chain']).\
-                filter(units.model == start['model']).\
-                filter(units.sym_op == start['sym_op']).\
-                distinct().\
-                order_by(asc(pos.index))
-
-            return [Entry(**row2dict(r)) for r in query]
-
-    def complementary_sequence(self, loop):
+                join(chains,
+                     chains.exp_seq_chain_mapping_id == mapping.exp_seq_chain_mapping_id).\
+                join(mod.ChainInfo,
+                     mod.ChainInfo.chain_id == chains.chain_id).\
+                outerjoin(units, units.unit_id == mapping.unit_id).\
+                filter(mod.ChainInfo.pdb_id == pdb)
+
+            return PositionIndex(query)
+
+    def non_cww_pairs(self, pdb):
+        """Load all non-cWW basepairs, excluding nears, in a structure.
+
+        Parameters
+        ----------
+        pdb : str
+            The pdb id to use.
+
+        Returns
+        -------
+        pairs : dict
+            A dict mapping from unit id to the set of units it forms a non-cWW
+            basepair with.
+        """
+
+        with self.session() as session:
+            inters = mod.UnitPairsInteractions
+            bps = mod.BpFamilyInfo
+            query = session.query(inters.unit_id_1, inters.unit_id_2).\
+                join(bps, bps.bp_family_id == inters.f_lwbp).\
+                filter(inters.pdb_id == pdb).\
+                filter(bps.is_near == 0).\
+                filter(bps.bp_family_id != 'cWW')
+
+            pairs = defaultdict(set)
+            for result in query:
+                pairs[result.unit_id_1].add(result.unit_id_2)
+            return dict(pairs)
+
+    def position_info(self, unit, positions=None):
+        """Get the information about a position in an experimental sequence
+        using a unit id.
+        """
+
+        self.logger.debug("Finding position for %s", unit)
+        if positions is None:
+            positions = self.positions(unit.split('|')[0])
+
+        if unit not in positions:
+            # handle the case where the unit id in the database table ends
+            # with ||A or ||B but that is not being stored in unit.
+            self.logger.info('Looking up sequence position of alternates of ' +
+                             unit)
+
+        result = positions.position(unit)
+        if result is None:
+            self.logger.info('No experimental sequence position for ' + unit)
+        return result
+
+    def units_between(self, unit1, unit2, positions=None):
+        """Get a list of all units between two units. This assumes they are on
+        the same chain and have the same symmetry operator.
+        """
+
+        if positions is None:
+            positions = self.positions(unit1.split('|')[0])
+
+        start = self.position_info(unit1, positions=positions)
+        stop = self.position_info(unit2, positions=positions)
+        if start is None or stop is None:
+            raise core.InvalidState("Cannot find units between %s and %s" %
+                                    (unit1, unit2))
+        return positions.between(start, stop)
+
+    def complementary_sequence(self, loop, positions=None):
         """Detect if a sequence is complementary.
         """
 
         if len(loop['units']) % 2 != 0:
             return False
 
+        if positions is None:
+            positions = self.positions(loop['pdb'])
+
         parts = []
         for (start, stop) in loop['endpoints']:
-            units = self.units_between(start, stop)
+            units = self.units_between(start, stop, positions=positions)
             parts.append([u.unit for u in units])
 
         pair = zip(parts, reversed(parts))
@@ -366,23 +532,17 @@ class Loader(core.SimpleLoader):
 
         return True
 
-    def has_no_non_cWW(self, loop):
+    def has_no_non_cWW(self, loop, non_cww=None):
         """Check if there are non-cWW interactions within the loop.
         """
 
-        with self.session() as session:
-            inters = mod.UnitPairsInteractions
-            bps = mod.BpFamilyInfo
-            query = session.query(inters).\
-                join(bps, bps.bp_family_id == inters.f_lwbp).\
-                filter(inters.unit_id_1.in_(loop['nts'])).\
-                filter(inters.unit_id_2.in_(loop['nts'])).\
-                filter(bps.is_near == 0).\
-                filter(bps.bp_family_id != 'cWW')
+        if non_cww is None:
+            non_cww = self.non_cww_pairs(loop['pdb'])
 
-            return not bool(query.count())
+        nts = set(loop['nts'])
+        return not any(non_cww.get(nt, set()) & nts for nt in nts)
 
-    def is_complementary(self, loop):
+    def is_complementary(self, loop, positions=None, non_cww=None):
         """Check if a loop has a complementary sequence. This requires that the
         loop have no non-cWW basepairs (though near are allowed) between them.
         If so then we consider it as a complemenatry loop since it is likely
@@ -392,57 +552,57 @@ class Loader(core.SimpleLoader):
         if loop['type'] != 'IL':
             return False
 
-        return self.has_no_non_cWW(loop) and self.complementary_sequence(loop)
+        return self.has_no_non_cWW(loop, non_cww=non_cww) and \
+            self.complementary_sequence(loop, positions=positions)
 
-    def modified_bases(self, loop):
+    def modified_bases(self, loop, positions=None):
         """Get a list of all modified bases, if any in this loop.
         """
 
+        if positions is None:
+            positions = self.positions(loop['pdb'])
+
         modified = []
         normal = ft.partial(op.contains, set(['A', 'C', 'G', 'U']))
         for (start, end) in loop['endpoints']:
-            units = self.units_between(start, end)
+            units = self.units_between(start, end, positions=positions)
             modified.extend(u.unit for u in units if not normal(u.unit))
 
         return modified
 
-    def has_modified(self, loop):
+    def has_modified(self, loop, positions=None):
         """Check if there are any modified nucleotides in the loops. These
         cannot yet be processed.
         """
-        return bool(self.modified_bases(loop))
+        return bool(self.modified_bases(loop, positions=positions))
 
-    def has_breaks(self, loop):
+    def has_breaks(self, loop, positions=None):
         """Check if there are any chain breaks within the loop.
 
         :returns: Bool, true if the loop has any breaks.
         """
 
+        if positions is None:
+            positions = self.positions(loop['pdb'])
+
         for (u1, u2) in loop['endpoints']:
-            start = self.position_info(u1)
-            stop = self.position_info(u2)
-
-            with self.session() as session:
-                mapping = mod.ExpSeqUnitMapping
-                pos = mod.ExpSeqPosition
-                query = session.query(mapping).\
-                    join(pos,
-                         mapping.exp_seq_position_id == pos.exp_seq_position_id).\
-                    filter(pos.exp_seq_id == start['exp_seq_id']).\
-                    filter(pos.index >= start['index']).\
-                    filter(pos.index <= stop['index']).\
-                    filter(mapping.chain == start['chain']).\
-                    filter(mapping.unit_id == None)
-
-                return bool(query.count())
-
-    def has_incomplete_nucleotides(self, incomplete, loop):
+            start = self.position_info(u1, positions=positions)
+            stop = self.position_info(u2, positions=positions)
+            if start is None or stop is None:
+                raise core.InvalidState("Cannot find positions of %s and %s" %
+                                        (u1, u2))
+            return positions.has_missing(start, stop)
+
+    def has_incomplete_nucleotides(self, incomplete, loop, positions=None):
         """Check if any of the nucleotides in the loop are incomplete, that is
         are missing atoms that they should not be.
         """
 
+        if positions is None:
+            positions = self.positions(loop['pdb'])
+
         for (u1, u2) in loop['endpoints']:
-            for unit in self.units_between(u1, u2):
+            for unit in self.units_between(u1, u2, positions=positions):
                 if unit in incomplete:
                     return True
         return False
@@ -550,17 +710,19 @@ class Loader(core.SimpleLoader):
             The status code
         """
 
-        if self.has_breaks(loop):
+        if self.has_breaks(loop, positions=assess.positions):
             return 2
-        if self.has_modified(loop):
+        if self.has_modified(loop, positions=assess.positions):
             return 3
         if self.bad_chain_number(loop):
             return 4
         if self.too_many_sym_ops(loop):
             return 7
-        if self.has_incomplete_nucleotides(assess.incomplete, loop):
+        if self.has_incomplete_nucleotides(assess.incomplete, loop,
+                                           positions=assess.positions):
             return 5
-        if self.is_complementary(loop):
+        if self.is_complementary(loop, positions=assess.positions,
+                                 non_cww=assess.non_cww):
             return 6
         if self.is_fictional_loop(assess.rsrz, loop):
             return 8
@@ -587,12 +749,14 @@ class Loader(core.SimpleLoader):
 
         self.logger.debug("Examining loop %s", str(loop))
         seq = None
-        if self.is_complementary(loop):
+        if self.is_complementary(loop, positions=assess.positions,
+                                 non_cww=assess.non_cww):
             seq = loop['seq'].replace('*', ',')
 
         mods = None
-        if self.modified_bases(loop):
-            mods = ', '.join(self.modified_bases(loop))
+        modified = self.modified_bases(loop, positions=assess.positions)
+        if modified:
+            mods = ', '.join(modified)
 
         return {
             'loop_id': loop['id'],
@@ -605,7 +769,9 @@ class Loader(core.SimpleLoader):
     def assessment_data(self, pdb):
         return AssessmentData(incomplete=self.incomplete(pdb),
                               pairs=self.paired(pdb),
-                              rsrz=self.rsrz_data(pdb))
+                              rsrz=self.rsrz_data(pdb),
+                              positions=self.positions(pdb),
+                              non_cww=self.non_cww_pairs(pdb))
 
     def data(self, pdb, **kwargs):
         """Compute the qa status of each loop in the structure.
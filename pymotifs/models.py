@@ -1,16 +1,30 @@
 """This contains the logic required to reflect the database tables as
 sqlalchemy classes in python. It also has additional logic to extension the
 reflection to include views which do not have a primary key.
+
+Reflecting the whole schema takes a noticeable amount of time with a remote
+database. To avoid this the reflected metadata can be cached in a pickle file,
+keyed by a fingerprint of the schema. When there is no cache the tables can
+instead be reflected lazily, each one is reflected the first time the class
+for it is used.
 """
 
+import os
 import re
+import sys
+import glob
+import types
+import pickle
+import hashlib
 import logging
 
+import sqlalchemy as sa
 from sqlalchemy import Table
 from sqlalchemy import Column
 from sqlalchemy import String
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
+from sqlalchemy.dialects import mysql
 
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -21,6 +35,26 @@ logger = logging.getLogger(__name__)
 metadata = MetaData()
 Base = declarative_base(metadata=metadata)
 
+"""Version of the cached metadata, change to invalidate all caches."""
+CACHE_VERSION = '1'
+
+"""Primary keys for the views which cannot be reflected with one."""
+VIEW_KEYS = {
+    'exp_seq_pdb': [('exp_seq_id', String),
+                    ('pdb_id', String),
+                    ('chain_id', Integer)],
+    'correspondence_pdbs': [('correspondence_id', String),
+                            ('chain_id_1', Integer),
+                            ('chain_id_2', Integer)],
+    'correspondence_units': [('correspondence_id', String),
+                             ('unit_id_1', String),
+                             ('unit_id_2', String)],
+}
+
+"""State for lazy reflection, the engine to use and a mapping from class name
+to table name."""
+_lazy = {'engine': None, 'names': None}
+
 
 class TempPdbs(Base):
     """A class used to when storing pdb_ids temporarily. This is a temporary
@@ -37,6 +71,63 @@ class TempPdbs(Base):
     pdb_id = Column(String(4), primary_key=True)
 
 
+def exact_string(length):
+    """A string type which compares by its exact value. In MySQL this is a
+    BINARY column, so keys like chains A and a do not collide, other databases
+    create a plain VARCHAR. Unlike a type variant this can be pickled when
+    caching the metadata.
+    """
+    return mysql.VARCHAR(length, binary=True)
+
+
+class UnitAtomCounts(Base):
+    """The number of C, N, O and P atoms in the stored coordinates of each
+    unit. This is written by `pymotifs.units.atom_counts` and created by
+    `pymotifs.schema.create_declared`.
+
+    Attributes
+    ----------
+    unit_id : Column
+        The unit id.
+    heavy_atoms : Column
+        The number of atoms.
+    """
+
+    __tablename__ = 'unit_atom_counts'
+    unit_id = Column(exact_string(30), primary_key=True)
+    heavy_atoms = Column(Integer, nullable=False)
+
+
+class ChainClashCounts(Base):
+    """The number of clashes between heavy atoms of nucleotides in each pair
+    of chains. This is written by `pymotifs.quality.clash_counts` and created
+    by `pymotifs.schema.create_declared`.
+
+    Attributes
+    ----------
+    pdb_id : Column
+        The PDB id.
+    model : Column
+        The model of both chains.
+    sym_op : Column
+        The symmetry operator of both chains.
+    chain_1 : Column
+        The chain of the first unit in each clash.
+    chain_2 : Column
+        The chain of the second unit in each clash.
+    clashes : Column
+        The number of clashes.
+    """
+
+    __tablename__ = 'chain_clash_counts'
+    pdb_id = Column(String(4), primary_key=True)
+    model = Column(Integer, primary_key=True)
+    sym_op = Column(String(10), primary_key=True)
+    chain_1 = Column(exact_string(10), primary_key=True)
+    chain_2 = Column(exact_string(10), primary_key=True)
+    clashes = Column(Integer, nullable=False)
+
+
 def camelize_classname(tablename):
     """Turn a tablename into a class name. This will turn strings like
     'some_table' into 'SomeTable'. The tablename is how we name things in the
@@ -77,11 +168,32 @@ def should_reflect(tablename, *args):
     return name not in globals()
 
 
+def define_missing_view(metadata, name):
+    """Define the primary key of a single view, see `define_missing_views`.
+
+    Parameters
+    ----------
+    metadata : MetaData
+        The metadata object to attach the Table to.
+    name : str
+        The name of the view.
+
+    Returns
+    -------
+    table : Table
+        The Table of the view.
+    """
+
+    columns = [Column(column, type_, primary_key=True)
+               for column, type_ in VIEW_KEYS[name]]
+    return Table(name, metadata, *columns, extend_existing=True)
+
+
 def define_missing_views(metadata):
     """A functionn to define the primary keys for views. We need to do this so
     we can reflect these views. It will produce Table objects that are attached
     to the given metadata. The objects need only specify the columns that are
-    the primary keys.
+    the primary keys. The keys are listed in `VIEW_KEYS`.
 
     Parameters
     ----------
@@ -89,31 +201,180 @@ def define_missing_views(metadata):
         The metadata object to attach the Tables to.
     """
 
-    Table('exp_seq_pdb', metadata,
-          Column('exp_seq_id', String, primary_key=True),
-          Column('pdb_id', String, primary_key=True),
-          Column('chain_id', Integer, primary_key=True),
-          extend_existing=True)
+    for name in sorted(VIEW_KEYS):
+        define_missing_view(metadata, name)
+
+
+def map_tables(names=None):
+    """Create a class for reflected tables in the metadata.
+
+    Parameters
+    ----------
+    names : list, optional
+        The tables to create classes for, defaults to all tables.
+    """
 
-    Table('correspondence_pdbs', metadata,
-          Column('correspondence_id', String, primary_key=True),
-          Column('chain_id_1', Integer, primary_key=True),
-          Column('chain_id_2', Integer, primary_key=True),
-          extend_existing=True)
+    glo = globals()
+    for name, obj in metadata.tables.items():
+        if names is not None and name not in names:
+            continue
 
-    Table('correspondence_units', metadata,
-          Column('correspondence_id', String, primary_key=True),
-          Column('unit_id_1', String, primary_key=True),
-          Column('unit_id_2', String, primary_key=True),
-          extend_existing=True)
+        classname = camelize_classname(name)
+        try:
+            glo[classname] = type(classname, (Base,), {'__table__': obj})
+        except:
+            logger.debug("Could not reflect table %s", name)
 
 
-def reflect(engine):
+def schema_fingerprint(engine):
+    """Compute a fingerprint of the schema of the database. This hashes the
+    listing of all columns of all tables and views, so it will change whenever
+    the schema does.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine to use.
+
+    Returns
+    -------
+    fingerprint : str
+        A hex digest, or None if the database is not MySQL or SQLite.
+    """
+
+    if engine.dialect.name == 'mysql':
+        query = ("SELECT table_name, column_name, column_type, column_key, "
+                 "is_nullable FROM information_schema.columns "
+                 "WHERE table_schema = DATABASE() "
+                 "ORDER BY table_name, ordinal_position")
+    elif engine.dialect.name == 'sqlite':
+        query = "SELECT type, name, sql FROM sqlite_master ORDER BY type, name"
+    else:
+        return None
+
+    md5 = hashlib.md5(CACHE_VERSION + '\t' + sa.__version__ + '\n')
+    for row in engine.execute(query):
+        md5.update('\t'.join(str(value) for value in row) + '\n')
+    return md5.hexdigest()
+
+
+def cache_filename(cache, fingerprint):
+    """Compute the name of the file to cache metadata in.
+
+    Parameters
+    ----------
+    cache : str
+        The cache directory.
+    fingerprint : str
+        The schema fingerprint.
+
+    Returns
+    -------
+    filename : str
+        The path of the cache file.
+    """
+    return os.path.join(cache, 'models-%s.pickle' % fingerprint)
+
+
+def save_cache(filename):
+    """Write the reflected metadata to the given file. Caches for other
+    fingerprints are removed as they are out of date.
+
+    Parameters
+    ----------
+    filename : str
+        The cache file to write.
+    """
+
+    directory = os.path.dirname(filename)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    for old in glob.glob(os.path.join(directory, 'models-*.pickle')):
+        if old != filename:
+            os.remove(old)
+
+    temp = filename + '.tmp'
+    with open(temp, 'wb') as out:
+        pickle.dump(metadata, out, 2)
+    os.rename(temp, filename)
+
+
+def load_cache(filename):
+    """Load the metadata cached in the given file and create the classes for
+    all tables in it.
+
+    Parameters
+    ----------
+    filename : str
+        The cache file to load.
+    """
+
+    with open(filename, 'rb') as raw:
+        cached = pickle.load(raw)
+
+    for table in cached.sorted_tables:
+        if table.key not in metadata.tables:
+            table.tometadata(metadata)
+    map_tables()
+
+
+def lazy_class(classname):
+    """Reflect the table for the given class name and create the class for
+    it. This is used to access tables when using lazy reflection.
+
+    Parameters
+    ----------
+    classname : str
+        The name of the class, as created by `camelize_classname`.
+
+    Raises
+    ------
+    AttributeError
+        If lazy reflection is not used or there is no such table.
+
+    Returns
+    -------
+    klass : object
+        The class for the table.
+    """
+
+    engine = _lazy['engine']
+    if engine is None:
+        raise AttributeError(classname)
+
+    if _lazy['names'] is None:
+        inspector = sa.inspect(engine)
+        names = inspector.get_table_names() + inspector.get_view_names()
+        _lazy['names'] = dict((camelize_classname(n), n) for n in names)
+
+    name = _lazy['names'].get(classname)
+    if name is None:
+        raise AttributeError(classname)
+
+    logger.debug("Lazily reflecting %s", name)
+    Table(name, metadata, autoload=True, autoload_with=engine)
+    if name in VIEW_KEYS:
+        define_missing_view(metadata, name)
+    map_tables([name])
+
+    if classname not in globals():
+        raise AttributeError(classname)
+    return globals()[classname]
+
+
+def reflect(engine, cache=None, lazy=False):
     """Reflect all tables/views from the database into python. This cannot
     reflect any table/view that does not have a primary key as this is a
     limitation of sqlalchemy. For those that cannot be reflected exactly
     entries in `define_missing_views` must be added.
 
+    If a cache directory is given the reflected metadata is loaded from it, if
+    it has been cached for the current schema, and otherwise the metadata is
+    written to it after reflecting. If lazy is given and there is no usable
+    cache, nothing is reflected now and each table is reflected when its class
+    is first accessed.
+
     Modified from
     https://charleslavery.com/notes/sqlalchemy-reflect-tables-to-declarative.html
 
@@ -121,17 +382,71 @@ def reflect(engine):
     ----------
     engine : sqlalchemy.engine.Engine
         The engine to use.
+    cache : str, optional
+        The directory to cache reflected metadata in.
+    lazy : bool, optional
+        If tables should be reflected as needed when there is no cache.
     """
 
     metadata.bind = engine
+    _lazy['engine'] = None
+    _lazy['names'] = None
+
+    filename = None
+    if cache:
+        fingerprint = schema_fingerprint(engine)
+        if fingerprint:
+            filename = cache_filename(cache, fingerprint)
+
+    if filename and os.path.exists(filename):
+        try:
+            load_cache(filename)
+            logger.debug("Loaded models from %s", filename)
+            return
+        except Exception as err:
+            logger.warning("Could not load cached models from %s", filename)
+            logger.exception(err)
+
+    if lazy:
+        _lazy['engine'] = engine
+        return
+
     metadata.reflect(only=should_reflect, views=True)
     define_missing_views(metadata)
+    map_tables()
 
-    glo = globals()
-    for name, obj in metadata.tables.items():
-        classname = camelize_classname(name)
+    if filename:
+        try:
+            save_cache(filename)
+        except Exception as err:
+            logger.warning("Could not cache models in %s", filename)
+            logger.exception(err)
+
+
+class LazyModels(types.ModuleType):
+    """A wrapper around this module so that tables which have not been
+    reflected yet are reflected when they are accessed, see `lazy_class`. All
+    other attribute access goes to the module itself.
+    """
+
+    def __init__(self, module):
+        super(LazyModels, self).__init__(module.__name__, module.__doc__)
+        self.__dict__['_module'] = module
 
+    def __getattr__(self, name):
+        module = self.__dict__['_module']
         try:
-            glo[classname] = type(classname, (Base,), {'__table__': obj})
-        except:
-            logger.debug("Could not reflect table %s", name)
+            return getattr(module, name)
+        except AttributeError:
+            if name.startswith('__'):
+                raise
+            return module.lazy_class(name)
+
+    def __setattr__(self, name, value):
+        setattr(self.__dict__['_module'], name, value)
+
+    def __delattr__(self, name):
+        delattr(self.__dict__['_module'], name)
+
+
+sys.modules[__name__] = LazyModels(sys.modules[__name__])
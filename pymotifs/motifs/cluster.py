@@ -27,6 +27,11 @@ potential errors will have smaller impact.
 If matlab fails, python tries to restart the same process several times. This
 is done based on the observation that sometimes a FR3D search can crash, but
 will run smoothly the next time round without any intervention.
+
+Setting the 'backend' option of motifs.cluster to 'python' instead runs the
+all-against-all comparison with `pymotifs.motifs.search`, in a pool of
+processes, and writes the resulting match matrix to MM_python.txt in the
+release directory. This does not run the Matlab clustering of the matrix.
 """
 
 import os
@@ -38,6 +43,7 @@ from subprocess import Popen, list2cmdline
 
 from pymotifs import core
 from pymotifs.utils import matlab
+from pymotifs.motifs.search import AllAgainstAll
 
 SCRIPT = """
 cd '{base}'
@@ -54,6 +60,7 @@ class ClusterMotifs(core.Base):
     jobs = 4
     script_prefix = 'aAa_script_'
     retries = 3
+    backend = 'matlab'
 
     def __init__(self, *args):
         super(ClusterMotifs, self).__init__(*args)
@@ -212,6 +219,29 @@ class ClusterMotifs(core.Base):
         for filename in glob.glob(scripts):
             os.remove(filename)
 
+    def search(self, loop_type, loops, release_id, output_dir):
+        """Compare all loops against each other in Python. Checkpoints are kept
+        per loop type and release, so rerunning an interrupted release only
+        computes the missing comparisons.
+
+        :loop_type: The type of loops being clustered.
+        :loops: The loop ids to compare.
+        :release_id: The motif release being created.
+        :output_dir: The release directory to write the match matrix to.
+        :returns: The filename of the match matrix.
+        """
+
+        searcher = self._create(AllAgainstAll)
+        checkpoints = os.path.join(self.config['locations']['releases_dir'],
+                                   'checkpoints', loop_type + '_' + release_id)
+        matrix = searcher(searcher.loops(loops), checkpoints,
+                          workers=self.config[self.name].get('jobs', self.jobs))
+
+        filename = os.path.join(output_dir, 'MM_python.txt')
+        searcher.save(matrix, loops, filename)
+        self.logger.info('Saved match matrix into %s' % filename)
+        return filename
+
     def __call__(self, loop_type, loops, release_id):
         """Launch the main matlab motif clustering pipeline. This will cluster
         motifs of the given type for the given pdb files. This will get all
@@ -226,6 +256,12 @@ class ClusterMotifs(core.Base):
         if not loops:
             raise ValueError("Must give loops to cluster")
 
+        backend = self.config[self.name].get('backend', self.backend)
+        if backend == 'python':
+            output_dir = self.make_release_directory(loop_type, release_id)
+            self.search(loop_type, loops, release_id, output_dir)
+            return output_dir
+
         self._clean_up()
 
         output_dir = self.make_release_directory(loop_type, release_id)
@@ -0,0 +1,455 @@
+"""All against all comparison of loops for motif clustering.
+
+This compares every loop in a set against every other loop and produces a
+matrix of match codes, like the one the Matlab clustering builds with
+aAaSearches and aSymmetrizeMatrix. Two loops of the same size match if the
+geometric discrepancy between their bases, taken in loop position order, is
+below a cutoff. A geometric match is then disqualified if the two loops make
+conflicting basepairs, or a basepair in one is a stack in the other, using the
+same rules and codes as aSymmetrizeMatrix.
+
+The comparisons are split into square tiles of the upper triangle of the matrix
+and run in a pool of processes. Each finished tile is saved as a checkpoint, so
+an interrupted run can be resumed, and the final matrix is merged from the
+tiles in a fixed order, so the result does not depend on the order in which
+the tiles finish.
+"""
+
+import os
+import csv
+import glob
+import hashlib
+import collections as coll
+from multiprocessing import Pool
+
+import numpy as np
+
+from fr3d.geometry.discrepancy import matrix_discrepancy
+
+from pymotifs import core
+from pymotifs import models as mod
+
+"""The code for two loops which do not match."""
+NO_MATCH = 0
+
+"""The code for two loops which match."""
+MATCH = 1
+
+"""The code for a match disqualified by conflicting basepairs."""
+BASEPAIR_MISMATCH = 7
+
+"""The code for a match disqualified by a basepair matching a stack."""
+BASESTACK_MISMATCH = 8
+
+"""Basepair families, numbered like the Edge codes of FR3D. A family with the
+edges reversed, like cHW, gets the negative code of its family."""
+FAMILIES = ['cWW', 'tWW', 'cWH', 'tWH', 'cWS', 'tWS',
+            'cHH', 'tHH', 'cHS', 'tHS', 'cSS', 'tSS']
+
+"""The FR3D code used for all stacks."""
+STACK = 21
+
+"""Families which are the same with the edges reversed."""
+SYMMETRIC_PAIRS = set([1, 2, 7, 8, 11, 12])
+
+Loop = coll.namedtuple('Loop', ['loop_id', 'centers', 'rotations', 'edges'])
+
+
+def edge_code(family, stack):
+    """Convert the annotations between two nucleotides into an FR3D edge
+    code.
+
+    Parameters
+    ----------
+    family : str
+        The basepair annotation, like 'cWH', or None.
+    stack : str
+        The stacking annotation, like 's35', or None.
+
+    Returns
+    -------
+    code : int
+        The edge code, 0 if there is no basepair or stack.
+    """
+
+    if family and len(family) == 3:
+        if family in FAMILIES:
+            return FAMILIES.index(family) + 1
+        reverse = family[0] + family[2] + family[1]
+        if reverse in FAMILIES:
+            return -(FAMILIES.index(reverse) + 1)
+    if stack and stack in ('s33', 's35', 's53', 's55'):
+        return STACK
+    return 0
+
+
+def compare_interactions(edges1, edges2):
+    """Check if two aligned loops make conflicting interactions. This is the
+    check done by aSymmetrizeMatrix.
+
+    Parameters
+    ----------
+    edges1 : numpy.array
+        The matrix of edge codes of the first loop.
+    edges2 : numpy.array
+        The matrix of edge codes of the second loop.
+
+    Returns
+    -------
+    code : int
+        BASEPAIR_MISMATCH or BASESTACK_MISMATCH if the loops conflict, MATCH
+        otherwise.
+    """
+
+    upper = np.triu(np.ones(edges1.shape, dtype=bool), 1)
+    abs1 = np.abs(edges1)
+    abs2 = np.abs(edges2)
+    pairs1 = (abs1 > 0) & (abs1 <= 12)
+    pairs2 = (abs2 > 0) & (abs2 <= 12)
+    symmetric = np.in1d(abs1, list(SYMMETRIC_PAIRS)).reshape(abs1.shape)
+
+    both = upper & pairs1 & pairs2
+    different = abs1 != abs2
+    reversed_ = ~symmetric & (edges1 != edges2) & ~different
+    stacks1 = (abs1 >= 21) & (abs1 <= 23)
+    stacks2 = (abs2 >= 21) & (abs2 <= 23)
+    stacked = upper & ((pairs1 & stacks2) | (pairs2 & stacks1))
+
+    # Conflicts are reported in the order aSymmetrizeMatrix finds them
+    pair_conflict = both & (different | reversed_)
+    for i, j in zip(*np.nonzero(pair_conflict | stacked)):
+        if pair_conflict[i, j]:
+            return BASEPAIR_MISMATCH
+        return BASESTACK_MISMATCH
+    return MATCH
+
+
+def compare(loop1, loop2, cutoff):
+    """Compare two loops.
+
+    Parameters
+    ----------
+    loop1 : Loop
+        The first loop.
+    loop2 : Loop
+        The second loop.
+    cutoff : float
+        The largest discrepancy of a match.
+
+    Returns
+    -------
+    code : int
+        The match code of the two loops.
+    """
+
+    if len(loop1.centers) != len(loop2.centers):
+        return NO_MATCH
+
+    disc = matrix_discrepancy(loop1.centers, loop1.rotations,
+                              loop2.centers, loop2.rotations)
+    if np.isnan(disc) or disc > cutoff:
+        return NO_MATCH
+    return compare_interactions(loop1.edges, loop2.edges)
+
+
+def compare_tile(task):
+    """Compare all loops of one tile. This is run in the worker processes and
+    so is a plain function.
+
+    Parameters
+    ----------
+    task : tuple
+        The tile as (row start, column start, row loops, column loops,
+        cutoff).
+
+    Returns
+    -------
+    result : tuple
+        The tile row and column start and the matrix of match codes.
+    """
+
+    row, column, rows, columns, cutoff = task
+    codes = np.zeros((len(rows), len(columns)), dtype=np.int8)
+    for i, loop1 in enumerate(rows):
+        for j, loop2 in enumerate(columns):
+            if row + i < column + j:
+                codes[i, j] = compare(loop1, loop2, cutoff)
+    return row, column, codes
+
+
+class AllAgainstAll(core.Base):
+    """Compare all loops against each other in a pool of processes.
+    """
+
+    workers = 4
+    """Default number of processes to use"""
+
+    chunk_size = 100
+    """Default number of loops along each side of a tile"""
+
+    cutoff = 1.0
+    """Default largest discrepancy of a match"""
+
+    def option(self, name):
+        """Get a configured option of this stage, or the default for it.
+        """
+        return self.config[self.name].get(name, getattr(self, name))
+
+    def loops(self, loop_ids):
+        """Load the data needed to compare the given loops. The bases of each
+        loop are in position order.
+
+        Parameters
+        ----------
+        loop_ids : list
+            The loop ids to load.
+
+        Returns
+        -------
+        loops : list
+            A list of `Loop`s, in the same order as the ids.
+        """
+
+        units = coll.defaultdict(list)
+        with self.session() as session:
+            pos = mod.LoopPositions
+            centers = mod.UnitCenters
+            rotations = mod.UnitRotations
+            query = session.query(pos.loop_id,
+                                  pos.unit_id,
+                                  centers.x, centers.y, centers.z,
+                                  rotations.cell_0_0, rotations.cell_0_1,
+                                  rotations.cell_0_2, rotations.cell_1_0,
+                                  rotations.cell_1_1, rotations.cell_1_2,
+                                  rotations.cell_2_0, rotations.cell_2_1,
+                                  rotations.cell_2_2,
+                                  ).\
+                join(centers, centers.unit_id == pos.unit_id).\
+                join(rotations, rotations.unit_id == pos.unit_id).\
+                filter(centers.name == 'base').\
+                filter(pos.loop_id.in_(loop_ids)).\
+                order_by(pos.loop_id, pos.position)
+
+            for result in query:
+                units[result.loop_id].append(result)
+
+            inter = mod.UnitPairsInteractions
+            members = dict((loop_id, set(r.unit_id for r in rows))
+                           for loop_id, rows in units.items())
+            query = session.query(pos.loop_id,
+                                  inter.unit_id_1,
+                                  inter.unit_id_2,
+                                  inter.f_lwbp,
+                                  inter.f_stacks,
+                                  ).\
+                join(inter, inter.unit_id_1 == pos.unit_id).\
+                filter(pos.loop_id.in_(loop_ids))
+            interactions = coll.defaultdict(dict)
+            for result in query:
+                if result.unit_id_2 in members.get(result.loop_id, ()):
+                    key = (result.unit_id_1, result.unit_id_2)
+                    interactions[result.loop_id][key] = \
+                        edge_code(result.f_lwbp, result.f_stacks)
+
+        loops = []
+        for loop_id in loop_ids:
+            if not units[loop_id]:
+                raise core.InvalidState("No base data for loop %s" % loop_id)
+            rows = units[loop_id]
+            ids = [r.unit_id for r in rows]
+            edges = np.zeros((len(ids), len(ids)), dtype=int)
+            for (unit1, unit2), code in interactions[loop_id].items():
+                edges[ids.index(unit1), ids.index(unit2)] = code
+            loops.append(Loop(loop_id=loop_id,
+                              centers=np.array([r[2:5] for r in rows],
+                                               dtype=float),
+                              rotations=np.array([r[5:14] for r in rows],
+                                                 dtype=float).
+                              reshape(-1, 3, 3),
+                              edges=edges))
+        return loops
+
+    def tiles(self, count, chunk_size):
+        """Split the upper triangle of a count by count matrix into tiles.
+
+        Parameters
+        ----------
+        count : int
+            The number of loops.
+        chunk_size : int
+            The size of each tile.
+
+        Returns
+        -------
+        tiles : list
+            A list of (row start, column start) tuples in order.
+        """
+
+        starts = range(0, count, chunk_size)
+        return [(row, column) for row in starts for column in starts
+                if row <= column]
+
+    def checkpoint(self, directory, row, column):
+        """Get the filename of the checkpoint for a tile.
+        """
+        return os.path.join(directory, 'tile_%06i_%06i.npy' % (row, column))
+
+    def fingerprint(self, loop):
+        """Compute a fingerprint of the data of a loop which is used when
+        comparing it.
+
+        Parameters
+        ----------
+        loop : Loop
+            The loop.
+
+        Returns
+        -------
+        fingerprint : str
+            A hex digest of the centers, rotations and interactions.
+        """
+
+        digest = hashlib.md5()
+        digest.update(np.ascontiguousarray(loop.centers, dtype=float))
+        digest.update(np.ascontiguousarray(loop.rotations, dtype=float))
+        digest.update(np.ascontiguousarray(loop.edges, dtype=np.int64))
+        return digest.hexdigest()
+
+    def prepare(self, directory, loops, chunk_size, cutoff):
+        """Make sure the checkpoint directory can be used for the given loops.
+        Checkpoints from a run on other loops, on loops whose data has changed,
+        or with another tile size or cutoff, are removed.
+
+        Parameters
+        ----------
+        directory : str
+            The checkpoint directory.
+        loops : list
+            The loops being compared.
+        chunk_size : int
+            The tile size being used.
+        cutoff : float
+            The largest discrepancy of a match.
+        """
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        header = ['chunk_size %i' % chunk_size, 'cutoff %r' % float(cutoff)]
+        header.extend('%s %s' % (loop.loop_id, self.fingerprint(loop))
+                      for loop in loops)
+        header = '\n'.join(header)
+        filename = os.path.join(directory, 'loops.txt')
+        if os.path.exists(filename):
+            with open(filename, 'rb') as raw:
+                if raw.read() == header:
+                    return
+            self.logger.warning("Removing stale checkpoints in %s", directory)
+
+        for tile in glob.glob(os.path.join(directory, 'tile_*.npy')):
+            os.remove(tile)
+        with open(filename, 'wb') as out:
+            out.write(header)
+
+    def save_tile(self, directory, row, column, codes):
+        """Save a tile, making sure a partially written tile is never left
+        behind.
+        """
+
+        filename = self.checkpoint(directory, row, column)
+        temp = filename + '.tmp'
+        with open(temp, 'wb') as out:
+            np.save(out, codes)
+        os.rename(temp, filename)
+
+    def merge(self, directory, tiles, count, chunk_size):
+        """Merge all tiles into the full symmetric matrix of match codes.
+
+        Parameters
+        ----------
+        directory : str
+            The checkpoint directory.
+        tiles : list
+            The tiles, as from `tiles`.
+        count : int
+            The number of loops.
+        chunk_size : int
+            The size of each tile.
+
+        Returns
+        -------
+        matrix : numpy.array
+            A count by count matrix of match codes.
+        """
+
+        matrix = np.zeros((count, count), dtype=np.int8)
+        for row, column in tiles:
+            codes = np.load(self.checkpoint(directory, row, column))
+            matrix[row:row + chunk_size, column:column + chunk_size] = codes
+        upper = np.triu(matrix, 1)
+        matrix = upper + upper.T
+        np.fill_diagonal(matrix, MATCH)
+        return matrix
+
+    def save(self, matrix, loop_ids, filename):
+        """Write all matches and disqualified matches to a file, in the format
+        of MM_symmetrize.txt.
+        """
+
+        with open(filename, 'wb') as out:
+            writer = csv.writer(out, quoting=csv.QUOTE_ALL)
+            for i, j in zip(*np.nonzero(np.triu(matrix, 1))):
+                writer.writerow([loop_ids[i], loop_ids[j], matrix[i, j]])
+
+    def __call__(self, loops, directory, workers=None, chunk_size=None):
+        """Compare all given loops against each other. Tiles which have a
+        checkpoint in the given directory are not computed again.
+
+        Parameters
+        ----------
+        loops : list
+            The loops to compare, as from `loops`.
+        directory : str
+            The directory to store checkpoints in.
+        workers : int, optional
+            The number of processes to use.
+        chunk_size : int, optional
+            The size of each tile.
+
+        Returns
+        -------
+        matrix : numpy.array
+            The symmetric matrix of match codes, in the order of the loops.
+        """
+
+        workers = workers or self.option('workers')
+        chunk_size = chunk_size or self.option('chunk_size')
+        cutoff = self.option('cutoff')
+        loop_ids = [loop.loop_id for loop in loops]
+
+        self.prepare(directory, loops, chunk_size, cutoff)
+        tiles = self.tiles(len(loops), chunk_size)
+        tasks = []
+        for row, column in tiles:
+            if not os.path.exists(self.checkpoint(directory, row, column)):
+                tasks.append((row, column,
+                              loops[row:row + chunk_size],
+                              loops[column:column + chunk_size],
+                              cutoff))
+
+        self.logger.info("Comparing %i loops, %i of %i tiles to compute",
+                         len(loops), len(tasks), len(tiles))
+
+        if tasks:
+            pool = Pool(max(1, min(workers, len(tasks))))
+            try:
+                results = pool.imap_unordered(compare_tile, tasks)
+                for index, (row, column, codes) in enumerate(results):
+                    self.save_tile(directory, row, column, codes)
+                    self.logger.debug("Finished tile %i/%i", index + 1,
+                                      len(tasks))
+            finally:
+                pool.close()
+                pool.join()
+
+        return self.merge(directory, tiles, len(loops), chunk_size)
@@ -1,9 +1,14 @@
 """This module contains the code for creating a new NR set. It can find and
 group all ifes from structures into classes and then pick a representative of
 that class.
+
+The steps which transform groups never modify the groups they are given.
+Instead each step builds new group dicts which share all unchanged values with
+their input. Only the values a step changes are copied, for example each
+resolution cutoff gets its own member dicts, as the rank of members differs
+between cutoffs.
 """
 
-import copy
 import itertools as it
 import collections as coll
 
@@ -253,28 +258,27 @@ class Builder(core.Base):
     def within_cutoff(self, group, cutoff):
         """Filter the group to produce a new one where all members of the group
         are within the resolution cutoff. This will update the rank of the
-        members so that they indicate the new rank.
+        members so that they indicate the new rank. The new group has its own
+        copy of each member, all other values are shared with the given group.
 
         :param dict group: The group to filter.
         :param str cutoff: The resolution cutoff to use.
         """
 
+        updated = dict(group)
         if cutoff == 'all':
-            return copy.deepcopy(group)
+            updated['members'] = [dict(m) for m in group['members']]
+            return updated
 
         cutoff = float(cutoff)
-        updated = copy.deepcopy(group)
-
-        filtered = updated['members']
+        filtered = group['members']
         filtered = it.ifilter(lambda c: c['resolution'] is not None, filtered)
         filtered = it.ifilter(lambda c: c['resolution'] <= cutoff, filtered)
-        filtered = list(filtered)
+        filtered = [dict(entry, rank=index)
+                    for index, entry in enumerate(filtered)]
         if not filtered:
             return {}
 
-        for index, entry in enumerate(filtered):
-            entry['rank'] = index
-
         updated['members'] = filtered
         return updated
 
@@ -314,11 +318,12 @@ class Builder(core.Base):
         """
 
         data = []
-        for entry in copy.deepcopy(groups):
+        for entry in groups:
             for resolution in resolutions:
                 filtered = self.within_cutoff(entry, resolution)
                 if not filtered:
                     continue
+                filtered['name'] = dict(entry['name'])
                 filtered['name']['full'] = self.class_name(resolution, entry)
                 filtered['name']['cutoff'] = resolution
                 data.append(filtered)
@@ -352,15 +357,16 @@ class Builder(core.Base):
         mapping = {as_key(p): p for p in flattened}
 
         data = []
-        for group in copy.deepcopy(groups):
+        for group in groups:
             cutoff = group['name']['cutoff']
             parents = []
             for parent in group['parents']:
                 key = as_key(parent, cutoff=cutoff)
                 if key in mapping:
                     parents.append(mapping[key])
-            group['parents'] = parents
-            data.append(group)
+            updated = dict(group)
+            updated['parents'] = parents
+            data.append(updated)
         return data
 
     def find_representatives(self, groups, sorting_key=ranking_key):
@@ -381,22 +387,25 @@ class Builder(core.Base):
         Returns
         -------
         groups : list
-            The list of groups which have been modified to include the
-            representative entry and the members are resorted.
+            The list of new groups which include the representative entry and
+            have the resorted members.
         """
         ## from pprint import pprint
         data = []
         rep_finder = RepresentativeFinder(self.config, self.session)
-        for group in copy.deepcopy(groups):
+        for group in groups:
             # obj_vars = vars(group)
             # pprint(obj_vars)
-            ordered_members = rep_finder(group)
-            group['representative'] = ordered_members[0]
-            
-            group['members'] = ordered_members
-            for index, member in enumerate(group['members']):
+            # The finder may annotate members, so it gets copies of them
+            updated = dict(group)
+            updated['members'] = [dict(m) for m in group['members']]
+            ordered_members = rep_finder(updated)
+            updated['representative'] = ordered_members[0]
+
+            updated['members'] = ordered_members
+            for index, member in enumerate(updated['members']):
                 member['rank'] = index
-            data.append(group)
+            data.append(updated)
         # print(qwerty)
         return data
 
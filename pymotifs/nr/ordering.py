@@ -32,6 +32,7 @@ from pymotifs.nr.chains import Loader as NrChainLoader
 from pymotifs.nr.classes import Loader as NrClassLoader
 from pymotifs.nr.cqs import NrQualityLoader
 from pymotifs.chain_chain.comparison import Loader as SimilarityLoader
+from pymotifs.export.ife_discrepancy import Exporter as DiscrepancyExporter
 
 
 class Loader(core.SimpleLoader):
@@ -584,15 +585,10 @@ class Loader(core.SimpleLoader):
             discDict = defaultdict(lambda: None)
             # put discrepancy information into a dictionary
             starttime = time.clock()
-            infileNameWithPath = "/var/www/html/discrepancy/IFEdiscrepancy.txt"
-            with open(infileNameWithPath,"r") as infile:
-                for line in infile:
-                    fields = line.replace("\n","").split("\t")
-                    ife1 = fields[0]
-                    ife2 = fields[1]
-                    discrepancy = float(fields[2])
-                    discDict[(ife1,ife2)] = discrepancy
-                    discDict[(ife2,ife1)] = discrepancy
+            exporter = self._create(DiscrepancyExporter)
+            for ife1, ife2, discrepancy in exporter.discrepancies(nr_class_name):
+                discDict[(ife1,ife2)] = discrepancy
+                discDict[(ife2,ife1)] = discrepancy
 
             self.logger.info("large group:  read flat file of discrepancies")
             self.logger.info("data: time to read a group of size %d from flat file was %8.4f seconds" % (len(members_revised),time.clock()-starttime))
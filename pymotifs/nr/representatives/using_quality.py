@@ -1,5 +1,7 @@
 import abc
 import operator as op
+import itertools as it
+import collections as coll
 
 import numpy as np
 
@@ -8,6 +10,7 @@ from sqlalchemy.orm import aliased
 
 from pymotifs import core
 from pymotifs import models as mod
+from pymotifs.utils import exact
 from pymotifs.utils import row2dict
 
 from pymotifs.constants import COMPSCORE_COEFFICENTS
@@ -15,6 +18,8 @@ from pymotifs.constants import MANUAL_IFE_REPRESENTATIVES
 from pymotifs.constants import WORSE_THAN_MANUAL_IFE_REPRESENTATIVES
 
 from pymotifs.ife.helpers import IfeLoader
+from pymotifs.units.atom_counts import heavy_atoms
+from pymotifs.quality.clash_counts import Loader as ClashCountLoader
 
 from .core import Representative
 
@@ -191,31 +196,30 @@ class CompScore(QualityBase):
     method = 'compscore'
 
     def count_atoms(self, info):
-        with self.session() as session:
-            query = session.query(mod.UnitCoordinates).\
-                join(mod.UnitInfo,
-                     mod.UnitInfo.unit_id == mod.UnitCoordinates.unit_id)
-            query = self.__chain_query__(query, info)
-            counted_atoms = set(['C', 'N', 'O', 'P'])
-            count = 0
-            for row in query:
-                current = 0
-                for line in row.coordinates.split('\n'):
-                    parts = line.split()
-                    if len(parts) >= 2 and parts[2] in counted_atoms:
-                        current += 1
-
-                if not current:
-                    self.logger.error("No atoms in %s" % row.unit_id)
-                count += current
-
-            if not count:
-                self.logger.error("No atoms found for %s" % str(info))
-                return 100.0
-
-            return float(count)
+        count = info.get('heavy_atoms', 0)
+        chains = info.get('uncounted_chains', info['chains'])
+        if chains:
+            with self.session() as session:
+                query = session.query(mod.UnitCoordinates).\
+                    join(mod.UnitInfo,
+                         mod.UnitInfo.unit_id == mod.UnitCoordinates.unit_id)
+                query = self.__chain_query__(query, dict(info, chains=chains))
+                for row in query:
+                    current = heavy_atoms(row.coordinates)
+                    if not current:
+                        self.logger.error("No atoms in %s" % row.unit_id)
+                    count += current
+
+        if not count:
+            self.logger.error("No atoms found for %s" % str(info))
+            return 100.0
+
+        return float(count)
 
     def count_clashes(self, info):
+        if 'clashes' in info:
+            return float(info['clashes'])
+
         with self.session() as session:
             u1 = aliased(mod.UnitInfo)
             u2 = aliased(mod.UnitInfo)
@@ -227,9 +231,109 @@ class CompScore(QualityBase):
 
             query = self.__chain_query__(query, info, table=u1)
             query = self.__chain_query__(query, info, table=u2)
-            if query.count() < 0:
+            count = query.count()
+            if count < 0:
                 raise core.InvalidState("Negative clashes: %s" % info)
-            return float(query.count())
+            return float(count)
+
+    def precomputed_counts(self, infos):
+        """Load the heavy atom and clash counts for all given members from the
+        tables written by `pymotifs.units.atom_counts` and
+        `pymotifs.quality.clash_counts`. This uses one grouped query for each
+        table. It sets 'heavy_atoms' in each info to the count of the chains
+        where every unit with coordinates has a stored count, and
+        'uncounted_chains' to the other chains, which `count_atoms` counts
+        from the coordinates. 'clashes' is set for members of structures whose
+        clashes have been counted, the others are counted by `count_clashes`.
+        If a table has not been created yet, see `pymotifs.schema`, nothing is
+        loaded from it and everything is counted as before.
+
+        :param list infos: The member info dicts from `member_info`.
+        """
+
+        pdbs = sorted(set(info['pdb'] for info in infos))
+        has_atoms = self.has_table(mod.UnitAtomCounts)
+        has_clashes = self.has_table(mod.ChainClashCounts)
+
+        atoms = coll.defaultdict(int)
+        uncounted = set()
+        if has_atoms:
+            with self.session() as session:
+                dialect = session.get_bind().dialect.name
+                chain = exact(mod.UnitInfo.chain, dialect)
+                counts = mod.UnitAtomCounts
+                query = session.query(mod.UnitInfo.pdb_id,
+                                      mod.UnitInfo.model,
+                                      mod.UnitInfo.sym_op,
+                                      chain.label('chain'),
+                                      func.count(mod.UnitCoordinates.unit_id).
+                                      label('units'),
+                                      func.count(counts.unit_id).
+                                      label('counted'),
+                                      func.sum(counts.heavy_atoms).
+                                      label('atoms'),
+                                      ).\
+                    join(mod.UnitCoordinates,
+                         mod.UnitCoordinates.unit_id == mod.UnitInfo.unit_id).\
+                    outerjoin(counts,
+                              counts.unit_id == mod.UnitInfo.unit_id).\
+                    filter(mod.UnitInfo.pdb_id.in_(pdbs)).\
+                    filter(mod.UnitInfo.unit.in_(['A', 'C', 'G', 'U'])).\
+                    filter(mod.UnitInfo.chain_index != None).\
+                    group_by(mod.UnitInfo.pdb_id,
+                             mod.UnitInfo.model,
+                             mod.UnitInfo.sym_op,
+                             chain)
+
+                for result in query:
+                    key = (result.pdb_id, result.model, result.sym_op,
+                           result.chain)
+                    if result.counted < result.units:
+                        uncounted.add(key)
+                    else:
+                        atoms[key] += int(result.atoms or 0)
+
+        clash_pdbs = set()
+        clash_stage = self._create(ClashCountLoader).name
+        clashes = coll.defaultdict(int)
+        if has_clashes:
+            with self.session() as session:
+                query = session.query(mod.PdbAnalysisStatus.pdb_id).\
+                    filter(mod.PdbAnalysisStatus.stage == clash_stage).\
+                    filter(mod.PdbAnalysisStatus.pdb_id.in_(pdbs)).\
+                    distinct()
+                clash_pdbs = set(result.pdb_id for result in query)
+
+                query = session.query(mod.ChainClashCounts).\
+                    filter(mod.ChainClashCounts.pdb_id.in_(clash_pdbs))
+                for result in query:
+                    key = (result.pdb_id, result.model, result.sym_op,
+                           result.chain_1, result.chain_2)
+                    clashes[key] += result.clashes
+
+        for info in infos:
+            pdb, model, sym_op = info['pdb'], info['model'], info['sym_op']
+            chains = sorted(set(info['chains']))
+            if has_atoms:
+                info['heavy_atoms'] = sum(atoms[(pdb, model, sym_op, c)]
+                                          for c in chains)
+                info['uncounted_chains'] = [c for c in chains if
+                                            (pdb, model, sym_op, c) in
+                                            uncounted]
+            if pdb in clash_pdbs:
+                pairs = it.product(chains, repeat=2)
+                info['clashes'] = sum(clashes[(pdb, model, sym_op) + pair]
+                                      for pair in pairs)
+
+    def has_table(self, model):
+        """Check if the table for the given model exists in the database.
+
+        :param model: A class from `pymotifs.models`.
+        :returns: True if the table exists.
+        """
+
+        with self.session() as session:
+            return model.__table__.exists(bind=session.get_bind())
 
     def has_quality(self, member):
         has_quality = member['quality']['has']
@@ -381,9 +485,10 @@ class CompScore(QualityBase):
         ]
 
         experimental_length = self.experimental_length(members)
+        infos = [self.member_info(member) for member in members]
+        self.precomputed_counts(infos)
 
-        for member in members:
-            info = self.member_info(member)
+        for member, info in zip(members, infos):
             info['max_length'] = experimental_length
             data = {'has': set()}
             for index, name in enumerate(parameters):
@@ -0,0 +1,111 @@
+"""A stage to count the clashes between the heavy atoms of nucleotides in each
+pair of chains. This writes one row per pair of chains, with the model and
+symmetry operator, into the chain_clash_counts table. The clash score of an
+IFE is the sum of the rows for all pairs of its chains, see
+`pymotifs.nr.representatives.using_quality`. The table is created when the
+pipeline is run, or with the 'db migrate' command.
+"""
+
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+import pymotifs.core as core
+from pymotifs import models as mod
+from pymotifs.utils import exact
+
+from pymotifs.quality.clashes import Loader as ClashLoader
+
+"""The units which are counted."""
+NUCLEOTIDES = ['A', 'C', 'G', 'U']
+
+
+class Loader(core.SimpleLoader):
+    """The loader to store chain_clash_counts data. Structures without clashes
+    produce no rows, so marks are used to know they have been processed.
+    """
+
+    allow_no_data = True
+    use_marks = True
+    dependencies = set([ClashLoader])
+
+    def to_process(self, pdbs, **kwargs):
+        """Find the PDBs to process. These are the same as for
+        `pymotifs.quality.clashes`, so structures without validation data are
+        not marked as having no clashes.
+        """
+
+        return self._create(ClashLoader).to_process(pdbs, **kwargs)
+
+    def query(self, session, pdb):
+        """Create a query to find all entries in `chain_clash_counts` for the
+        given PDB id.
+
+        Parameters
+        ----------
+        session : pymotifs.core.Session
+            The session to use.
+
+        pdb : str
+            The PDB id to use.
+
+        Returns
+        -------
+        query : Query
+            The query for the given structure.
+        """
+
+        return session.query(mod.ChainClashCounts).\
+            filter(mod.ChainClashCounts.pdb_id == pdb)
+
+    def data(self, pdb, **kwargs):
+        """Count the clashes between each pair of chains in a single grouped
+        query. Only clashes between nucleotides with a chain index and where
+        neither atom is a hydrogen are counted. Chains are grouped by their
+        exact name, see `pymotifs.utils.exact`.
+
+        Parameters
+        ----------
+        pdb : str
+            The PDB id to use.
+
+        Returns
+        -------
+        counts : list
+            A ChainClashCounts object for each pair of chains with clashes.
+        """
+
+        with self.session() as session:
+            u1 = aliased(mod.UnitInfo)
+            u2 = aliased(mod.UnitInfo)
+            clashes = mod.UnitClashes
+            dialect = session.get_bind().dialect.name
+            chain_1 = exact(u1.chain, dialect)
+            chain_2 = exact(u2.chain, dialect)
+            query = session.query(u1.model,
+                                  u1.sym_op,
+                                  chain_1.label('chain_1'),
+                                  chain_2.label('chain_2'),
+                                  func.count().label('clashes'),
+                                  ).\
+                select_from(clashes).\
+                join(u1, u1.unit_id == clashes.unit_id_1).\
+                join(u2, u2.unit_id == clashes.unit_id_2).\
+                filter(~clashes.atom_name_1.like('%H%')).\
+                filter(~clashes.atom_name_2.like('%H%')).\
+                filter(u1.pdb_id == pdb).\
+                filter(u2.pdb_id == pdb).\
+                filter(u2.model == u1.model).\
+                filter(u2.sym_op == u1.sym_op).\
+                filter(u1.unit.in_(NUCLEOTIDES)).\
+                filter(u2.unit.in_(NUCLEOTIDES)).\
+                filter(u1.chain_index != None).\
+                filter(u2.chain_index != None).\
+                group_by(u1.model, u1.sym_op, chain_1, chain_2)
+
+            return [mod.ChainClashCounts(pdb_id=pdb,
+                                         model=result.model,
+                                         sym_op=result.sym_op,
+                                         chain_1=result.chain_1,
+                                         chain_2=result.chain_2,
+                                         clashes=result.clashes)
+                    for result in query]
@@ -1,12 +1,27 @@
 """Download and store validation reports. This will download all validation
-reports from PDB and store them locally as a gzip file. In addition, it will
-write an empty file for any report it could not download.
+reports from PDB and store them locally as a gzip file.
+
+Reports are fetched by a pool of workers, each of which keeps its own
+connection open for all files it fetches. A report which is already stored is
+only fetched again when recomputing and the size or modification time of the
+source file differs from the stored one. This is checked by the workers, which
+ask the source about each file once before fetching it. When the source has no
+report for a structure an empty file is stored, so structures without reports
+can be told apart from those never tried, see `pymotifs.quality.utils.Utils`.
+Reports are normally fetched from the wwPDB FTP site, but setting the 'mirror'
+option of this stage to a directory fetches them from a local mirror with the
+same layout instead.
 """
 
 import os
+import time
+import shutil
 import ftplib
+import calendar
+import threading
+import cStringIO as sio
+from multiprocessing.pool import ThreadPool
 
-import pymotifs.utils as ut
 import pymotifs.core as core
 
 import pymotifs.quality.utils as qut
@@ -14,6 +29,138 @@ import pymotifs.quality.utils as qut
 from pymotifs.download import Writer
 
 
+class FtpSource(object):
+    """Fetch files from an FTP site. Each thread gets its own connection,
+    which is reused for every file it fetches and reopened if it fails.
+
+    Attributes
+    ----------
+    host : str
+        The FTP host to connect to.
+    retries : int
+        The number of times to try each operation.
+    """
+
+    def __init__(self, host, retries=3):
+        self.host = host
+        self.retries = retries
+        self._local = threading.local()
+
+    def connection(self):
+        """Get the connection of the current thread, opening it if needed.
+        """
+
+        if getattr(self._local, 'ftp', None) is None:
+            ftp = ftplib.FTP(self.host)
+            ftp.login()
+            ftp.voidcmd('TYPE I')
+            self._local.ftp = ftp
+        return self._local.ftp
+
+    def reset(self):
+        """Drop the connection of the current thread.
+        """
+
+        ftp = getattr(self._local, 'ftp', None)
+        self._local.ftp = None
+        if ftp is not None:
+            try:
+                ftp.close()
+            except ftplib.all_errors:
+                pass
+
+    def attempt(self, fn):
+        """Run a function with the connection of this thread, reconnecting and
+        retrying on connection errors. A missing file is not retried.
+        """
+
+        for index in xrange(self.retries):
+            try:
+                return fn(self.connection())
+            except ftplib.error_perm:
+                raise
+            except ftplib.all_errors:
+                self.reset()
+                if index == self.retries - 1:
+                    raise
+
+    def stat(self, path):
+        """Get the size and modification time of a remote file.
+
+        Parameters
+        ----------
+        path : str
+            The path on the FTP site.
+
+        Returns
+        -------
+        stat : tuple
+            The size in bytes and modification time in seconds since the
+            epoch, or None if the file does not exist.
+        """
+
+        def stat(ftp):
+            size = ftp.size(path)
+            response = ftp.sendcmd('MDTM ' + path)
+            parsed = time.strptime(response.split()[-1][:14], '%Y%m%d%H%M%S')
+            return size, calendar.timegm(parsed)
+
+        try:
+            return self.attempt(stat)
+        except ftplib.error_perm:
+            return None
+
+    def fetch(self, path, handle):
+        """Copy a remote file into the given file handle.
+
+        Raises
+        ------
+        ftplib.error_perm
+            If the file does not exist.
+        """
+
+        self.attempt(lambda ftp: ftp.retrbinary('RETR ' + path, handle.write))
+
+
+class MirrorSource(object):
+    """Fetch files from a local directory, like a mirror of the FTP site.
+
+    Attributes
+    ----------
+    directory : str
+        The root of the mirror.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, path):
+        return os.path.join(self.directory, path.lstrip('/'))
+
+    def stat(self, path):
+        """Get the size and modification time of a mirrored file, or None if
+        the file does not exist.
+        """
+
+        try:
+            info = os.stat(self.path(path))
+        except OSError:
+            return None
+        return info.st_size, int(info.st_mtime)
+
+    def fetch(self, path, handle):
+        """Copy a mirrored file into the given file handle.
+
+        Raises
+        ------
+        IOError
+            If the file does not exist.
+        """
+
+        with open(self.path(path), 'rb') as raw:
+            shutil.copyfileobj(raw, handle)
+
+
 class Loader(core.Loader):
     """The loader to fetch and store quality data for structures.
     """
@@ -22,13 +169,25 @@ class Loader(core.Loader):
     allow_no_data = True
     path = 'pub/pdb/validation_reports/{short}/{pdb}/{pdb}_validation.xml.gz'
 
+    host = 'ftp.wwpdb.org'
+    """The FTP site to fetch reports from."""
+
+    workers = 8
+    """Default number of reports to fetch at once."""
+
     @property
-    def ftp(self):
-        """A FTP connection to the wwpdb.org FTP site.
+    def source(self):
+        """The source to fetch reports from. This is the configured mirror
+        directory, if any, or the wwPDB FTP site.
         """
-        if not hasattr(self, '_ftp'):
-            self._ftp = ut.FTPFetchHelper('ftp.wwpdb.org')
-        return self._ftp
+
+        if not hasattr(self, '_source'):
+            mirror = self.config[self.name].get('mirror')
+            if mirror:
+                self._source = MirrorSource(mirror)
+            else:
+                self._source = FtpSource(self.host)
+        return self._source
 
     def filename(self, pdb, **kwargs):
         """Get the filename where data for this PDB should be stored.
@@ -88,11 +247,165 @@ class Loader(core.Loader):
         """
         return os.path.exists(self.filename(pdb))
 
+    def is_current(self, pdb, stat=None):
+        """Check if the stored report is the same as the one in the source, by
+        comparing their size and modification time.
+
+        Parameters
+        ----------
+        pdb : str
+            The pdb to check.
+        stat : tuple, optional
+            The size and modification time of the source file, as from the
+            `stat` method of the source. It is looked up if not given.
+
+        Returns
+        -------
+        current : bool
+            True if there is a stored report and it matches the source.
+        """
+
+        if not self.has_data(pdb):
+            return False
+        if stat is None:
+            stat = self.source.stat(self.remote(pdb))
+        if stat is None:
+            return True
+        local = os.stat(self.filename(pdb))
+        return (local.st_size, int(local.st_mtime)) == stat
+
+    def fetch(self, pdb, dry_run=False, **kwargs):
+        """Fetch the report for one PDB into its file, unless the stored report
+        is current. The source is asked for the size and modification time of
+        the report once, which is used both to check the stored report and to
+        date the new one. If the source has no report, and nothing is stored
+        yet, an empty file is stored instead. Files are written to a temporary
+        file which is moved into place once complete.
+
+        Parameters
+        ----------
+        pdb : str
+            The pdb id to fetch.
+
+        Returns
+        -------
+        fetched : bool
+            True if the report, or the empty file for a missing report, was
+            written. False if the stored file is current.
+        """
+
+        remote = self.remote(pdb)
+        stat = self.source.stat(remote)
+        if stat is None:
+            if self.has_data(pdb):
+                return False
+            self.logger.warning("Could not fetch quality data for %s", pdb)
+        elif self.is_current(pdb, stat=stat):
+            return False
+        if dry_run:
+            return True
+
+        filename = self.filename(pdb)
+        directory = os.path.dirname(filename)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        temp = filename + '.part'
+        try:
+            with open(temp, 'wb') as out:
+                if stat is not None:
+                    self.source.fetch(remote, out)
+            if stat is not None:
+                os.utime(temp, (time.time(), stat[1]))
+            os.rename(temp, filename)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+        return True
+
+    def candidates(self, pdbs, **kwargs):
+        """Find the PDBs whose reports may have to be fetched. These are all
+        that have no stored report, and when recomputing, all others. This
+        only looks at local files, `fetch` checks if a stored report differs
+        from the source.
+        """
+
+        return [pdb for pdb in pdbs if not self.has_data(pdb) or
+                self.must_recompute(pdb, **kwargs)]
+
+    def fetch_all(self, pdbs, workers=None, **kwargs):
+        """Fetch the reports of all given PDBs which are not current in a pool
+        of workers.
+
+        Parameters
+        ----------
+        pdbs : list
+            The PDB ids to fetch.
+        workers : int, optional
+            The number of workers to use. Defaults to the configured value for
+            this stage or `workers`.
+
+        Returns
+        -------
+        fetched : list
+            The PDB ids which had a report fetched.
+        """
+
+        if workers is None:
+            workers = self.config[self.name].get('workers', self.workers)
+
+        def fetch(pdb):
+            try:
+                return pdb, self.fetch(pdb, **kwargs)
+            except Exception as err:
+                self.logger.error("Error raised in fetching %s", pdb)
+                self.logger.exception(err)
+                return pdb, False
+
+        fetched = []
+        pool = ThreadPool(max(1, min(workers, len(pdbs))))
+        try:
+            for index, (pdb, success) in \
+                    enumerate(pool.imap_unordered(fetch, pdbs)):
+                self.logger.info("Checked %s: %s/%s", pdb, index + 1,
+                                 len(pdbs))
+                if success:
+                    fetched.append(pdb)
+        finally:
+            pool.close()
+            pool.join()
+        return fetched
+
+    def __call__(self, given, **kwargs):
+        """Fetch the reports of all given PDBs which are missing or out of
+        date. This replaces the one at a time processing of
+        `pymotifs.core.stages.Stage` with `fetch_all`.
+        """
+
+        try:
+            pdbs = self.to_process(given, **kwargs)
+        except core.Skip as err:
+            self.logger.warn("Skipping this stage. Reason %s", str(err))
+            return []
+
+        if not pdbs:
+            self.logger.critical("Nothing to process")
+            raise core.InvalidState("Nothing to process")
+
+        candidates = self.candidates(pdbs, **kwargs)
+        self.logger.info("%i of %i validation reports must be checked",
+                         len(candidates), len(pdbs))
+        if not candidates:
+            return []
+
+        fetched = self.fetch_all(candidates, **kwargs)
+        if self.mark:
+            for pdb in fetched:
+                self.mark_processed(pdb, **kwargs)
+        return fetched
+
     def data(self, pdb, **kwargs):
-        """Compute the quality assignments for residues in the structure. This
-        will fetch the validation report from PDB and convert the entries there
-        into forms suitable to write to the database. If the report has no RSR
-        or DCC data then a `core.Skip` exception will be raised.
+        """Fetch the validation report of a single PDB.
 
         Parameters
         ----------
@@ -101,8 +414,9 @@ class Loader(core.Loader):
 
         Returns
         -------
-        data: iterable
-            An iterable of a quality assignments to store in the database.
+        data: str
+            The compressed report, or an empty string if it could not be
+            fetched.
         """
         filename = self.filename(pdb)
         directory = os.path.dirname(filename)
@@ -110,14 +424,12 @@ class Loader(core.Loader):
             os.makedirs(directory)
 
         try:
-            remote = self.remote(pdb)
-            return self.ftp(remote)
-        except ftplib.error_perm:
+            out = sio.StringIO()
+            self.source.fetch(self.remote(pdb), out)
+            return out.getvalue()
+        except (ftplib.error_perm, IOError):
             self.logger.warning("Could not fetch quality data for %s", pdb)
             return ''
-        except ut.RetryFailedException:
-            self.logger.warning("No quality found of %s", pdb)
-            return ''
         except Exception as err:
             self.logger.exception(err)
             self.logger.warning("Unknown exception occurred")
@@ -3,6 +3,8 @@
 - quality.downloader
 - quality.units
 - quality.pdb
+- quality.clashes
+- quality.clash_counts
 """
 
 from pymotifs import core
@@ -11,6 +13,7 @@ from pymotifs.quality.download import Loader as Downloader
 from pymotifs.quality.units import Loader as UnitsQuality
 from pymotifs.quality.pdb import Loader as PdbQuality
 from pymotifs.quality.clashes import Loader as ClashLoader
+from pymotifs.quality.clash_counts import Loader as ClashCountLoader
 
 
 class Loader(core.StageContainer):
@@ -18,4 +21,5 @@ class Loader(core.StageContainer):
     """
 
     """The `Stages` this will run"""
-    stages = set([Downloader, UnitsQuality, PdbQuality, ClashLoader])
+    stages = set([Downloader, UnitsQuality, PdbQuality, ClashLoader,
+                  ClashCountLoader])
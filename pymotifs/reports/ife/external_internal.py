@@ -58,7 +58,6 @@ class Reporter(core.Reporter):
         return data
 
     def data(self, pdbs, **kwargs):
-        data = []
         for pdb in pdbs:
-            data.extend(self.ifes(pdb))
-        return data
+            for entry in self.ifes(pdb):
+                yield entry
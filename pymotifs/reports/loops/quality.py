@@ -280,10 +280,9 @@ class Reporter(core.Reporter):
         return quality
 
     def data(self, obj, **kwargs):
-        data = []
         loop_release, entries = obj
         keys = dict(kwargs)
         del keys['loop_release']
         for entry in entries:
-            data.extend(self.loop_quality(loop_release, *entry, **keys))
-        return data
+            for result in self.loop_quality(loop_release, *entry, **keys):
+                yield result
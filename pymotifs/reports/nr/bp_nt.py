@@ -85,9 +85,7 @@ class Reporter(core.Reporter):
                 filter(mod.NrClasses.nr_release_id == release).\
                 filter(mod.NrClasses.resolution == resolution)
 
-            data = []
-            for result in query:
-                entry = row2dict(result)
+            for entry in self.stream(query):
                 rep = entry.pop('rep')
                 entry['Current'] = 'Member'
                 entry['Ratio'] = round(float(entry['BP']) / entry['NT'], 4)
@@ -97,8 +95,7 @@ class Reporter(core.Reporter):
                     entry[method] = 'Member'
                     if status:
                         entry[method] = 'Representative'
-                data.append(entry)
-            return data
+                yield entry
 
     def data(self, entry, **kwargs):
         release, resolution = entry
@@ -5,7 +5,6 @@ import operator as op
 
 from pymotifs import core
 from pymotifs import models as mod
-from pymotifs.utils import row2dict
 from pymotifs.utils.discrepancy import should_compare_chain_discrepancy
 from pymotifs.constants import MIN_NT_DISCREPANCY
 from pymotifs.constants import MAX_RESOLUTION_DISCREPANCY
@@ -92,7 +91,9 @@ class Pairs(core.Reporter):
                 filter(classes.nr_release_id == release).\
                 distinct().\
                 order_by(classes.name, ife1.ife_id, ife2.ife_id)
-            return [row2dict(e) for e in query]
+
+            for entry in self.stream(query):
+                yield entry
 
     def as_chain(self, n, entry):
         return {
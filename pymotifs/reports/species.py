@@ -10,8 +10,6 @@ import collections as coll
 from pymotifs import core
 from pymotifs import models as mod
 
-from pymotifs.utils import row2dict
-
 
 BAD_SPECIES = re.compile('^\w+ sp\..*$')
 
@@ -52,9 +50,11 @@ class Reporter(core.Reporter):
                 outerjoin(chain_species,
                           chain_species.chain_id == exp_mapping.chain_id).\
                 outerjoin(species,
-                          species.species_id == chain_species.species_id)
+                          species.species_id == chain_species.species_id).\
+                order_by(exp.md5)
 
-            return [row2dict(result) for result in query]
+            for entry in self.stream(query):
+                yield entry
 
     def empty_problem(self, chain):
         return {
@@ -158,5 +158,12 @@ class Reporter(core.Reporter):
         return finalized
 
     def data(self, *args, **kwargs):
+        """Find all suspicious assignments. All checks only compare chains
+        with the same sequence, so the assignments are streamed one sequence
+        at a time.
+        """
+
         current = self.assignments(**kwargs)
-        return self.suspicious(current)
+        for _, chains in it.groupby(current, op.itemgetter('md5')):
+            for entry in self.suspicious(list(chains)):
+                yield entry
@@ -0,0 +1,431 @@
+"""Tools for building a local stand-in for the pipeline database. The live
+schema is normally reflected from MySQL by `pymotifs.models.reflect`. This
+module can record a snapshot of that schema, with portable column types, and
+create an equivalent database from it, for example in SQLite. Such a database
+can then be filled from a small dump of fixture rows, which makes it possible
+to run and profile stages without access to the production database.
+
+Snapshots and fixture dumps are JSON files. A snapshot looks like::
+
+    {"version": 1,
+     "tables": {"unit_info": {"columns": [{"name": "unit_id",
+                                           "type": "String",
+                                           "length": 30,
+                                           "nullable": false,
+                                           "primary_key": true}, ...]}}}
+
+while a dump maps each table name to a list of rows.
+"""
+
+import json
+import logging
+import datetime as dt
+
+from sqlalchemy import types
+from sqlalchemy import Table
+from sqlalchemy import Column
+from sqlalchemy import MetaData
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from pymotifs import models as mod
+
+
+"""The logger to use."""
+logger = logging.getLogger(__name__)
+
+"""The version of the snapshot format."""
+VERSION = 1
+
+"""Generic types, in the order they are checked when converting a reflected
+type. More specific types must come before the ones they inherit from."""
+TYPES = [
+    ('Boolean', (types.Boolean,)),
+    ('DateTime', (types.DateTime,)),
+    ('Date', (types.Date,)),
+    ('Time', (types.Time,)),
+    ('BigInteger', (types.BigInteger,)),
+    ('Integer', (types.Integer,)),
+    ('Float', (types.Float,)),
+    ('Numeric', (types.Numeric,)),
+    ('Enum', (types.Enum,)),
+    ('Text', (types.Text,)),
+    ('String', (types.String,)),
+    ('LargeBinary', (types.LargeBinary, types.BINARY, types.VARBINARY)),
+]
+
+"""The generic type to create for each name in a snapshot."""
+GENERIC = {
+    'Boolean': types.Boolean,
+    'DateTime': types.DateTime,
+    'Date': types.Date,
+    'Time': types.Time,
+    'BigInteger': types.BigInteger,
+    'Integer': types.Integer,
+    'Float': types.Float,
+    'Numeric': types.Numeric,
+    'Text': types.Text,
+    'String': types.String,
+    'LargeBinary': types.LargeBinary,
+}
+
+"""Tables, or views, which have no primary key when reflected. These use the
+same keys as `pymotifs.models.define_missing_views`."""
+VIEW_KEYS = dict((name, [column for column, _ in columns])
+                 for name, columns in mod.VIEW_KEYS.items())
+
+"""Tables which are declared in `pymotifs.models` instead of reflected, and
+are created by `create_declared`."""
+DECLARED = ['unit_atom_counts', 'chain_clash_counts']
+
+
+class UnknownType(Exception):
+    """Raised when a column type cannot be stored in a snapshot.
+    """
+    pass
+
+
+def local_engine(uri, **kwargs):
+    """Create an engine, taking care of the differences between SQLite and
+    other databases. In particular an in memory SQLite database must be shared
+    between all connections, otherwise each session sees an empty database.
+
+    Parameters
+    ----------
+    uri : str
+        The database uri.
+    **kwargs : dict
+        Arguments for `create_engine`. Pool sizes are ignored for SQLite.
+
+    Returns
+    -------
+    engine : sqlalchemy.engine.Engine
+        The engine.
+    """
+
+    if not uri.startswith('sqlite'):
+        return create_engine(uri, **kwargs)
+
+    kwargs.pop('pool_size', None)
+    kwargs.pop('max_overflow', None)
+    if uri in ('sqlite://', 'sqlite:///:memory:'):
+        kwargs['poolclass'] = StaticPool
+        kwargs['connect_args'] = {'check_same_thread': False}
+    return create_engine(uri, **kwargs)
+
+
+def column_type(column):
+    """Convert the type of a reflected column into a portable description.
+
+    Parameters
+    ----------
+    column : sqlalchemy.Column
+        The column to convert.
+
+    Returns
+    -------
+    description : dict
+        A dict with the generic 'type' name and the 'length' if it has one.
+    """
+
+    for name, klasses in TYPES:
+        if isinstance(column.type, klasses):
+            description = {'type': name}
+            if name == 'Enum':
+                description['type'] = 'String'
+                description['length'] = max(len(e) for e in column.type.enums)
+            elif getattr(column.type, 'length', None):
+                description['length'] = column.type.length
+            return description
+    raise UnknownType("Cannot store type %s of %s" % (column.type, column))
+
+
+def snapshot(engine):
+    """Reflect the full schema of the given database into a snapshot.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine to reflect from.
+
+    Returns
+    -------
+    snapshot : dict
+        The snapshot of all tables and views.
+    """
+
+    metadata = MetaData()
+    metadata.reflect(bind=engine, views=True)
+    tables = {}
+    for name, table in sorted(metadata.tables.items()):
+        keys = set(c.name for c in table.primary_key.columns)
+        keys = keys or set(VIEW_KEYS.get(name, []))
+        columns = []
+        for column in table.columns:
+            description = {
+                'name': column.name,
+                'nullable': bool(column.nullable),
+                'primary_key': column.name in keys,
+            }
+            description.update(column_type(column))
+            columns.append(description)
+        tables[name] = {'columns': columns}
+
+    logger.info("Recorded %i tables and views", len(tables))
+    return {'version': VERSION, 'tables': tables}
+
+
+def save_snapshot(engine, filename):
+    """Write a snapshot of the given database to a file.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine to reflect from.
+    filename : str
+        The file to write to.
+    """
+
+    data = snapshot(engine)
+    with open(filename, 'wb') as out:
+        json.dump(data, out, indent=1, sort_keys=True)
+        out.write('\n')
+
+
+def load_snapshot(filename):
+    """Load a snapshot from a file.
+
+    Parameters
+    ----------
+    filename : str
+        The file to load.
+
+    Returns
+    -------
+    snapshot : dict
+        The loaded snapshot.
+    """
+
+    with open(filename, 'rb') as raw:
+        data = json.load(raw)
+    if data.get('version') != VERSION:
+        raise ValueError("Unsupported snapshot version %s" %
+                         data.get('version'))
+    return data
+
+
+def define(data, metadata):
+    """Define all tables in a snapshot on the given metadata. Views are
+    defined as plain tables.
+
+    Parameters
+    ----------
+    data : dict
+        The snapshot.
+    metadata : MetaData
+        The metadata to define the tables on.
+    """
+
+    for name, table in sorted(data['tables'].items()):
+        columns = []
+        for column in table['columns']:
+            klass = GENERIC[column['type']]
+            # SQLite only generates ids for keys declared as INTEGER
+            if klass is types.BigInteger and column['primary_key']:
+                klass = types.Integer
+            if column.get('length'):
+                type_ = klass(column['length'])
+            else:
+                type_ = klass()
+            columns.append(Column(column['name'], type_,
+                                  nullable=column['nullable'],
+                                  primary_key=column['primary_key']))
+        Table(name, metadata, *columns)
+
+
+def create(engine, data):
+    """Create all tables from a snapshot in the given database.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine to create tables with.
+    data : dict
+        The snapshot.
+
+    Returns
+    -------
+    metadata : MetaData
+        The metadata with all created tables.
+    """
+
+    metadata = MetaData()
+    define(data, metadata)
+    metadata.create_all(engine)
+    logger.info("Created %i tables", len(metadata.tables))
+    return metadata
+
+
+def create_declared(engine):
+    """Create the tables in `DECLARED` which do not exist yet in the given
+    database. This is how these tables are added to the live database, as well
+    as to local ones.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine to create tables with.
+
+    Returns
+    -------
+    created : list
+        The names of the tables which were created.
+    """
+
+    existing = set(engine.table_names())
+    tables = [mod.metadata.tables[name] for name in DECLARED
+              if name not in existing]
+    mod.metadata.create_all(bind=engine, tables=tables)
+    created = [table.name for table in tables]
+    logger.info("Created %i declared tables", len(created))
+    return created
+
+
+def to_json(value):
+    """Convert a value from the database into something JSON can store.
+    """
+
+    if isinstance(value, (dt.datetime, dt.date, dt.time)):
+        return value.isoformat()
+    if isinstance(value, buffer):
+        return str(value)
+    if hasattr(value, 'as_tuple'):
+        return float(value)
+    return value
+
+
+def from_json(column, value):
+    """Convert a value from a dump into what the column stores.
+    """
+
+    if value is None:
+        return None
+    if isinstance(column.type, types.DateTime):
+        value = value.split('.')[0]
+        return dt.datetime.strptime(value, '%Y-%m-%dT%H:%M:%S')
+    if isinstance(column.type, types.Date):
+        return dt.datetime.strptime(value, '%Y-%m-%d').date()
+    if isinstance(column.type, types.Time):
+        return dt.datetime.strptime(value.split('.')[0], '%H:%M:%S').time()
+    return value
+
+
+def dump(engine, pdbs, filename, tables=None, chunk_size=1000):
+    """Dump the rows for some PDBs into a fixture file. Only tables with a
+    `pdb_id` column are dumped, unless a list of tables to dump in full is
+    given.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine to dump from.
+    pdbs : list
+        The PDB ids to dump the rows of.
+    filename : str
+        The file to write to.
+    tables : list, optional
+        Tables to dump all rows of, for example small lookup tables.
+    chunk_size : int, optional
+        The number of rows to fetch at once.
+    """
+
+    metadata = MetaData()
+    metadata.reflect(bind=engine, views=True)
+    full = set(tables or [])
+    rows = {}
+    with engine.connect() as conn:
+        for name, table in sorted(metadata.tables.items()):
+            query = table.select()
+            if name in full:
+                pass
+            elif 'pdb_id' in table.columns:
+                query = query.where(table.columns.pdb_id.in_(pdbs))
+            else:
+                continue
+
+            result = conn.execution_options(stream_results=True).\
+                execute(query)
+            rows[name] = []
+            while True:
+                chunk = result.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                for row in chunk:
+                    rows[name].append(dict((k, to_json(v))
+                                           for k, v in row.items()))
+            logger.info("Dumped %i rows from %s", len(rows[name]), name)
+
+    with open(filename, 'wb') as out:
+        json.dump(rows, out, indent=1, sort_keys=True)
+        out.write('\n')
+
+
+def load(engine, metadata, filename, chunk_size=1000):
+    """Load a fixture dump into a database created by `create`.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+        The engine to load into.
+    metadata : MetaData
+        The metadata of the created tables.
+    filename : str
+        The fixture dump to load.
+    chunk_size : int, optional
+        The number of rows to insert at once.
+    """
+
+    with open(filename, 'rb') as raw:
+        rows = json.load(raw)
+
+    with engine.begin() as conn:
+        for name, entries in sorted(rows.items()):
+            if name not in metadata.tables:
+                logger.warning("Skipping rows for unknown table %s", name)
+                continue
+
+            table = metadata.tables[name]
+            for start in xrange(0, len(entries), chunk_size):
+                chunk = []
+                for entry in entries[start:start + chunk_size]:
+                    chunk.append(dict((k, from_json(table.columns[k], v))
+                                      for k, v in entry.items()))
+                conn.execute(table.insert(), chunk)
+            logger.info("Loaded %i rows into %s", len(entries), name)
+
+
+def build(uri, snapshot_file, fixtures=None):
+    """Create a local database from a snapshot and optionally fill it from a
+    fixture dump.
+
+    Parameters
+    ----------
+    uri : str
+        The database uri, like 'sqlite:///local.db' or 'sqlite://' for an in
+        memory database.
+    snapshot_file : str
+        The snapshot to create tables from.
+    fixtures : str, optional
+        A fixture dump to load.
+
+    Returns
+    -------
+    engine : sqlalchemy.engine.Engine
+        The engine of the created database.
+    """
+
+    engine = local_engine(uri)
+    metadata = create(engine, load_snapshot(snapshot_file))
+    if fixtures:
+        load(engine, metadata, fixtures)
+    return engine
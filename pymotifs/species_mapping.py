@@ -4,9 +4,17 @@ This queries NCBI's taxononmy services to determine the species id for all
 taxon ids assigned to chains. Some chain organisms are species level and some
 are not. This will determine the assigned species. A few chains have
 assignments to the genus level, which this complains about.
+
+If the 'taxonomy' option of this stage is set to a directory containing an
+NCBI taxonomy dump, the nodes.dmp and names.dmp files from
+ftp://ftp.ncbi.nih.gov/pub/taxonomy/taxdump.tar.gz, then species are looked up
+in it with `Taxonomy` instead. Only taxon ids missing from the dump are fetched
+from the web service.
 """
 
+import os
 import xml.etree.ElementTree as ET
+from array import array
 
 from pymotifs import core
 from pymotifs import models as mod
@@ -90,6 +98,151 @@ class Parser(object):
         return self.parse(response.text)
 
 
+class Taxonomy(object):
+    """A local copy of the NCBI taxonomy, used to find the species of any
+    taxon without web requests. The tree is stored as an array of the parent
+    of each taxon id and a flag for each id which is a species, so the species
+    of a taxon is found by following parents until reaching a species. Only
+    the scientific names of species are kept.
+
+    Parameters
+    ----------
+    nodes : iterable
+        The lines of a nodes.dmp file.
+    names : iterable
+        The lines of a names.dmp file.
+    """
+
+    def __init__(self, nodes, names):
+        self.parents = array('i')
+        self.species = bytearray()
+        self.names = {}
+
+        for fields in self.rows(nodes):
+            taxon_id = int(fields[0])
+            if taxon_id >= len(self.parents):
+                self.grow(taxon_id + 1)
+            self.parents[taxon_id] = int(fields[1])
+            if fields[2] == 'species':
+                self.species[taxon_id] = 1
+
+        for fields in self.rows(names):
+            taxon_id = int(fields[0])
+            if fields[3] == 'scientific name' and self.is_species(taxon_id):
+                self.names[taxon_id] = fields[1]
+
+    @classmethod
+    def load(cls, directory):
+        """Load the taxonomy from the nodes.dmp and names.dmp files in the
+        given directory.
+
+        Parameters
+        ----------
+        directory : str
+            The directory with the dump files.
+
+        Returns
+        -------
+        taxonomy : Taxonomy
+            The loaded taxonomy.
+        """
+
+        with open(os.path.join(directory, 'nodes.dmp'), 'rb') as nodes:
+            with open(os.path.join(directory, 'names.dmp'), 'rb') as names:
+                return cls(nodes, names)
+
+    def rows(self, lines):
+        """Split the lines of a dump file into fields. Fields are separated
+        by '\t|\t' and each line ends with '\t|'.
+        """
+
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if line.endswith('\t|'):
+                line = line[:-2]
+            if line:
+                yield line.split('\t|\t')
+
+    def grow(self, size):
+        """Extend the arrays so they can hold all ids below size. The arrays
+        are at least doubled to keep the number of copies small.
+        """
+
+        size = max(size, 2 * len(self.parents))
+        missing = size - len(self.parents)
+        self.parents.extend(array('i', [0]) * missing)
+        self.species.extend(bytearray(missing))
+
+    def is_species(self, taxon_id):
+        """Check if the taxon id is at the species rank.
+        """
+        return 0 < taxon_id < len(self.species) and \
+            self.species[taxon_id] == 1
+
+    def __contains__(self, taxon_id):
+        return 0 < taxon_id < len(self.parents) and \
+            self.parents[taxon_id] != 0
+
+    def get_species(self, taxon_id):
+        """Find the species a taxon belongs to.
+
+        Parameters
+        ----------
+        taxon_id : int
+            The taxon id to look up.
+
+        Raises
+        ------
+        KeyError
+            If the taxon id is not in the taxonomy.
+
+        Returns
+        -------
+        assignment : (int, str)
+            The species id and scientific name, or (None, None) if the taxon
+            is above the species level.
+        """
+
+        if taxon_id not in self:
+            raise KeyError(taxon_id)
+
+        current = taxon_id
+        while not self.species[current]:
+            parent = self.parents[current]
+            if parent == current or parent not in self:
+                return None, None
+            current = parent
+        return current, self.names.get(current)
+
+    def __call__(self, taxon_id):
+        """Find the species assignment of a taxon id, in the same format as
+        `Parser.parse`.
+
+        Parameters
+        ----------
+        taxon_id : int
+            The taxon id to look up.
+
+        Raises
+        ------
+        KeyError
+            If the taxon id is not in the taxonomy.
+
+        Returns
+        -------
+        species : dict
+            A dict with 'species_mapping_id', 'species_id' and 'species_name'
+            fields.
+        """
+
+        species_id, species_name = self.get_species(taxon_id)
+        return {
+            'species_mapping_id': taxon_id,
+            'species_id': species_id,
+            'species_name': species_name
+        }
+
+
 class Loader(core.SimpleLoader):
     """The loader to actually fetch and store the species assignments for all
     taxonomy ids.
@@ -160,9 +313,25 @@ class Loader(core.SimpleLoader):
         return session.query(mod.SpeciesMapping).\
             filter_by(species_mapping_id=taxonomy_id)
 
+    @property
+    def taxonomy(self):
+        """The local `Taxonomy`, loaded from the directory in the 'taxonomy'
+        option of this stage. This is loaded once and is None if the option is
+        not set.
+        """
+
+        if not hasattr(self, '_taxonomy'):
+            self._taxonomy = None
+            directory = self.config[self.name].get('taxonomy')
+            if directory:
+                self.logger.info("Loading taxonomy from %s", directory)
+                self._taxonomy = Taxonomy.load(directory)
+        return self._taxonomy
+
     def data(self, taxonomy_id, **kwargs):
         """Fetch the taxonomic assignment information for the given
-        taxonomy_id. This will make a web request (using retries) to get the
+        taxonomy_id. If a local taxonomy is configured and knows the id it is
+        used, otherwise this will make a web request (using retries) to get the
         taxonomy information. It will then extract the species assignment and
         produce data for it.
 
@@ -177,8 +346,13 @@ class Loader(core.SimpleLoader):
             The species mapping object to save.
         """
 
-        helper = WebRequestHelper(parser=Parser())
-        result = helper(self.url % taxonomy_id)
+        taxonomy = self.taxonomy
+        if taxonomy is not None and taxonomy_id in taxonomy:
+            result = taxonomy(taxonomy_id)
+        else:
+            helper = WebRequestHelper(parser=Parser())
+            result = helper(self.url % taxonomy_id)
+
         if 'species_id' not in result:
             self.logger.warning("No species found for %i", taxonomy_id)
         return mod.SpeciesMapping(**result)
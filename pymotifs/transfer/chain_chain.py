@@ -1,18 +1,35 @@
 """A module to handle importing and exporting chain chain data. Sometimes we
 want to copy chain chain data from one machine to another. This module is meant
 to have the logic for doing so in one place.
+
+Dumps are gzip compressed text files. The first line is a JSON header, like::
+
+    {"format": "chain-chain", "version": 2, "chunk_size": 1000,
+     "columns": ["discrepancy", "num_nucleotides", ...]}
+
+and each following line is a JSON list of at most `chunk_size` rows, each row
+being a list of values in the order of the columns. Both dumping and loading
+work one chunk at a time, and loading only looks up the chain ids,
+correspondence ids and existing comparisons for the chains in each chunk, so
+neither needs memory for more than one chunk. Dumps in the older format, a
+single pickled list of dicts, can still be loaded.
 """
 
+import gzip
+import json
 import pickle
 import logging
 import operator as op
+import itertools as it
 
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm import aliased
 
 from pymotifs.core import Session
 from pymotifs import models as mod
+from pymotifs.utils import grouper
 from pymotifs.utils import row2dict
+from pymotifs.schema import to_json
 
 chain_entry = lambda n: op.itemgetter('pdb_id' + n, 'chain_name' + n)
 chain1 = chain_entry('1')
@@ -20,6 +37,27 @@ chain2 = chain_entry('2')
 
 logger = logging.getLogger(__name__)
 
+"""The name of the format in the header of dumps."""
+FORMAT = 'chain-chain'
+
+"""The version of the dump format."""
+VERSION = 2
+
+"""The columns stored for each comparison, in order."""
+COLUMNS = [
+    'discrepancy',
+    'num_nucleotides',
+    'model_1',
+    'model_2',
+    'pdb_id1',
+    'chain_name1',
+    'pdb_id2',
+    'chain_name2',
+]
+
+"""The number of comparisons to write or load at once."""
+CHUNK_SIZE = 1000
+
 
 def setup(engine, **kwargs):
     """Reflect the models and create a session wrapper.
@@ -40,7 +78,7 @@ def setup(engine, **kwargs):
 def chain_id_mapping(session, data, ignore_missing=False):
     """Create a mapping from (pdb, chain_name) to chain id in the database.
     By default, this will map all entries in data or it will fail with a value
-    error.
+    error. Only the chains of the structures in data are loaded.
 
     Parameters
     ----------
@@ -61,8 +99,12 @@ def chain_id_mapping(session, data, ignore_missing=False):
     entries = set()
     entries.update(chain1(e) for e in data)
     entries.update(chain2(e) for e in data)
+    pdbs = sorted(set(pdb for pdb, _ in entries))
     with session() as sess:
-        query = sess.query(mod.ChainInfo)
+        query = sess.query(mod.ChainInfo.pdb_id,
+                           mod.ChainInfo.chain_name,
+                           mod.ChainInfo.chain_id).\
+            filter(mod.ChainInfo.pdb_id.in_(pdbs))
         for result in query:
             entry = (result.pdb_id, result.chain_name)
             if entry not in entries:
@@ -83,7 +125,7 @@ def correspondence_id_mapping(session, data, ignore_missing=False):
     """Create a mapping from compared chain chain to correspondence ids. This
     will fail if not all chains in the input data could be mapped, if
     ignore_missing is False (the default behavior), otherwise it will only log
-    the error.
+    the error. Only the correspondences of the structures in data are loaded.
 
     Parameters
     ----------
@@ -103,6 +145,7 @@ def correspondence_id_mapping(session, data, ignore_missing=False):
     """
 
     entries = {(chain1(e), chain2(e)) for e in data}
+    pdbs = sorted(set(e['pdb_id1'] for e in data))
 
     with session() as sess:
         corr = mod.CorrespondencePdbs
@@ -113,7 +156,8 @@ def correspondence_id_mapping(session, data, ignore_missing=False):
                            corr.chain_name_2.label('chain_name2'),
                            corr.chain_id_1,
                            corr.chain_id_2,
-                           )
+                           ).\
+            filter(corr.pdb_id_1.in_(pdbs))
 
         mapping = {}
         for result in query:
@@ -137,7 +181,7 @@ def correspondence_id_mapping(session, data, ignore_missing=False):
     return mapping
 
 
-def known_comparisions(session):
+def known_comparisions(session, chain_ids=None):
     """Get a set of all known chain chain comparisons. This can be used to skip
     importing existing comparisons.
 
@@ -145,6 +189,8 @@ def known_comparisions(session):
     ----------
     session : pymotifs.core.Session
         The session to use.
+    chain_ids : list, optional
+        If given, only comparisons of these chains to each other are loaded.
 
     Returns
     -------
@@ -154,50 +200,163 @@ def known_comparisions(session):
 
     known = set()
     with session() as sess:
-        query = sess.query(mod.ChainChainSimilarity)
+        ccs = mod.ChainChainSimilarity
+        query = sess.query(ccs.chain_id_1, ccs.chain_id_2)
+        if chain_ids is not None:
+            query = query.filter(ccs.chain_id_1.in_(chain_ids)).\
+                filter(ccs.chain_id_2.in_(chain_ids))
         for result in query:
             known.add((result.chain_id_1, result.chain_id_2))
     return known
 
 
-def load(filename, ignore_missing=False, **kwargs):
-    """Load the data in the given file. This will import all new data in the
-    given file to the database. If the comparison has already been done it will
-    not be loaded. The file should contain the data to write in the format
-    produced by dump.
+def write_header(out, chunk_size=CHUNK_SIZE):
+    """Write the header of a dump.
+
+    Parameters
+    ----------
+    out : file
+        The file to write to.
+    chunk_size : int, optional
+        The max number of rows in each chunk.
+    """
+
+    header = {
+        'format': FORMAT,
+        'version': VERSION,
+        'chunk_size': chunk_size,
+        'columns': COLUMNS,
+    }
+    out.write(json.dumps(header, sort_keys=True) + '\n')
+
+
+def write_chunk(out, entries):
+    """Write a chunk of comparisons to a dump.
+
+    Parameters
+    ----------
+    out : file
+        The file to write to.
+    entries : list
+        A list of dicts with a key for each of `COLUMNS`.
+    """
+
+    rows = [[to_json(entry[column]) for column in COLUMNS]
+            for entry in entries]
+    out.write(json.dumps(rows) + '\n')
+
+
+def read_header(raw):
+    """Read and validate the header of a dump.
+
+    Parameters
+    ----------
+    raw : file
+        The file to read from.
+
+    Raises
+    ------
+    ValueError
+        If this is not a chain chain dump of a known version.
+
+    Returns
+    -------
+    header : dict
+        The header.
+    """
+
+    try:
+        header = json.loads(raw.readline())
+    except ValueError:
+        raise ValueError("Not a chain chain dump")
+
+    if not isinstance(header, dict) or header.get('format') != FORMAT:
+        raise ValueError("Not a chain chain dump")
+    if header.get('version') != VERSION:
+        raise ValueError("Unsupported dump version %s" %
+                         header.get('version'))
+    return header
+
+
+def chunks(filename):
+    """Read the chunks in a dump. Dumps in the old pickled format are read
+    completely and then split into chunks.
 
     Parameters
     ----------
     filename : str
-        The name of the file to load data from.
+        The dump to read.
+
+    Yields
+    ------
+    chunk : list
+        A list of dicts with a key for each of `COLUMNS`.
+    """
+
+    with open(filename, 'rb') as raw:
+        is_gzip = raw.read(2) == '\x1f\x8b'
+
+    if not is_gzip:
+        logger.warning("Loading %s in the old pickled format", filename)
+        with open(filename, 'rb') as raw:
+            data = pickle.load(raw)
+        for chunk in grouper(CHUNK_SIZE, data):
+            yield list(chunk)
+        return
+
+    with gzip.open(filename, 'rb') as raw:
+        header = read_header(raw)
+        columns = header['columns']
+        for line in raw:
+            if not line.strip():
+                continue
+            yield [dict(it.izip(columns, row)) for row in json.loads(line)]
+
+
+def importable(session, chunk, ignore_missing=False):
+    """Find the comparisons in a chunk to import. This resolves the chain and
+    correspondence ids of the chains in the chunk and skips comparisons which
+    are already stored.
+
+    Parameters
+    ----------
+    session : pymotifs.core.Session
+        The session to use.
+    chunk : list
+        A list of dicts as from `chunks`.
+    ignore_missing : bool, optional
+        If missing chains and correspondences should only be logged.
 
     Raises
     ------
     ValueError
         If either any chain is not mapped or there is not correspondence
         between a compared pair of chains and ignore_mapping is False.
-    """
 
-    with open(filename, 'rb') as raw:
-        data = pickle.load(raw)
+    Returns
+    -------
+    savable : list
+        A list of dicts to create ChainChainSimilarity entries from.
+    """
 
-    session = setup(**kwargs)
-    chain_mapping = chain_id_mapping(session, data,
+    chain_mapping = chain_id_mapping(session, chunk,
                                      ignore_missing=ignore_missing)
-    corr_mapping = correspondence_id_mapping(session, data,
+    corr_mapping = correspondence_id_mapping(session, chunk,
                                              ignore_missing=ignore_missing)
-    known = known_comparisions(session)
+    known = known_comparisions(session, sorted(set(chain_mapping.values())))
     savable = []
-    for entry in data:
+    for entry in chunk:
         if chain1(entry) not in chain_mapping:
             logger.error("Chain %s not in chain mapping", chain1(entry))
             if not ignore_missing:
                 raise ValueError("Missing chain id")
+            continue
 
         if chain2(entry) not in chain_mapping:
             logger.error("Chain %s not in chain mapping", chain2(entry))
             if not ignore_missing:
                 raise ValueError("Missing chain id")
+            continue
 
         chain_id_1 = chain_mapping[chain1(entry)]
         chain_id_2 = chain_mapping[chain2(entry)]
@@ -224,26 +383,71 @@ def load(filename, ignore_missing=False, **kwargs):
             'correspondence_id': corr_mapping[ids],
         })
         logger.debug("Importing %s", to_save)
-        savable.append(mod.ChainChainSimilarity(**to_save))
+        savable.append(to_save)
+        known.add(ids)
+    return savable
 
-    with session() as sess:
-        for entry in savable:
-            sess.insert(entry)
-        logger.info("Imported %i correspondences", len(savable))
 
+def load(filename, ignore_missing=False, **kwargs):
+    """Load the data in the given file. This will import all new data in the
+    given file to the database. If the comparison has already been done it will
+    not be loaded. The file should contain the data to write in the format
+    produced by dump. Each chunk is imported in its own transaction.
+
+    Parameters
+    ----------
+    filename : str
+        The name of the file to load data from.
+
+    Raises
+    ------
+    ValueError
+        If either any chain is not mapped or there is not correspondence
+        between a compared pair of chains and ignore_mapping is False.
+
+    Returns
+    -------
+    count : int
+        The number of imported comparisons.
+    """
 
-def dump(filename, **kwargs):
+    session = setup(**kwargs)
+    table = mod.ChainChainSimilarity.__table__
+    count = 0
+    for chunk in chunks(filename):
+        savable = importable(session, chunk, ignore_missing=ignore_missing)
+        if savable:
+            with session() as sess:
+                sess.execute(table.insert(), savable)
+        count += len(savable)
+        logger.info("Imported %i of %i comparisons in chunk", len(savable),
+                    len(chunk))
+
+    logger.info("Imported %i correspondences", count)
+    return count
+
+
+def dump(filename, chunk_size=CHUNK_SIZE, **kwargs):
     """Dump chain chain comparison data to a file. This will dump all chain
-    chain comparison data to a file for later import. The data is pickled for
-    easy reading and writing in python.
+    chain comparison data to a file for later import. Rows are streamed from
+    the database and written in compressed chunks, see the module
+    documentation for the format.
 
     Parameters
     ----------
     filename : str
         Name of the file to write to.
+    chunk_size : int, optional
+        The number of rows in each chunk.
+
+    Returns
+    -------
+    count : int
+        The number of dumped comparisons.
     """
 
     session = setup(**kwargs)
+    count = 0
     with session() as sess:
         chain1 = aliased(mod.ChainInfo)
         chain2 = aliased(mod.ChainInfo)
@@ -259,8 +463,18 @@ def dump(filename, **kwargs):
             join(chain1,
                  chain1.chain_id == mod.ChainChainSimilarity.chain_id_1).\
             join(chain2,
-                 chain2.chain_id == mod.ChainChainSimilarity.chain_id_2)
-
-        results = [row2dict(r) for r in query]
-        with open(filename, 'wb') as out:
-            pickle.dump(results, out)
+                 chain2.chain_id == mod.ChainChainSimilarity.chain_id_2).\
+            execution_options(stream_results=True).\
+            yield_per(chunk_size)
+
+        out = gzip.open(filename, 'wb')
+        try:
+            write_header(out, chunk_size=chunk_size)
+            for chunk in grouper(chunk_size, query):
+                write_chunk(out, [row2dict(r) for r in chunk])
+                count += len(chunk)
+        finally:
+            out.close()
+
+    logger.info("Dumped %i comparisons", count)
+    return count
@@ -0,0 +1,101 @@
+"""A loader to store the number of heavy atoms in each unit. This counts the C,
+N, O and P atoms in the coordinates stored by `pymotifs.units.coordinates` and
+writes one row per unit into the unit_atom_counts table. These counts are used
+when computing the clash score of IFEs, see
+`pymotifs.nr.representatives.using_quality`, so the coordinates need not be
+parsed for every IFE. The table is created when the pipeline is run, or with
+the 'db migrate' command.
+"""
+
+import pymotifs.core as core
+from pymotifs import models as mod
+
+from pymotifs.units.coordinates import Loader as CoordinateLoader
+
+"""The atoms which are counted."""
+COUNTED_ATOMS = set(['C', 'N', 'O', 'P'])
+
+
+def heavy_atoms(coordinates):
+    """Count the heavy atoms in the coordinates of a unit.
+
+    Parameters
+    ----------
+    coordinates : str
+        The atom_site lines of the unit, as stored in unit_coordinates.
+
+    Returns
+    -------
+    count : int
+        The number of atoms whose type symbol is one of `COUNTED_ATOMS`.
+    """
+
+    count = 0
+    for line in coordinates.split('\n'):
+        parts = line.split()
+        if len(parts) > 2 and parts[2] in COUNTED_ATOMS:
+            count += 1
+    return count
+
+
+class Loader(core.SimpleLoader):
+    """The loader to store unit_atom_counts data.
+    """
+
+    dependencies = set([CoordinateLoader])
+
+    def query(self, session, pdb):
+        """Create a query to find all entries in `unit_atom_counts` for the
+        given PDB id.
+
+        Parameters
+        ----------
+        session : pymotifs.core.Session
+            The session to use.
+
+        pdb : str
+            The PDB id to use.
+
+        Returns
+        -------
+        query : Query
+            The query for the given structure.
+        """
+
+        return session.query(mod.UnitAtomCounts).\
+            join(mod.UnitInfo,
+                 mod.UnitInfo.unit_id == mod.UnitAtomCounts.unit_id).\
+            filter(mod.UnitInfo.pdb_id == pdb)
+
+    def data(self, pdb, **kwargs):
+        """Count the heavy atoms of all units with stored coordinates in the
+        given PDB.
+
+        Parameters
+        ----------
+        pdb : str
+            The PDB id to use.
+
+        Returns
+        -------
+        counts : list
+            A UnitAtomCounts object for each unit.
+        """
+
+        with self.session() as session:
+            query = session.query(mod.UnitCoordinates.unit_id,
+                                  mod.UnitCoordinates.coordinates).\
+                join(mod.UnitInfo,
+                     mod.UnitInfo.unit_id == mod.UnitCoordinates.unit_id).\
+                filter(mod.UnitInfo.pdb_id == pdb)
+
+            counts = []
+            for result in query:
+                counts.append(mod.UnitAtomCounts(
+                    unit_id=result.unit_id,
+                    heavy_atoms=heavy_atoms(result.coordinates),
+                ))
+
+        if not counts:
+            raise core.InvalidState("No coordinates stored for %s" % pdb)
+        return counts
@@ -1,5 +1,6 @@
 """Run all unit loaders. This will run the following unit stages:
 
+- units.atom_counts
 - units.centers
 - units.coordinates
 - units.distances
@@ -12,6 +13,7 @@ from pymotifs import core
 
 from pymotifs.units.info import Loader as InfoLoader
 from pymotifs.units.coordinates import Loader as CoordinateLoader
+from pymotifs.units.atom_counts import Loader as AtomCountLoader
 from pymotifs.units.distances import Loader as DistancesLoader
 # from pymotifs.units.redundant import RedundantNucleotidesLoader
 from pymotifs.units.centers import Loader as CenterLoader
@@ -25,4 +27,4 @@ class Loader(core.StageContainer):
 
     """The `Stages` this will run"""
     stages = set([InfoLoader, DistancesLoader, CenterLoader, RotationLoader,
-                  CoordinateLoader, IncompleteLoader])
+                  CoordinateLoader, AtomCountLoader, IncompleteLoader])
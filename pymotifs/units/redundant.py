@@ -1,19 +1,64 @@
 """Import information about redundancy between nucleotides within a PDB file.
+
+Two nucleotides are redundant if they are copies of each other. Either they
+overlap in space, as alternate or symmetry related copies may, or they are the
+same nucleotide in two copies of a chain and have the same local geometry. The
+local geometry of a nucleotide is described by where its neighbors in the chain
+are, in the coordinate frame of its base. This does not change when a whole
+chain is moved, so it can be compared between copies directly.
+
+By default these are found by running fr3d in Matlab. Setting the 'backend'
+option of this stage to 'python' instead computes them from the base centers
+and rotation matrices of the structure, which does not need Matlab.
+
+The Python backend is stricter than Matlab. Matlab reports nearly every pair of
+same numbered nucleotides in two copies of a chain, even where one copy has a
+different conformation, while the Python backend only reports those whose
+local geometry agrees. It reports no pairs Matlab does not.
 """
 
 import os
 import csv
+import itertools as it
+import collections as coll
+
+import numpy as np
+from scipy.spatial import cKDTree
 
 from pymotifs import core
 from pymotifs.utils import matlab
 from pymotifs import models as mod
 from pymotifs.mat_files import Loader as MatLoader
 
+Nucleotide = coll.namedtuple('Nucleotide', [
+    'unit_id', 'sequence', 'model', 'chain', 'sym_op', 'number', 'ins_code',
+    'center', 'rotation'
+])
+
 
 class RedundantNucleotidesLoader(core.SimpleLoader):
-    dependencies = set([MatLoader])
+    dependencies = set()
     allow_no_data = True
 
+    backend = 'matlab'
+    """Default way to find redundant nucleotides, either 'python' or 'matlab'"""
+
+    overlap = 1.0
+    """Nucleotides with base centers closer than this overlap"""
+
+    tolerance = 4.0
+    """Largest difference, in Angstroms, between the local geometry of copies"""
+
+    @classmethod
+    def configured_dependencies(cls, config):
+        """Matlab files are only needed when using the 'matlab' backend.
+        """
+
+        dependencies = set(cls.dependencies)
+        if cls.configured_option(config, 'backend') == 'matlab':
+            dependencies.add(MatLoader)
+        return dependencies
+
     @property
     def table(self):
         return mod.UnitRedundancies
@@ -33,7 +78,138 @@ class RedundantNucleotidesLoader(core.SimpleLoader):
         query = session.query(mod.UnitRedundancies).filter_by(pdb_id=pdb)
         return query
 
-    def data(self, pdb, **kwargs):
+    def nucleotides(self, structure):
+        """Get all nucleotides in a structure which have a base center and
+        rotation matrix.
+
+        :structure: The structure to use.
+        :returns: A list of `Nucleotide`s in the order of the structure.
+        """
+
+        nts = []
+        for residue in structure.residues():
+            rotation = getattr(residue, 'rotation_matrix', None)
+            if 'base' not in residue.centers or rotation is None:
+                continue
+            center = residue.centers['base']
+            if len(center) != 3:
+                continue
+            nts.append(Nucleotide(unit_id=residue.unit_id(),
+                                  sequence=residue.sequence,
+                                  model=residue.model,
+                                  chain=residue.chain,
+                                  sym_op=residue.symmetry,
+                                  number=residue.number,
+                                  ins_code=residue.insertion_code,
+                                  center=center,
+                                  rotation=rotation))
+        return nts
+
+    def environments(self, nts, centers):
+        """Describe the local geometry of each nucleotide. This is the position
+        of the previous and next nucleotide in the chain, relative to the base
+        center and in the frame of the base. Where there is no neighbor the
+        base center itself is used.
+
+        :nts: The list of nucleotides, in chain order.
+        :centers: An array of the base centers of the nucleotides.
+        :returns: An array with one row of 6 values per nucleotide.
+        """
+
+        rotations = np.array([nt.rotation for nt in nts], dtype=float)
+        chains = [(nt.model, nt.chain, nt.sym_op) for nt in nts]
+        same = np.array([a == b for a, b in zip(chains, chains[1:])],
+                        dtype=bool)
+        index = np.arange(len(nts))
+        previous = index.copy()
+        previous[1:][same] -= 1
+        following = index.copy()
+        following[:-1][same] += 1
+
+        before = np.einsum('ij,ijk->ik', centers[previous] - centers,
+                           rotations)
+        after = np.einsum('ij,ijk->ik', centers[following] - centers,
+                          rotations)
+        return np.hstack([before, after])
+
+    def overlapping(self, nts, centers):
+        """Find all pairs of nucleotides of the same type, in the same model,
+        whose base centers overlap.
+
+        :nts: The list of nucleotides.
+        :centers: An array of the base centers of the nucleotides.
+        :returns: A set of (index, index) pairs, the first index always the
+        smallest.
+        """
+
+        pairs = cKDTree(centers).query_pairs(self.overlap)
+        return set((i, j) for i, j in pairs
+                   if nts[i].sequence == nts[j].sequence and
+                   nts[i].model == nts[j].model)
+
+    def copies(self, nts, environments):
+        """Find all pairs of nucleotides which are the same nucleotide in
+        different copies of a chain, and have the same local geometry.
+
+        :nts: The list of nucleotides.
+        :environments: The local geometry of each nucleotide, as from
+        `environments`.
+        :returns: A set of (index, index) pairs, the first index always the
+        smallest.
+        """
+
+        groups = coll.defaultdict(list)
+        for index, nt in enumerate(nts):
+            key = (nt.model, nt.sequence, nt.number, nt.ins_code)
+            groups[key].append(index)
+
+        pairs = [pair for members in groups.values()
+                 for pair in it.combinations(members, 2)]
+        if not pairs:
+            return set()
+
+        first, second = np.array(pairs).T
+        difference = environments[first] - environments[second]
+        similar = np.sqrt((difference ** 2).sum(axis=1)) <= self.tolerance
+        return set(zip(first[similar].tolist(), second[similar].tolist()))
+
+    def redundant(self, nts):
+        """Find all pairs of redundant nucleotides.
+
+        :nts: The list of nucleotides, in chain order, as from `nucleotides`.
+        :returns: A list of (unit id, unit id) pairs. Each pair is listed in
+        both orders, ordered like the Matlab output.
+        """
+
+        if len(nts) < 2:
+            return []
+
+        centers = np.array([nt.center for nt in nts], dtype=float)
+        pairs = self.overlapping(nts, centers)
+        pairs.update(self.copies(nts, self.environments(nts, centers)))
+        pairs.update([(j, i) for i, j in pairs])
+        ordered = sorted(pairs, key=lambda p: (p[1], p[0]))
+        return [(nts[i].unit_id, nts[j].unit_id) for i, j in ordered]
+
+    def python_data(self, pdb):
+        """Find the redundant nucleotides in a structure.
+
+        :pdb: The pdb id or structure to use.
+        :returns: A list of redundant nucleotide dictionaries.
+        """
+
+        nts = self.nucleotides(self.structure(pdb))
+        return [{'unit_id_1': unit1, 'unit_id_2': unit2, 'pdb_id': pdb}
+                for unit1, unit2 in self.redundant(nts)]
+
+    def matlab_data(self, pdb):
+        """Find the redundant nucleotides in a structure by running fr3d in
+        Matlab.
+
+        :pdb: The pdb id to use.
+        :returns: A list of redundant nucleotide dictionaries.
+        """
+
         mlab = matlab.Matlab(self.config['locations']['fr3d_root'])
         ifn, err_msg = mlab.loadRedundantNucleotides(pdb, nout=2)
         if err_msg != '':
@@ -43,3 +219,17 @@ class RedundantNucleotidesLoader(core.SimpleLoader):
             data = self._parse(raw, pdb)
         os.remove(ifn)
         return data
+
+    def data(self, pdb, **kwargs):
+        """Find the redundant nucleotides using the configured backend.
+
+        :pdb: The pdb id to use.
+        :returns: A list of redundant nucleotide dictionaries.
+        """
+
+        backend = self.config[self.name].get('backend', self.backend)
+        if backend == 'matlab':
+            return self.matlab_data(pdb)
+        if backend == 'python':
+            return self.python_data(pdb)
+        raise core.InvalidState("Unknown redundancy backend %s" % backend)
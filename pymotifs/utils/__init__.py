@@ -6,13 +6,17 @@ import os
 import gzip
 import inspect
 import logging
+import tempfile
 from ftplib import FTP
 import itertools as it
 import cStringIO as sio
 import collections as coll
+from contextlib import contextmanager
 
 import requests
 
+from sqlalchemy import func
+
 
 """Generic logger for all utilities."""
 logger = logging.getLogger(__name__)
@@ -125,6 +129,40 @@ def flatten(sequence, predicate=list_or_tuple):
             yield obj
 
 
+@contextmanager
+def atomic_open(filename, mode='wb'):
+    """Open a file so that it is only visible under its final name once all
+    writing is complete. The data is written to a temporary file in the same
+    directory, which is then renamed over `filename`. If writing fails the
+    temporary file is removed and any existing file is left untouched.
+
+    Parameters
+    ----------
+    filename : str
+        The final path to write to.
+    mode : str, optional
+        The mode to open the temporary file with.
+
+    Yields
+    ------
+    handle : file
+        The file object to write to.
+    """
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp = tempfile.mkstemp(dir=directory,
+                                prefix='.' + os.path.basename(filename))
+    try:
+        with os.fdopen(fd, mode) as handle:
+            yield handle
+        os.chmod(temp, 0o644)
+        os.rename(temp, filename)
+    except:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
 def row2dict(row):
     """Convert an sqlalchemy object into a dictionary. This should either be
     the result of querying or an object that is to be saved. It must have
@@ -178,6 +216,29 @@ def result2dict(result):
     return d
 
 
+def exact(column, dialect):
+    """Make a string column compare and group by its exact value. MySQL uses a
+    case insensitive collation by default, which would merge values like cSs
+    and csS, or chains A and a, so there the column is compared as BINARY.
+
+    Parameters
+    ----------
+    column : Column
+        The column to compare.
+    dialect : str
+        The name of the database dialect in use.
+
+    Returns
+    -------
+    column : ColumnElement
+        A column that compares case sensitively.
+    """
+
+    if dialect == 'mysql':
+        return func.binary(column)
+    return column
+
+
 def known_subclasses(base, glob):
     """Get the list of known subclasses from the given dictonary.
     """
@@ -10,6 +10,7 @@ from pymotifs import core
 from pymotifs import models as mod
 from pymotifs.utils import row2dict
 from pymotifs.utils import grouper
+from pymotifs.utils.units import Translator
 
 Unit = coll.namedtuple('Unit', ['pdb', 'model', 'chain', 'component_number',
                                 'insertion_code', 'alt_id', 'symmetry'])
@@ -194,6 +195,10 @@ class TranslateCorrectly(core.Base):
     the units id.
     """
 
+    def __init__(self, *args, **kwargs):
+        super(TranslateCorrectly, self).__init__(*args, **kwargs)
+        self.translator = Translator(self.session)
+
     def correct(self, pdb, unit_ids):
         """Correct the units in a given pdb file.
 
@@ -209,7 +214,9 @@ class TranslateCorrectly(core.Base):
         return [mapping[u] for u in corrected]
 
     def __call__(self, pdb, unit_ids, sort=False):
-        """Translate and correct unit ids in a given structure.
+        """Translate and correct unit ids in a given structure. The
+        translations are cached, so calling this many times only loads the
+        translations of each structure once.
 
         :param str pdb: The PDB to use.
         :param str unit_ids: A comma seperated string of unit ids.
@@ -218,8 +225,7 @@ class TranslateCorrectly(core.Base):
         given.
         """
 
-        translator = Translator(self.session)
-        translated = translator(unit_ids)
+        translated = self.translator(unit_ids)
         corrected = self.correct(pdb, translated)
         if sort:
             return sorted(corrected)
@@ -237,8 +243,9 @@ class TableCorrector(core.Base):
 
     def __call__(self, table, column, size=1000, translate=False, **kwargs):
         corrector = Correcter(self.config, self.session)
+        translator = None
         if translate:
-            corrector = TranslateCorrectly(self.config, self.session)
+            translator = Translator(self.session)
 
         with self.session() as session:
             query = session.query(table)
@@ -249,6 +256,8 @@ class TableCorrector(core.Base):
                 unit_ids = list(set(it.chain.from_iterable(unit_ids)))
 
                 try:
+                    if translator is not None:
+                        unit_ids = translator.translate(unit_ids)
                     corrected = corrector(unit_ids)
                 except Exception as err:
                     self.logger.exception(err)
@@ -259,6 +268,8 @@ class TableCorrector(core.Base):
                 mapping = dict(zip(unit_ids, corrected))
                 for row in chunk:
                     old = self.unit_ids(row, column)
+                    if translator is not None:
+                        old = translator.translate(old)
                     updated = self.seperator.join([mapping[uid] for uid in old])
                     setattr(row, column, updated)
                 session.commit()
@@ -35,6 +35,38 @@ class Helper(core.Base):
                 distinct()
             return [result.pdb_id_2 for result in query]
 
+    def pdb_mappings(self, pdb):
+        """Load the unit level mappings from the given pdb to all pdbs it has
+        a good alignment with, in a single query.
+
+        :param str pdb: The pdb to get the mappings from.
+        :returns: A dict from the id of each corresponding pdb to a list of
+        (correspondence id, unit id in pdb, unit id in other pdb) tuples.
+        """
+
+        with self.session() as session:
+            units = mod.CorrespondenceUnits
+            info = mod.CorrespondenceInfo
+            query = session.query(units.pdb_id_2,
+                                  units.correspondence_id,
+                                  units.unit_id_1,
+                                  units.unit_id_2,
+                                  ).\
+                join(info,
+                     info.correspondence_id == units.correspondence_id).\
+                filter(units.pdb_id_1 == pdb).\
+                filter(units.pdb_id_2 != pdb).\
+                filter(units.unit_id_1 != None).\
+                filter(units.unit_id_2 != None).\
+                filter(info.good_alignment == 1)
+
+            mappings = coll.defaultdict(list)
+            for result in query:
+                mappings[result.pdb_id_2].append((result.correspondence_id,
+                                                  result.unit_id_1,
+                                                  result.unit_id_2))
+            return dict(mappings)
+
     def chains(self, pdb1, pdb2):
         """Get all chains which correspond between the two structures. This
         will return a list of 3 element tuples. The first will be the
@@ -1,5 +1,6 @@
 import random
 import itertools as it
+import collections as coll
 
 from pymotifs import core
 
@@ -94,18 +95,53 @@ class Namer(core.Base):
         # If there is more than 2 parents we always use a new name
         return self.new_name(len(parents), known)
 
-    def parents(self, group, known_groups):
+    def index(self, known_groups):
+        """Build an inverted index from the id of each member to the position
+        of all known groups that contain it.
+
+        :known_groups: The list of groups to index.
+        :returns: A dictionary from member id to a set of positions.
+        """
+
+        index = coll.defaultdict(set)
+        for position, known in enumerate(known_groups):
+            for member in known['members']:
+                index[member['id']].add(position)
+        return dict(index)
+
+    def parents(self, group, known_groups, index=None):
+        """Find all known groups which share at least one member with the
+        given group. Only the known groups which contain a member of the group
+        are looked at, using an index from `index`.
+
+        :group: The group to find the parents of.
+        :known_groups: The list of possible parents.
+        :index: The index of the known groups, built if not given.
+        :returns: A list of overlaps, as from `overlap`, in the order of the
+        known groups.
+        """
+
+        if index is None:
+            index = self.index(known_groups)
+
+        shared = coll.defaultdict(set)
+        for member in group['members']:
+            for position in index.get(member['id'], ()):
+                shared[position].add(member['id'])
+
         parents = []
-        for known in known_groups:
-            overlap = self.overlap(group, known)
-            if overlap:
-                parents.append(overlap)
+        for position in sorted(shared):
+            parents.append({
+                'group': known_groups[position],
+                'intersection': shared[position],
+            })
         return parents
 
     def __call__(self, groups, parent_groups, handles):
         named = []
+        index = self.index(parent_groups)
         for group in groups:
-            parents = self.parents(group, parent_groups)
+            parents = self.parents(group, parent_groups, index=index)
             self.logger.info("Group with %i members", len(group['members']))
 
             # No overlaps means new group thus new name
@@ -2,8 +2,11 @@
 """
 
 import itertools as it
+import collections as coll
 
 from sqlalchemy.orm import aliased
+from sqlalchemy.sql.expression import case
+from sqlalchemy.sql.expression import func
 
 from pymotifs import core
 
@@ -269,6 +272,84 @@ class Structure(Base):
             return sorted(species_ids)
 
 
+class BasePairCounts(object):
+    """The number of basepairs between all pairs of chains in all models of a
+    structure. This is built from the grouped rows of
+    `BasePairQueries.counts` and answers the same counting questions as
+    `BasePairQueries.representative` and `BasePairQueries.cross_chain`
+    without going back to the database.
+
+    :rows: An iterable of (model, chain1, chain2, family, representative,
+    count) tuples. Representative is true if the pair is counted when
+    deduplicating symmetric basepairs.
+    """
+
+    def __init__(self, rows=()):
+        self._counts = coll.defaultdict(int)
+        self.models = set()
+        for model, chain1, chain2, family, representative, count in rows:
+            key = (model, chain1, chain2, family, bool(representative))
+            self._counts[key] += count
+            self.models.add(model)
+
+    def __total__(self, fn):
+        return sum(count for key, count in self._counts.items() if fn(*key))
+
+    def __families__(self, family):
+        if family is None:
+            return lambda f: True
+        if isinstance(family, list):
+            return lambda f: f in family
+        return lambda f: f == family
+
+    def __chains__(self, chain):
+        if chain is None:
+            return lambda c: True
+        if isinstance(chain, list):
+            return lambda c: c in chain
+        return lambda c: c == chain
+
+    def representative(self, chain, model=1, family=None):
+        """Count the forward interactions within a chain, this is the same as
+        `BasePairQueries.representative` with count=True.
+
+        :chain: The chain, list of chains or None for all chains.
+        :model: The model to count in.
+        :family: The family or list of families to limit to.
+        :returns: The number of basepairs.
+        """
+
+        in_chain = self.__chains__(chain)
+        in_family = self.__families__(family)
+
+        def fn(m, chain1, chain2, fam, representative):
+            return m == model and chain1 == chain2 and representative and \
+                in_chain(chain1) and in_family(fam)
+
+        return self.__total__(fn)
+
+    def cross_chain(self, chain, other_chain=None, model=1, family=None):
+        """Count the interactions from one chain to another, this is the same
+        as `BasePairQueries.cross_chain` with count=True.
+
+        :chain: The first chain, list of chains or None for all chains.
+        :other_chain: The second chain(s) if any.
+        :model: The model to count in.
+        :family: The family or list of families to limit to.
+        :returns: The number of basepairs.
+        """
+
+        in_chain = self.__chains__(chain)
+        in_other = self.__chains__(other_chain)
+        in_family = self.__families__(family)
+
+        def fn(m, chain1, chain2, fam, representative):
+            return m == model and chain1 != chain2 and in_chain(chain1) and \
+                in_other(chain2) and in_family(fam)
+
+        return self.__total__(fn)
+
+
 class BasePairQueries(Base):
     """This is a class to deal with getting information about basepairs from
     the database. We store some useful but complex queries in here as methods
@@ -362,6 +443,52 @@ class BasePairQueries(Base):
                 return query.count()
             return [result for result in query]
 
+    def counts(self, pdb, near=False, sym_op='1_555'):
+        """Count the basepairs between all pairs of chains in all models of a
+        structure with a single grouped query. The counts are split by chain,
+        model, family and if they are representative, so the result can answer
+        all questions `representative` and `cross_chain` can answer when
+        counting.
+
+        :pdb: The pdb id.
+        :near: Should we count nears.
+        :sym_op: The symmetry operator to count in.
+        :returns: A `BasePairCounts` with the counts.
+        """
+
+        u1 = aliased(mod.UnitInfo)
+        u2 = aliased(mod.UnitInfo)
+        bp = mod.BpFamilyInfo
+        inter = mod.UnitPairsInteractions
+        representative = case([((bp.is_symmetric == False) |
+                                 (u1.unit_id < u2.unit_id), 1)],
+                              else_=0)
+
+        with self.session() as session:
+            query = session.query(u1.model,
+                                  u1.chain.label('chain1'),
+                                  u2.chain.label('chain2'),
+                                  inter.f_lwbp,
+                                  representative.label('representative'),
+                                  func.count(1).label('count'),
+                                  ).\
+                select_from(inter).\
+                join(u1, u1.unit_id == inter.unit_id_1).\
+                join(u2, u2.unit_id == inter.unit_id_2).\
+                join(bp, bp.bp_family_id == inter.f_lwbp).\
+                filter(bp.is_forward == True).\
+                filter(inter.pdb_id == pdb).\
+                filter(u1.sym_op == u2.sym_op).\
+                filter(u1.model == u2.model).\
+                filter(u1.sym_op == sym_op).\
+                group_by(u1.model, u1.chain, u2.chain, inter.f_lwbp,
+                         representative)
+
+            if not near:
+                query = query.filter(bp.is_near == False)
+
+            return BasePairCounts(tuple(r) for r in query)
+
     def __base__(self, session, pdb, chain, symmetry=True, near=False,
                  family=None, model=1, sym_op='1_555'):
         """A method to build the base queries for this class.
@@ -1,7 +1,10 @@
 from Bio.Alphabet import ThreeLetterProtein
 
+from sqlalchemy import or_
+
 from pymotifs import core
 from pymotifs import models as mod
+from pymotifs.utils import grouper
 
 AA = [seq.upper() for seq in ThreeLetterProtein().letters]
 
@@ -26,29 +29,115 @@ def component_type(unit):
     return None
 
 
+def old_pdb(old_id):
+    """Get the PDB id of an old style unit id, like '2GDI_AU_1_X_20_U_'.
+    """
+    return old_id.split('_', 1)[0]
+
+
 class Translator(object):
+    """Translate old style unit ids to new style ones. Translations are kept
+    in memory, so each is only loaded once. When an id from a structure which
+    has not been seen is translated, all translations for that structure are
+    loaded, together with those of the other new structures, in queries of
+    `prefetch_size` structures. Structures can also be loaded ahead of time
+    with `preload`.
+    """
+
+    prefetch_size = 50
+    """Number of structures to load translations for in one query"""
+
+    chunk_size = 1000
+    """Number of unit ids to look up in one query"""
+
     def __init__(self, session):
         self.session = core.Session(session)
+        self.mapping = {}
+        self.loaded = set()
 
-    def translate(self, raw):
-        mapping = {}
+    def preload(self, pdbs):
+        """Load all translations for the given structures, skipping those that
+        have already been loaded.
+
+        :pdbs: The PDB ids to load.
+        :returns: The number of translations loaded.
+        """
+
+        pdbs = sorted(set(pdbs) - self.loaded)
         corr = mod._PdbUnitIdCorrespondence
-        with self.session() as session:
-            query = session.query(corr.unit_id, corr.old_id)
+        count = 0
+        for chunk in grouper(self.prefetch_size, pdbs):
+            with self.session() as session:
+                query = session.query(corr.unit_id, corr.old_id).\
+                    filter(or_(*[corr.old_id.like(pdb + '\\_%', escape='\\')
+                                 for pdb in chunk]))
+                for result in query:
+                    self.mapping[result.old_id] = result.unit_id
+                    count += 1
+            self.loaded.update(chunk)
+        return count
 
-            nt_ids = raw
-            if isinstance(raw, str):
-                nt_ids = raw.split(',')
+    def fetch(self, old_ids):
+        """Make sure the translations of all given ids are loaded. This loads
+        the structures of the ids first, and then looks up any id which is
+        still unknown directly.
 
-            query = query.filter(corr.old_id.in_(nt_ids))
+        :old_ids: The old style ids.
+        """
 
-            for result in query:
-                mapping[result.old_id] = result.unit_id
+        missing = set(old_ids) - set(self.mapping)
+        if not missing:
+            return
 
+        self.preload(old_pdb(old_id) for old_id in missing)
+        missing.difference_update(self.mapping)
+        corr = mod._PdbUnitIdCorrespondence
+        for chunk in grouper(self.chunk_size, sorted(missing)):
+            with self.session() as session:
+                query = session.query(corr.unit_id, corr.old_id).\
+                    filter(corr.old_id.in_(chunk))
+                for result in query:
+                    self.mapping[result.old_id] = result.unit_id
+
+    def translate(self, raw):
+        """Translate old style ids to new style ids.
+
+        :raw: A list of ids or a comma separated string of them.
+        :returns: A list of the new style ids, in the given order.
+        :raises TranslationFailed: If any id cannot be translated.
+        """
+
+        nt_ids = raw
+        if isinstance(raw, str):
+            nt_ids = raw.split(',')
+
+        self.fetch(nt_ids)
         units = []
         for nt_id in nt_ids:
-            if nt_id not in mapping:
+            if nt_id not in self.mapping:
                 raise TranslationFailed("Could not find %s" % nt_id)
-            units.append(mapping[nt_id])
+            units.append(self.mapping[nt_id])
 
         return units
+
+    def translate_many(self, raws):
+        """Translate many lists of old style ids, for example the units of
+        many loops, loading the translations of all of them at once.
+
+        :raws: A list where each entry is as given to `translate`.
+        :returns: A list of translated lists.
+        """
+
+        nt_ids = []
+        lists = []
+        for raw in raws:
+            if isinstance(raw, str):
+                raw = raw.split(',')
+            lists.append(raw)
+            nt_ids.extend(raw)
+
+        self.fetch(nt_ids)
+        return [self.translate(raw) for raw in lists]
+
+    def __call__(self, raw):
+        return self.translate(raw)
@@ -0,0 +1,62 @@
+import os
+import json
+import shutil
+import tempfile
+from unittest import TestCase
+
+from pymotifs.core.metrics import Recorder
+
+
+class RecorderTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'metrics.jsonl')
+        self.recorder = Recorder(self.filename)
+
+    def tearDown(self):
+        self.recorder.close()
+        shutil.rmtree(self.directory)
+
+    def records(self):
+        with open(self.filename, 'rb') as raw:
+            return [json.loads(line) for line in raw]
+
+    def test_records_rows_and_queries_for_an_entry(self):
+        with self.recorder.entry('units.info', '1GID'):
+            with self.recorder.timer('data'):
+                self.recorder.query(0.5)
+            self.recorder.rows(10)
+        record = self.records()[0]
+        assert record['stage'] == 'units.info'
+        assert record['entry'] == '1GID'
+        assert record['rows'] == 10
+        assert record['queries'] == 1
+        assert record['query_time'] == 0.5
+        assert 'data' in record['timings']
+
+    def test_ignores_measurements_outside_of_an_entry(self):
+        self.recorder.rows(10)
+        self.recorder.query(1.0)
+        with self.recorder.timer('data'):
+            pass
+        assert self.recorder.totals == {}
+
+    def test_sums_entries_in_stage_totals(self):
+        for pdb in ['1GID', '124D']:
+            with self.recorder.entry('units.info', pdb):
+                self.recorder.rows(3)
+        with self.recorder.entry('units.distances', '1GID'):
+            self.recorder.rows(1)
+        summary = dict((s['stage'], s) for s in self.recorder.summary())
+        assert summary['units.info']['entries'] == 2
+        assert summary['units.info']['rows'] == 6
+        assert summary['units.distances']['rows'] == 1
+
+    def test_records_entry_even_if_it_fails(self):
+        try:
+            with self.recorder.entry('units.info', '1GID'):
+                raise ValueError()
+        except ValueError:
+            pass
+        assert self.recorder.totals['units.info']['entries'] == 1
+        assert self.recorder.current is None
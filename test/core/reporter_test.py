@@ -0,0 +1,63 @@
+import types
+import logging
+
+from test import StageTest
+
+from pymotifs import core
+from pymotifs import models as mod
+from pymotifs.utils import row2dict
+
+
+class Reporter(core.Reporter):
+    headers = ['unit_id', 'chain']
+
+    def query(self, session):
+        return session.query(mod.UnitInfo.unit_id, mod.UnitInfo.chain).\
+            filter(mod.UnitInfo.pdb_id == '1GID').\
+            order_by(mod.UnitInfo.unit_id)
+
+    def data(self, entry, **kwargs):
+        with self.session() as session:
+            for row in self.stream(self.query(session), chunk_size=10):
+                yield row
+
+
+class StreamingTest(StageTest):
+    loader_class = Reporter
+
+    def expected(self):
+        with self.loader.session() as session:
+            return [row2dict(r) for r in self.loader.query(session)]
+
+    def test_it_produces_a_generator(self):
+        data = self.loader.data(('1GID',))
+        self.assertTrue(isinstance(data, types.GeneratorType))
+
+    def test_it_streams_all_rows_in_order(self):
+        val = list(self.loader.data(('1GID',)))
+        self.assertEquals(self.expected(), val)
+
+    def test_it_logs_progress(self):
+        messages = []
+
+        class Recorder(logging.Handler):
+            def emit(self, record):
+                messages.append(record.getMessage())
+
+        handler = Recorder()
+        self.loader.logger.addHandler(handler)
+        self.loader.logger.setLevel(logging.INFO)
+        self.loader.progress_every = 100
+        try:
+            with self.loader.session() as session:
+                query = self.loader.query(session)
+                total = sum(1 for _ in self.loader.stream(query))
+        finally:
+            self.loader.logger.removeHandler(handler)
+            self.loader.logger.setLevel(logging.NOTSET)
+
+        progress = ['Streamed %i rows' % count
+                    for count in range(100, total + 1, 100)]
+        self.assertTrue(progress)
+        self.assertEquals(progress + ['Streamed %i rows in total' % total],
+                          messages)
@@ -25,6 +25,21 @@ class HasDataTest(StageTest):
         self.assertFalse(self.loader.has_data('0GID'))
 
 
+class BulkMapperTest(StageTest):
+    loader_class = Simple
+
+    def test_it_finds_the_mapper_of_a_model_query(self):
+        with self.loader.session() as session:
+            query = self.loader.query(session, '1GID')
+            mapper = self.loader.bulk_mapper(query)
+        self.assertEquals(mod.UnitInfo.__table__, mapper.local_table)
+
+    def test_it_will_not_bulk_delete_from_a_column_query(self):
+        with self.loader.session() as session:
+            query = session.query(mod.UnitInfo.unit_id)
+            self.assertEquals(None, self.loader.bulk_mapper(query))
+
+
 class RemovingTest(StageTest):
     loader_class = Simple
 
@@ -70,9 +85,25 @@ class RemovingTest(StageTest):
         self.assertEquals(0, self.count())
 
     def test_it_can_handle_nothing_to_remove(self):
-        self.assertTrue(self.loader.remove('0000'))
+        self.assertEquals(0, self.loader.remove('0000'))
+
+    def test_it_reports_the_number_removed(self):
+        self.dummy(2500)
+        self.assertEquals(2500, self.loader.remove('0000'))
+        self.assertEquals(0, self.count())
+
+    def test_it_removes_rows_through_the_session_if_needed(self):
+        self.dummy(10)
+        self.loader.bulk_mapper = lambda query: None
+        self.assertEquals(10, self.loader.remove('0000'))
+        self.assertEquals(0, self.count())
 
     def test_it_does_nothing_given_dry_run(self):
         self.dummy(1)
         self.loader.remove('0000', dry_run=True)
         self.assertEquals(1, self.count())
+
+    def test_it_reports_the_number_it_would_remove_given_dry_run(self):
+        self.dummy(3)
+        self.assertEquals(3, self.loader.remove('0000', dry_run=True))
+        self.assertEquals(3, self.count())
@@ -0,0 +1,65 @@
+from test import StageTest
+
+from pymotifs.correspondence.interactions import Loader
+
+
+class MatchingTest(StageTest):
+    loader_class = Loader
+
+    def setUp(self):
+        super(MatchingTest, self).setUp()
+        self.first = [
+            (1, 'A|1|A|G|1', 'A|1|A|C|10'),
+            (2, 'A|1|A|C|10', 'A|1|A|G|1'),
+            (3, 'A|1|A|G|2', 'A|1|A|C|9'),
+            (4, 'A|1|A|G|2', 'A|1|B|U|5'),
+        ]
+        self.second = [
+            (11, 'B|1|X|G|1', 'B|1|X|C|10'),
+            (12, 'B|1|X|G|2', 'B|1|X|G|3'),
+            (13, 'B|1|X|C|10', 'B|1|X|G|1'),
+        ]
+        self.mapping = [
+            (7, 'A|1|A|G|1', 'B|1|X|G|1'),
+            (7, 'A|1|A|G|2', 'B|1|X|G|2'),
+            (7, 'A|1|A|C|9', 'B|1|X|C|9'),
+            (7, 'A|1|A|C|10', 'B|1|X|C|10'),
+        ]
+        self.index = self.loader.index(self.first)
+        self.encoded = self.loader.encode(self.first, self.index)
+
+    def matches(self):
+        compared = self.loader.compare(self.encoded, self.second,
+                                       self.mapping, self.index)
+        return [(d['interaction_id_1'], d['interaction_id_2'])
+                for d in compared]
+
+    def test_indexes_each_unit_once(self):
+        assert sorted(self.index.values()) == range(5)
+
+    def test_gives_unique_keys_to_ordered_pairs(self):
+        keys = [key for _, key, _, _ in self.encoded]
+        assert len(set(keys)) == len(keys)
+
+    def test_matches_interactions_through_the_mapping(self):
+        assert self.matches() == [(1, 11), (2, 13), (3, None), (4, None)]
+
+    def test_uses_correspondence_id_of_the_alignment(self):
+        compared = self.loader.compare(self.encoded, self.second,
+                                       self.mapping, self.index)
+        assert set(d['correspondence_id'] for d in compared) == set([7])
+
+    def test_skips_interactions_without_aligned_units(self):
+        self.mapping = self.mapping[:1]
+        assert self.matches() == [(1, None), (2, None)]
+
+    def test_ignores_partner_units_missing_from_query(self):
+        self.mapping.append((7, 'A|1|A|G|3', 'B|1|X|G|3'))
+        assert self.matches() == [(1, 11), (2, 13), (3, None), (4, None)]
+
+
+class PartnersTest(StageTest):
+    loader_class = Loader
+
+    def test_leaves_out_the_structure_itself(self):
+        assert self.loader.partners('1FCW') == ['4V42']
@@ -14,7 +14,7 @@ from pymotifs import download as down
 from pymotifs.chains import loader as chains
 from pymotifs.interactions import loader as interactions
 # from pymotifs.export import loader as export
-# from pymotifs import mat_files as mat
+from pymotifs import mat_files as mat
 from pymotifs.cli.introspect import UnknownStageError
 
 # from pymotifs.ife.info import Loader as IfeLoader
@@ -109,6 +109,16 @@ class DependenciesTest(ut.TestCase):
             interactions.SummaryLoader,
         ])
 
+    def test_it_uses_the_config_to_compute_dependencies(self):
+        config = dict(CONFIG)
+        config['interactions.flanking'] = {'backend': 'python'}
+        dispatcher = Dispatcher('units.info', config, Session)
+        val = dispatcher.dependencies([interactions.FlankingLoader])
+        assert mat.Loader not in val[interactions.FlankingLoader]
+
+        val = self.dispatcher.dependencies([interactions.FlankingLoader])
+        assert mat.Loader in val[interactions.FlankingLoader]
+
 
 class LevelsTest(ut.TestCase):
     def setUp(self):
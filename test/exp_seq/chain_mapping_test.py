@@ -36,3 +36,21 @@ class DataTest(StageTest):
         val = self.loader.data(cid)
         assert val.exp_seq_id == 40
         assert val.chain_id == cid
+
+
+class ResolvingTest(StageTest):
+    loader_class = Loader
+
+    def test_resolves_all_chains_at_once(self):
+        chain_ids = self.loader.to_process(['1GID', '1S72'])
+        resolved = self.loader.resolve(chain_ids)
+        assert sorted(resolved) == chain_ids
+        assert all(len(ids) == 1 for ids in resolved.values())
+
+    def test_resolves_like_each_chain(self):
+        chain_ids = self.loader.to_process(['1GID'])
+        resolved = self.loader.resolve(chain_ids)
+        assert resolved == dict((c, [40]) for c in chain_ids)
+
+    def test_gives_nothing_for_unknown_chains(self):
+        assert self.loader.resolve([-1]) == {-1: []}
@@ -66,3 +66,17 @@ class RealDataTest(StageTest):
             {'exp_seq_id': 1, 'unit': 'C', 'normalized_unit': 'C', 'index': 0},
             {'exp_seq_id': 1, 'unit': 'A', 'normalized_unit': 'A', 'index': 1},
         ]
+
+
+class BulkTest(StageTest):
+    loader_class = Loader
+
+    def test_loads_many_sequences(self):
+        assert self.loader.sequences([1, 40, -1])[1] == 'CA'
+        assert -1 not in self.loader.sequences([1, -1])
+
+    def test_knows_which_sequences_are_missing(self):
+        assert self.loader.missing([1, -1]) == [-1]
+
+    def test_counts_positions_in_dry_run(self):
+        assert self.loader.bulk([1], dry_run=True) == 2
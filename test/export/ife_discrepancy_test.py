@@ -0,0 +1,124 @@
+import os
+import gzip
+import shutil
+import resource
+import tempfile
+from unittest import TestCase
+
+from sqlalchemy import Table
+from sqlalchemy import Column
+from sqlalchemy import Float
+from sqlalchemy import String
+from sqlalchemy import MetaData
+from sqlalchemy import select
+
+from pymotifs import schema
+from pymotifs.export import ife_discrepancy as disc
+
+
+ROWS = [('1ABC|1|A', '2DEF|1|B', 0.5),
+        ('1ABC|1|A', '3GHI|1|C', 1.25),
+        ('2DEF|1|B', '3GHI|1|C', 0.0)]
+
+
+class TempTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+
+class WritingTest(TempTest):
+    def test_writes_tab_separated_lines(self):
+        filename = self.path('IFEdiscrepancy.txt')
+        assert disc.write(iter(ROWS), filename) == 3
+        with open(filename) as raw:
+            assert raw.readline() == '1ABC|1|A\t2DEF|1|B\t0.5\n'
+
+    def test_compresses_gz_files(self):
+        filename = self.path('IFEdiscrepancy.txt.gz')
+        disc.write(iter(ROWS), filename)
+        with gzip.open(filename) as raw:
+            assert len(raw.readlines()) == 3
+
+    def test_leaves_no_temporary_file(self):
+        disc.write(iter(ROWS), self.path('IFEdiscrepancy.txt'))
+        assert os.listdir(self.directory) == ['IFEdiscrepancy.txt']
+
+    def test_can_read_what_is_written(self):
+        for name in ['IFEdiscrepancy.txt', 'IFEdiscrepancy.txt.gz']:
+            disc.write(iter(ROWS), self.path(name))
+            assert list(disc.read(self.path(name))) == ROWS
+
+    def test_counts_no_rows(self):
+        assert disc.write(iter([]), self.path('IFEdiscrepancy.txt')) == 0
+
+
+class ShardingTest(TempTest):
+    def setUp(self):
+        super(ShardingTest, self).setUp()
+        rows = [('NR_1.5_00001.1',) + ROWS[0],
+                ('NR_1.5_00001.1',) + ROWS[1],
+                ('NR_1.5_00002.3',) + ROWS[2]]
+        self.count = disc.write_shards(iter(rows), self.path('classes'),
+                                       suffix='.txt.gz')
+
+    def test_writes_one_file_per_class(self):
+        assert sorted(os.listdir(self.path('classes'))) == [
+            'NR_1.5_00001.1.txt.gz',
+            'NR_1.5_00002.3.txt.gz',
+        ]
+
+    def test_writes_rows_of_each_class(self):
+        first = self.path('classes/NR_1.5_00001.1.txt.gz')
+        second = self.path('classes/NR_1.5_00002.3.txt.gz')
+        assert list(disc.read(first)) == ROWS[0:2]
+        assert list(disc.read(second)) == ROWS[2:]
+
+    def test_counts_all_rows(self):
+        assert self.count == 3
+
+
+class StreamingTest(TempTest):
+    size = 1000000
+
+    def setUp(self):
+        super(StreamingTest, self).setUp()
+        self.engine = schema.local_engine('sqlite:///' + self.path('db'))
+        metadata = MetaData()
+        self.table = Table('discrepancy', metadata,
+                           Column('ife1', String(30), primary_key=True),
+                           Column('ife2', String(30), primary_key=True),
+                           Column('discrepancy', Float))
+        metadata.create_all(self.engine)
+
+        def rows(start, stop):
+            for index in xrange(start, stop):
+                yield {'ife1': '%04d|1|A' % (index // 1000),
+                       'ife2': '%04d|1|B' % (index % 1000),
+                       'discrepancy': index / 1000.0}
+
+        with self.engine.begin() as conn:
+            for start in xrange(0, self.size, 100000):
+                conn.execute(self.table.insert(),
+                             list(rows(start, start + 100000)))
+
+    def test_memory_does_not_grow_with_rows(self):
+        query = select([self.table.c.ife1,
+                        self.table.c.ife2,
+                        self.table.c.discrepancy]).\
+            order_by(self.table.c.ife1, self.table.c.ife2)
+        conn = self.engine.connect().execution_options(stream_results=True)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        count = disc.write(conn.execute(query),
+                           self.path('IFEdiscrepancy.txt.gz'))
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        conn.close()
+
+        assert count == self.size
+        # ru_maxrss is in kilobytes, holding all rows would take over 100 MB
+        assert after - before < 20 * 1024
@@ -0,0 +1,43 @@
+from test import StageTest
+
+from pymotifs.export.pickle_na_backbone import Exporter
+
+
+class ToProcessTest(StageTest):
+    loader_class = Exporter
+
+    def test_groups_chains_by_pdb(self):
+        val = self.loader.to_process(['1GID'])
+        assert val == [('1GID', ((1, 'A'), (1, 'B')))]
+
+    def test_only_uses_given_pdbs(self):
+        val = self.loader.to_process(['1GID', '1FJG'])
+        assert [pdb for pdb, _ in val] == ['1FJG', '1GID']
+
+
+class DataTest(StageTest):
+    loader_class = Exporter
+
+    def setUp(self):
+        super(DataTest, self).setUp()
+        self.data = self.loader.data(('1GID', ((1, 'A'), (1, 'B'))))
+
+    def test_has_one_entry_per_chain_in_order(self):
+        assert [ichain for ichain, _ in self.data] == [
+            ('1GID', 1, 'A'),
+            ('1GID', 1, 'B'),
+        ]
+
+    def test_only_has_units_from_each_chain(self):
+        for (pdb, model, chain), (units, _, _, _) in self.data:
+            assert units
+            assert all(u.startswith('%s|%s|%s|' % (pdb, model, chain))
+                       for u in units)
+
+    def test_orders_units_by_position(self):
+        for _, (_, order, _, _) in self.data:
+            assert order == sorted(order)
+
+    def test_gives_empty_lists_for_unknown_chains(self):
+        val = self.loader.data(('1GID', ((1, 'Z'),)))
+        assert val == [(('1GID', 1, 'Z'), [[], [], [], []])]
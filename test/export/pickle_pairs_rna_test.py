@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+
+from test import StageTest
+
+from pymotifs import core
+from pymotifs.core import metrics
+from pymotifs.export.pickle_pairs_rna import Exporter
+
+
+class Skipping(Exporter):
+    def to_process(self, pdbs, **kwargs):
+        raise core.Skip("Nothing new")
+
+
+class Local(Exporter):
+    directory = None
+    current = {}
+
+    def filename(self, pdb, **kwargs):
+        return os.path.join(self.directory, pdb + '_RNA_pairs.pickle')
+
+    def manifest_filename(self):
+        return os.path.join(self.directory, self.manifest_name)
+
+    def fingerprints(self, pdbs):
+        return dict((pdb, self.current.get(pdb, 'a')) for pdb in pdbs)
+
+    def process(self, pdb, **kwargs):
+        with open(self.filename(pdb), 'wb') as out:
+            out.write(pdb)
+
+
+class SkippingTest(StageTest):
+    loader_class = Skipping
+
+    def test_skips_the_stage_if_to_process_skips(self):
+        self.assertEquals([], self.loader(['1GID']))
+
+
+class RebuildingTest(StageTest):
+    loader_class = Local
+
+    def setUp(self):
+        super(RebuildingTest, self).setUp()
+        self.loader.directory = tempfile.mkdtemp()
+        self.loader.current = {}
+        self.pdbs = ['1GID', '1FJG']
+
+    def tearDown(self):
+        shutil.rmtree(self.loader.directory)
+
+    def rebuild(self):
+        return sorted(self.loader.rebuild(self.pdbs, workers=1))
+
+    def test_builds_all_files_the_first_time(self):
+        assert self.rebuild() == ['1FJG', '1GID']
+        assert self.loader.manifest() == {'1GID': 'a', '1FJG': 'a'}
+
+    def test_does_not_rebuild_unchanged_files(self):
+        self.rebuild()
+        assert self.rebuild() == []
+
+    def test_rebuilds_files_whose_rows_changed(self):
+        self.rebuild()
+        self.loader.current = {'1GID': 'b'}
+        assert self.rebuild() == ['1GID']
+        assert self.loader.manifest()['1GID'] == 'b'
+
+    def test_rebuilds_missing_files(self):
+        self.rebuild()
+        os.remove(self.loader.filename('1FJG'))
+        assert self.rebuild() == ['1FJG']
+
+    def test_rebuilds_all_files_without_a_manifest(self):
+        self.rebuild()
+        os.remove(self.loader.manifest_filename())
+        assert self.rebuild() == ['1FJG', '1GID']
+
+    def test_rebuilds_all_files_given_a_corrupt_manifest(self):
+        self.rebuild()
+        with open(self.loader.manifest_filename(), 'wb') as out:
+            out.write('{"1GID": "a", ')
+        assert self.rebuild() == ['1FJG', '1GID']
+
+    def test_records_metrics_for_each_rebuilt_file(self):
+        totals = metrics.recorder.totals.get(self.loader.name, {})
+        before = totals.get('entries', 0)
+        self.rebuild()
+        totals = metrics.recorder.totals[self.loader.name]
+        assert totals['entries'] == before + 2
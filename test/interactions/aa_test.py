@@ -0,0 +1,69 @@
+import numpy as np
+
+from fr3d.cif.reader import Cif
+
+from test import StageTest
+from test import CifStageTest
+
+from pymotifs.interactions.aa import Loader
+
+
+class SpheresTest(StageTest):
+    loader_class = Loader
+
+    def test_centers_spheres_on_the_mean_of_atoms(self):
+        coords = [[[0, 0, 0], [2, 0, 0]], [[1, 1, 1]]]
+        centers, radii = self.loader.spheres(coords)
+        np.testing.assert_array_almost_equal(centers, [[1, 0, 0], [1, 1, 1]])
+        np.testing.assert_array_almost_equal(radii, [1, 0])
+
+
+class ReachableTest(StageTest):
+    loader_class = Loader
+
+    def group(self, centers, radii):
+        return np.array(centers, dtype=float), np.array(radii, dtype=float)
+
+    def test_finds_spheres_within_the_cutoff(self):
+        first = self.group([[0, 0, 0], [100, 0, 0]], [2, 2])
+        second = self.group([[15, 0, 0], [50, 0, 0]], [2, 2])
+        val = self.loader.reachable(first, second)
+        self.assertEquals((set([0]), set([0])), val)
+
+    def test_uses_the_radius_of_each_sphere(self):
+        first = self.group([[0, 0, 0]], [1])
+        second = self.group([[15, 0, 0], [-15, 0, 0]], [1, 5])
+        val = self.loader.reachable(first, second)
+        self.assertEquals((set([0]), set([1])), val)
+
+    def test_finds_nothing_in_an_empty_group(self):
+        first = self.group([[0, 0, 0]], [1])
+        second = (np.zeros((0, 3)), np.zeros(0))
+        self.assertEquals((set(), set()), self.loader.reachable(first, second))
+
+
+class ParityTest(CifStageTest):
+    loader_class = Loader
+    filename = 'test/files/cif/1A34.cif'
+
+    def structure_copy(self):
+        with open(self.filename, 'rb') as raw:
+            return Cif(raw).structure()
+
+    def test_only_keeps_some_residues(self):
+        structure = self.structure_copy()
+        val = self.loader.candidates(structure)
+        assert 0 < len(list(val.residues())) < \
+            len(list(structure.residues(polymeric=None)))
+
+    def test_gets_the_same_annotations_as_the_whole_structure(self):
+        structure = self.structure_copy()
+        structure.infer_hydrogens()
+        ans = self.loader.annotations(structure)
+
+        structure = self.loader.candidates(self.structure_copy())
+        structure.infer_hydrogens()
+        val = self.loader.annotations(structure)
+
+        assert ans
+        self.assertEquals(ans, val)
@@ -2,7 +2,10 @@ import pytest
 
 from test import StageTest
 
+from pymotifs import models as mod
+from pymotifs.mat_files import Loader as MatLoader
 from pymotifs.interactions.flanking import Loader
+from pymotifs.interactions.pairwise import Loader as InterLoader
 
 class ParsingACsvTest(StageTest):
     loader_class = Loader
@@ -31,4 +34,103 @@ class ParsingACsvTest(StageTest):
     def test_it_merges_entries(self):
         val = self.data[10]  # Not sure what index to use
         ans = {}
-        assert val == ans
\ No newline at end of file
+        assert val == ans
+
+def chain(sequence, chain='A', model=1, sym_op='1_555'):
+    return [('1ABC|%i|%s|%s|%i' % (model, chain, seq, index + 1),
+             model, chain, sym_op) for index, seq in enumerate(sequence)]
+
+
+def cww(units, *pairs):
+    found = []
+    for first, second in pairs:
+        found.append((units[first][0], units[second][0]))
+        found.append((units[second][0], units[first][0]))
+    return found
+
+
+class FlankingEngineTest(StageTest):
+    loader_class = Loader
+
+    def test_finds_pairs_closing_a_hairpin(self):
+        units = chain('GGCAAAAGCC')
+        pairs = cww(units, (0, 9), (1, 8), (2, 7))
+        val = self.loader.flanking(units, pairs)
+        ans = [(units[2][0], units[7][0])]
+        assert val == ans
+
+    def test_finds_pairs_around_an_internal_loop(self):
+        units = chain('GGAACCAGGAACCA')
+        pairs = cww(units, (0, 12), (1, 11), (4, 8), (5, 7))
+        val = self.loader.flanking(units, pairs)
+        ans = [
+            (units[1][0], units[4][0]),
+            (units[5][0], units[7][0]),
+            (units[8][0], units[11][0]),
+        ]
+        assert val == ans
+
+    def test_finds_adjacent_pairs_with_non_stacking_partners(self):
+        units = chain('GCAAGCAAAGCAAAGC')
+        pairs = cww(units, (0, 15), (1, 5), (4, 14))
+        val = self.loader.flanking(units, pairs)
+        assert (units[0][0], units[1][0]) in val
+        assert (units[4][0], units[5][0]) in val
+        assert (units[14][0], units[15][0]) in val
+
+    def test_does_not_flank_across_chains(self):
+        units = chain('GGA', chain='A') + chain('UCC', chain='B')
+        pairs = cww(units, (0, 5), (1, 4))
+        val = self.loader.flanking(units, pairs)
+        assert val == []
+
+    def test_ignores_pairs_with_unknown_units(self):
+        units = chain('GAAC')
+        pairs = cww(units, (0, 3)) + [(units[1][0], '1ABC|1|B|G|1')]
+        val = self.loader.flanking(units, pairs)
+        ans = [(units[0][0], units[3][0])]
+        assert val == ans
+
+    def test_has_nothing_without_units(self):
+        assert self.loader.flanking([], []) == []
+
+
+class ComparingToMatlabTest(StageTest):
+    loader_class = Loader
+
+    def stored(self, pdb):
+        with self.loader.session() as session:
+            query = session.query(mod.UnitPairsFlanking).\
+                filter_by(pdb_id=pdb).\
+                filter_by(flanking=1)
+            return sorted((r.unit_id_1, r.unit_id_2) for r in query)
+
+    def computed(self, pdb):
+        data = self.loader.python_data(pdb)
+        return sorted((d['unit_id_1'], d['unit_id_2']) for d in data)
+
+    def test_matches_stored_results_for_1GID(self):
+        val = set(self.computed('1GID'))
+        ans = set(self.stored('1GID'))
+        assert val == ans
+
+    def test_produces_pairs_in_chain_order_for_1GID(self):
+        position = dict((unit[0], index) for index, unit in
+                        enumerate(self.loader.units('1GID')))
+        pairs = self.computed('1GID')
+        assert pairs
+        for unit1, unit2 in pairs:
+            assert position[unit1] < position[unit2]
+
+
+class DependenciesTest(StageTest):
+    loader_class = Loader
+
+    def test_needs_matlab_files_by_default(self):
+        assert MatLoader in Loader.configured_dependencies({})
+
+    def test_does_not_need_matlab_files_with_python(self):
+        config = {'interactions.flanking': {'backend': 'python'}}
+        val = Loader.configured_dependencies(config)
+        assert MatLoader not in val
+        assert InterLoader in val
@@ -4,6 +4,8 @@ import collections as coll
 
 from test import StageTest
 
+from pymotifs import models as mod
+
 from pymotifs.interactions.summary import Loader
 
 
@@ -165,3 +167,85 @@ class DataTest(StageTest):
             'chain': 'DB'
         }
         assert val['4V4Q|1|BA|A|29']['total'] == 4
+
+
+class CaseSensitiveTest(StageTest):
+    loader_class = Loader
+
+    def setUp(self):
+        super(CaseSensitiveTest, self).setUp()
+        with self.loader.session() as session:
+            session.add(mod.PdbInfo(pdb_id='0000'))
+            for unit_id in ['0000|1|A|G|1', '0000|1|A|C|2', '0000|1|A|C|3']:
+                session.add(mod.UnitInfo(unit_id=unit_id, pdb_id='0000',
+                                         model=1, chain='A'))
+            for unit_id, family in [('0000|1|A|C|2', 'cSs'),
+                                    ('0000|1|A|C|3', 'csS')]:
+                session.add(mod.UnitPairsInteractions(unit_id_1='0000|1|A|G|1',
+                                                      unit_id_2=unit_id,
+                                                      pdb_id='0000',
+                                                      f_lwbp=family,
+                                                      f_crossing=0))
+
+    def tearDown(self):
+        with self.loader.session() as session:
+            session.query(mod.UnitPairsInteractions).\
+                filter_by(pdb_id='0000').\
+                delete(synchronize_session=False)
+            session.query(mod.UnitInfo).\
+                filter_by(pdb_id='0000').\
+                delete(synchronize_session=False)
+            session.query(mod.PdbInfo).\
+                filter_by(pdb_id='0000').\
+                delete(synchronize_session=False)
+
+    def test_counts_families_differing_by_case_separately(self):
+        val = dict((e['unit_id'], e) for e in self.loader.data('0000'))
+        assert val['0000|1|A|G|1']['cSs'] == 1
+        assert val['0000|1|A|G|1']['csS'] == 1
+        assert val['0000|1|A|G|1']['bps'] == 2
+
+
+class ParityTest(StageTest):
+    loader_class = Loader
+
+    def counted(self, pdb):
+        with self.loader.session() as session:
+            query = session.query(mod.UnitInfo.unit_id.label('unit_id_1'),
+                                  mod.UnitInfo.model,
+                                  mod.UnitInfo.chain,
+                                  mod.UnitInfo.pdb_id,
+                                  mod.UnitPairsInteractions.unit_id_2,
+                                  mod.UnitPairsInteractions.f_lwbp,
+                                  mod.UnitPairsInteractions.f_bphs,
+                                  mod.UnitPairsInteractions.f_stacks,
+                                  mod.UnitPairsInteractions.f_crossing,
+                                  ).\
+                outerjoin(mod.UnitPairsInteractions,
+                          mod.UnitInfo.unit_id == mod.UnitPairsInteractions.unit_id_1).\
+                filter(mod.UnitInfo.pdb_id == pdb)
+
+            data = coll.defaultdict(lambda: coll.defaultdict(int))
+            for result in query:
+                current = data[result.unit_id_1]
+                current['unit_id'] = result.unit_id_1
+                current['pdb_id'] = result.pdb_id
+                current['model'] = result.model
+                current['chain'] = result.chain
+                crossing = result.f_crossing
+                self.loader.increment_bp(current, result.f_lwbp, crossing)
+                self.loader.increment_stacks(current, result.f_stacks,
+                                             crossing)
+                self.loader.increment_bphs(current, result.unit_id_1,
+                                           result.unit_id_2, result.f_bphs,
+                                           crossing)
+            return dict((k, dict(v)) for k, v in data.items())
+
+    def data(self, pdb):
+        return dict((e['unit_id'], e) for e in self.loader.data(pdb))
+
+    def test_counts_like_python_for_1GID(self):
+        assert self.data('1GID') == self.counted('1GID')
+
+    def test_counts_like_python_for_4V4Q(self):
+        assert self.data('4V4Q') == self.counted('4V4Q')
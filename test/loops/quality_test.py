@@ -1,3 +1,6 @@
+import collections as coll
+from unittest import TestCase
+
 import pytest
 
 from pymotifs import core
@@ -5,6 +8,13 @@ from pymotifs import core
 from test import StageTest
 
 from pymotifs.loops.quality import Loader
+from pymotifs.loops.quality import PositionIndex
+from pymotifs.units.incomplete import Entry
+
+Row = coll.namedtuple('Row', ['unit_id', 'mapped_chain', 'index',
+                             'exp_seq_id', 'pdb_id', 'model', 'chain',
+                             'sym_op', 'number', 'unit', 'alt_id',
+                             'ins_code'])
 
 
 class Base(StageTest):
@@ -16,6 +26,75 @@ class Base(StageTest):
         self.fail("Could not find loop %s" % loop_id)
 
 
+class PositionIndexTest(TestCase):
+    def setUp(self):
+        def row(index, number, seq, alt_id=None, sym_op='1_555'):
+            unit_id = '1ABC|1|A|%s|%i' % (seq, number)
+            if alt_id:
+                unit_id += '||' + alt_id
+            if sym_op != '1_555':
+                unit_id += '||||' + sym_op
+            return Row(unit_id, 'A', index, 7, '1ABC', 1, 'A', sym_op,
+                       number, seq, alt_id, None)
+
+        self.positions = PositionIndex([
+            row(2, 2, 'C'),
+            row(0, 0, 'G'),
+            row(1, 1, 'A'),
+            row(3, 3, 'U', alt_id='A'),
+            row(3, 3, 'U', alt_id='B'),
+            row(1, 1, 'A', sym_op='2_555'),
+            Row(None, 'A', 5, 7, None, None, None, None, None, None, None,
+                None),
+            row(6, 6, 'G'),
+        ])
+
+    def test_can_find_a_position(self):
+        assert self.positions.position('1ABC|1|A|C|2') == {
+            'index': 2,
+            'exp_seq_id': 7,
+            'chain': 'A',
+            'model': 1,
+            'sym_op': '1_555',
+        }
+
+    def test_uses_an_alternate_for_a_unit_without_alt_id(self):
+        assert self.positions.position('1ABC|1|A|U|3')['index'] == 3
+        assert '1ABC|1|A|U|3' not in self.positions
+
+    def test_does_not_use_a_different_number_as_alternate(self):
+        assert self.positions.position('1ABC|1|A|U|33') is None
+
+    def test_gives_none_for_unknown_unit(self):
+        assert self.positions.position('1ABC|1|B|C|2') is None
+
+    def test_finds_distinct_units_between_in_order(self):
+        start = self.positions.position('1ABC|1|A|A|1')
+        stop = self.positions.position('1ABC|1|A|U|3')
+        assert self.positions.between(start, stop) == [
+            Entry('1ABC', 1, 'A', 1, 'A', None, None),
+            Entry('1ABC', 1, 'A', 2, 'C', None, None),
+            Entry('1ABC', 1, 'A', 3, 'U', 'A', None),
+            Entry('1ABC', 1, 'A', 3, 'U', 'B', None),
+        ]
+
+    def test_finds_units_between_with_same_symmetry(self):
+        start = self.positions.position('1ABC|1|A|A|1||||2_555')
+        assert self.positions.between(start, start) == [
+            Entry('1ABC', 1, 'A', 1, 'A', None, None),
+        ]
+
+    def test_knows_if_no_positions_are_missing(self):
+        start = self.positions.position('1ABC|1|A|G|0')
+        stop = self.positions.position('1ABC|1|A|U|3||A')
+        assert self.positions.has_missing(start, stop) is False
+
+    def test_knows_if_positions_are_missing(self):
+        start = self.positions.position('1ABC|1|A|C|2')
+        stop = self.positions.position('1ABC|1|A|G|6')
+        assert self.positions.has_missing(start, stop) is True
+
+
 class QueryingTest(Base):
     loader_class = Loader
 
@@ -0,0 +1,114 @@
+import os
+import glob
+import pickle
+import shutil
+import tempfile
+from unittest import TestCase
+
+from sqlalchemy import Table
+from sqlalchemy import create_engine
+
+from pymotifs import models as mod
+
+
+class SchemaFingerprintTest(TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        self.engine.execute('create table unit_info (unit_id varchar(30) '
+                            'primary key, pdb_id varchar(4))')
+
+    def test_is_stable(self):
+        assert mod.schema_fingerprint(self.engine) == \
+            mod.schema_fingerprint(self.engine)
+
+    def test_changes_with_a_new_column(self):
+        before = mod.schema_fingerprint(self.engine)
+        self.engine.execute('alter table unit_info add column chain text')
+        assert mod.schema_fingerprint(self.engine) != before
+
+    def test_changes_with_a_new_table(self):
+        before = mod.schema_fingerprint(self.engine)
+        self.engine.execute('create table unit_centers (id integer)')
+        assert mod.schema_fingerprint(self.engine) != before
+
+    def test_cache_file_is_keyed_by_fingerprint(self):
+        val = mod.cache_filename('cache', 'abc')
+        assert val == 'cache/models-abc.pickle'
+
+
+class ReflectionTest(TestCase):
+    """Base for tests which reflect a SQLite database into the models. The
+    state of the models module is restored afterwards so other tests still
+    see their own database.
+    """
+
+    def setUp(self):
+        self.module = mod.__dict__['_module']
+        self.globals = dict(vars(self.module))
+        self.tables = set(mod.metadata.tables)
+        self.bind = mod.metadata.bind
+        self.lazy = dict(mod._lazy)
+        self.cache = tempfile.mkdtemp()
+        self.engine = create_engine('sqlite://')
+        self.engine.execute('create table models_test_units (unit_id '
+                            'varchar(30) primary key, pdb_id varchar(4))')
+
+    def tearDown(self):
+        for name in set(mod.metadata.tables) - self.tables:
+            mod.metadata.remove(mod.metadata.tables[name])
+        for name in set(vars(self.module)) - set(self.globals):
+            delattr(self.module, name)
+        for name, value in self.globals.items():
+            setattr(self.module, name, value)
+        mod.metadata.bind = self.bind
+        mod._lazy.update(self.lazy)
+        shutil.rmtree(self.cache)
+
+    def forget(self):
+        mod.metadata.remove(mod.metadata.tables['models_test_units'])
+        vars(self.module).pop('ModelsTestUnits', None)
+
+    def columns(self):
+        table = mod.metadata.tables['models_test_units']
+        return sorted(c.name for c in table.columns)
+
+
+class CacheTest(ReflectionTest):
+    def test_can_load_saved_metadata(self):
+        Table('models_test_units', mod.metadata, autoload=True,
+              autoload_with=self.engine)
+        filename = os.path.join(self.cache, 'models-abc.pickle')
+        mod.save_cache(filename)
+        self.forget()
+        mod.load_cache(filename)
+        assert self.columns() == ['pdb_id', 'unit_id']
+        assert mod.ModelsTestUnits.__table__.name == 'models_test_units'
+
+    def test_reflects_again_when_the_schema_changes(self):
+        mod.reflect(self.engine, cache=self.cache)
+        old = glob.glob(os.path.join(self.cache, 'models-*.pickle'))
+        self.forget()
+        self.engine.execute('alter table models_test_units add column '
+                            'chain text')
+        mod.reflect(self.engine, cache=self.cache)
+        new = glob.glob(os.path.join(self.cache, 'models-*.pickle'))
+        assert len(old) == 1
+        assert len(new) == 1
+        assert old != new
+        assert self.columns() == ['chain', 'pdb_id', 'unit_id']
+        with open(new[0], 'rb') as raw:
+            cached = pickle.load(raw)
+        table = cached.tables['models_test_units']
+        assert 'chain' in table.columns
+
+
+class LazyTest(ReflectionTest):
+    def test_reflects_a_table_on_first_access(self):
+        mod.reflect(self.engine, lazy=True)
+        assert 'models_test_units' not in mod.metadata.tables
+        assert mod.ModelsTestUnits.__table__.name == 'models_test_units'
+        assert self.columns() == ['pdb_id', 'unit_id']
+
+    def test_complains_about_unknown_tables(self):
+        mod.reflect(self.engine, lazy=True)
+        self.assertRaises(AttributeError, getattr, mod, 'ModelsTestMissing')
@@ -0,0 +1,141 @@
+import os
+import json
+import shutil
+import tempfile
+
+import numpy as np
+
+from test import StageTest
+
+from pymotifs.motifs import search
+from pymotifs.motifs.search import AllAgainstAll as Loader
+
+
+def load_fixture():
+    with open('test/files/motifs/search-loops.json', 'rb') as raw:
+        data = json.load(raw)
+    loops = []
+    for loop in data['loops']:
+        loops.append(search.Loop(loop_id=loop['loop_id'],
+                                 centers=np.array(loop['centers']),
+                                 rotations=np.array(loop['rotations']),
+                                 edges=np.array(loop['edges'])))
+    return loops, np.array(data['matrix'])
+
+
+class EdgeCodeTest(StageTest):
+    loader_class = Loader
+
+    def test_numbers_basepair_families(self):
+        self.assertEquals(1, search.edge_code('cWW', None))
+        self.assertEquals(10, search.edge_code('tHS', 's35'))
+
+    def test_gives_reversed_families_negative_codes(self):
+        self.assertEquals(-10, search.edge_code('tSH', None))
+
+    def test_uses_stacks_if_there_is_no_pair(self):
+        self.assertEquals(search.STACK, search.edge_code('ncWW', 's35'))
+
+    def test_ignores_near_interactions(self):
+        self.assertEquals(0, search.edge_code('ncWW', 'ns35'))
+
+
+class ComparingInteractionsTest(StageTest):
+    loader_class = Loader
+
+    def edges(self, **pairs):
+        edges = np.zeros((4, 4), dtype=int)
+        for key, value in pairs.items():
+            edges[int(key[1]), int(key[2])] = value
+        return edges
+
+    def test_matches_the_same_interactions(self):
+        edges = self.edges(e03=1, e12=10)
+        val = search.compare_interactions(edges, edges.copy())
+        self.assertEquals(search.MATCH, val)
+
+    def test_allows_reversed_symmetric_pairs(self):
+        val = search.compare_interactions(self.edges(e03=1),
+                                          self.edges(e03=-1))
+        self.assertEquals(search.MATCH, val)
+
+    def test_disqualifies_reversed_asymmetric_pairs(self):
+        val = search.compare_interactions(self.edges(e12=10),
+                                          self.edges(e12=-10))
+        self.assertEquals(search.BASEPAIR_MISMATCH, val)
+
+    def test_disqualifies_a_pair_matching_a_stack(self):
+        val = search.compare_interactions(self.edges(e12=3),
+                                          self.edges(e12=search.STACK))
+        self.assertEquals(search.BASESTACK_MISMATCH, val)
+
+    def test_reports_the_first_conflict(self):
+        val = search.compare_interactions(self.edges(e01=3, e23=1),
+                                          self.edges(e01=21, e23=2))
+        self.assertEquals(search.BASESTACK_MISMATCH, val)
+
+
+class TilingTest(StageTest):
+    loader_class = Loader
+
+    def test_covers_the_upper_triangle(self):
+        val = self.loader.tiles(5, 2)
+        ans = [(0, 0), (0, 2), (0, 4), (2, 2), (2, 4), (4, 4)]
+        self.assertEquals(ans, val)
+
+
+class AllAgainstAllTest(StageTest):
+    loader_class = Loader
+
+    def setUp(self):
+        super(AllAgainstAllTest, self).setUp()
+        self.loops, self.matrix = load_fixture()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_reproduces_the_reference_matrix(self):
+        val = self.loader(self.loops, self.directory, workers=2, chunk_size=3)
+        np.testing.assert_array_equal(self.matrix, val)
+
+    def test_does_not_depend_on_the_tile_size(self):
+        val = self.loader(self.loops, self.directory, workers=1,
+                          chunk_size=100)
+        np.testing.assert_array_equal(self.matrix, val)
+
+    def test_resumes_from_checkpoints(self):
+        self.loader(self.loops, self.directory, workers=2, chunk_size=3)
+        os.remove(self.loader.checkpoint(self.directory, 3, 6))
+        marker = np.full((3, 3), 9, dtype=np.int8)
+        self.loader.save_tile(self.directory, 0, 0, marker)
+        val = self.loader(self.loops, self.directory, workers=2, chunk_size=3)
+        self.assertTrue(os.path.exists(
+            self.loader.checkpoint(self.directory, 3, 6)))
+        self.assertEquals(9, val[0, 1])
+        np.testing.assert_array_equal(self.matrix[3:6, 6:], val[3:6, 6:])
+
+    def test_discards_checkpoints_for_other_loops(self):
+        self.loader(self.loops, self.directory, workers=2, chunk_size=3)
+        val = self.loader(self.loops[::-1], self.directory, workers=2,
+                          chunk_size=3)
+        np.testing.assert_array_equal(self.matrix[::-1, ::-1], val)
+
+    def test_discards_checkpoints_for_another_cutoff(self):
+        self.loader(self.loops, self.directory, workers=2, chunk_size=3)
+        marker = np.full((3, 3), 9, dtype=np.int8)
+        self.loader.save_tile(self.directory, 0, 0, marker)
+        self.loader.config[self.loader.name] = {'cutoff': 0.5}
+        self.loader(self.loops, self.directory, workers=2, chunk_size=3)
+        codes = np.load(self.loader.checkpoint(self.directory, 0, 0))
+        self.assertFalse((codes == 9).any())
+
+    def test_discards_checkpoints_for_changed_loops(self):
+        self.loader(self.loops, self.directory, workers=2, chunk_size=3)
+        marker = np.full((3, 3), 9, dtype=np.int8)
+        self.loader.save_tile(self.directory, 0, 0, marker)
+        loops = list(self.loops)
+        loops[0] = loops[0]._replace(centers=loops[0].centers + 1.0)
+        self.loader(loops, self.directory, workers=2, chunk_size=3)
+        codes = np.load(self.loader.checkpoint(self.directory, 0, 0))
+        self.assertFalse((codes == 9).any())
@@ -80,6 +80,21 @@ class FilteringTest(StageTest):
         filtered = self.loader.within_cutoff(self.data, '0.5')
         assert filtered == {}
 
+    def test_does_not_modify_the_given_group(self):
+        self.loader.within_cutoff(self.data, '4.0')
+        assert 'rank' not in self.data['members'][0]
+
+    def test_gives_each_cutoff_its_own_names_and_members(self):
+        self.data['name'] = {'handle': '00001', 'version': 1}
+        groups = self.loader.filter_groups([self.data], ['2.0', '4.0'])
+        assert [g['name']['full'] for g in groups] == [
+            'NR_2.0_00001.1',
+            'NR_4.0_00001.1',
+        ]
+        assert groups[0]['members'][0]['rank'] == 0
+        assert groups[1]['members'][1]['rank'] == 1
+        assert self.data['name'] == {'handle': '00001', 'version': 1}
+
 
 class NamingTest(StageTest):
     loader_class = Builder
@@ -58,6 +58,35 @@ class DataTest(StageTest):
         # assert self.loader.compscore(self.data('4V7M|32|DB')) == 127
 
 
+class PrecomputedCountsTest(StageTest):
+    loader_class = CompScore
+
+    def test_precomputed_counts_give_the_same_percent_clash(self):
+        info = self.loader.member_info({'id': '1S72|1|0'})
+        counted = self.loader.percent_clash(dict(info))
+        self.loader.precomputed_counts([info])
+        assert 'heavy_atoms' in info
+        assert 'clashes' in info
+        assert self.loader.percent_clash(info) == counted
+
+    def test_counts_chains_without_precomputed_counts(self):
+        info = self.loader.member_info({'id': '1S72|1|0'})
+        counted = self.loader.count_atoms(dict(info))
+        self.loader.precomputed_counts([info])
+        info['heavy_atoms'] = 0
+        info['uncounted_chains'] = list(info['chains'])
+        assert self.loader.count_atoms(info) == counted
+
+    def test_counts_everything_without_the_count_tables(self):
+        info = self.loader.member_info({'id': '1S72|1|0'})
+        counted = self.loader.percent_clash(dict(info))
+        self.loader.has_table = lambda model: False
+        self.loader.precomputed_counts([info])
+        assert 'heavy_atoms' not in info
+        assert 'clashes' not in info
+        assert self.loader.percent_clash(info) == counted
+
+
 class SelectingRepresentativeTest(StageTest):
     loader_class = CompScore
 
@@ -0,0 +1,16 @@
+from test import StageTest
+
+from pymotifs.quality.clash_counts import Loader
+
+
+class DataTest(StageTest):
+    loader_class = Loader
+
+    def test_counts_clashes_per_pair_of_chains(self):
+        data = self.loader.data('1S72')
+        keys = [(d.model, d.sym_op, d.chain_1, d.chain_2) for d in data]
+        assert len(keys) == len(set(keys))
+        assert all(d.clashes > 0 for d in data)
+
+    def test_it_knows_if_has_no_data(self):
+        assert self.loader.has_data('0S72') is False
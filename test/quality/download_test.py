@@ -1,5 +1,10 @@
 import os
+import copy
+import shutil
+import tempfile
 
+from test import CONFIG
+from test import Session
 from test import StageTest
 
 from pymotifs.quality.download import Loader
@@ -40,3 +45,97 @@ class DownloaderTest(StageTest):
         assert os.path.exists(self.loader.filename('1FJG')) is False
         self.loader(['1FJG'])
         assert os.path.exists(self.loader.filename('1FJG')) is True
+
+
+class MirrorTest(StageTest):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.mirror = os.path.join(self.directory, 'mirror')
+        self.reports = os.path.join(self.directory, 'reports')
+        config = copy.deepcopy(CONFIG)
+        config['locations']['quality_reports'] = self.reports
+        config.setdefault('quality.download', {})['mirror'] = self.mirror
+        config['quality.download']['workers'] = 2
+        self.loader = Loader(config, Session)
+        self.loader.mark = False
+        self.publish('1FJG', 'first')
+        self.publish('1S72', 'second')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def publish(self, pdb, content, mtime=1000000000):
+        path = os.path.join(self.mirror, self.loader.remote(pdb))
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as out:
+            out.write(content)
+        os.utime(path, (mtime, mtime))
+
+    def stored(self, pdb):
+        with open(self.loader.filename(pdb), 'rb') as raw:
+            return raw.read()
+
+    def test_fetches_all_missing_reports(self):
+        fetched = self.loader(['1FJG', '1S72'])
+        assert sorted(fetched) == ['1FJG', '1S72']
+        assert self.stored('1FJG') == 'first'
+        assert self.stored('1S72') == 'second'
+
+    def test_stored_report_keeps_remote_modification_time(self):
+        self.loader(['1FJG'])
+        assert int(os.stat(self.loader.filename('1FJG')).st_mtime) == \
+            1000000000
+        assert self.loader.is_current('1FJG') is True
+
+    def test_does_not_fetch_current_reports(self):
+        self.loader(['1FJG'])
+        assert self.loader(['1FJG'], recalculate=True) == []
+
+    def test_refetches_changed_reports_when_recomputing(self):
+        self.loader(['1FJG', '1S72'])
+        self.publish('1FJG', 'updated', mtime=1100000000)
+        assert self.loader.is_current('1FJG') is False
+        assert self.loader(['1FJG', '1S72'], recalculate=True) == ['1FJG']
+        assert self.stored('1FJG') == 'updated'
+
+    def test_asks_the_source_once_per_report_when_recomputing(self):
+        self.loader(['1FJG', '1S72'])
+        self.publish('1FJG', 'updated', mtime=1100000000)
+        stat = self.loader.source.stat
+        asked = []
+
+        def counting(path):
+            asked.append(path)
+            return stat(path)
+
+        self.loader.source.stat = counting
+        assert self.loader(['1FJG', '1S72'], recalculate=True) == ['1FJG']
+        assert sorted(asked) == sorted([self.loader.remote('1FJG'),
+                                        self.loader.remote('1S72')])
+
+    def test_does_not_refetch_changed_reports_otherwise(self):
+        self.loader(['1FJG'])
+        self.publish('1FJG', 'updated', mtime=1100000000)
+        assert self.loader(['1FJG']) == []
+        assert self.stored('1FJG') == 'first'
+
+    def test_stores_an_empty_file_for_missing_reports(self):
+        assert sorted(self.loader(['0FJG', '1FJG'])) == ['0FJG', '1FJG']
+        assert os.path.getsize(self.loader.filename('0FJG')) == 0
+        assert self.loader.has_data('0FJG') is True
+
+    def test_does_not_check_missing_reports_again(self):
+        self.loader(['0FJG'])
+        self.loader._source = None
+        assert self.loader(['0FJG']) == []
+
+    def test_fetches_reports_published_after_a_missing_one(self):
+        self.loader(['0FJG'])
+        self.publish('0FJG', 'late')
+        assert self.loader(['0FJG'], recalculate=True) == ['0FJG']
+        assert self.stored('0FJG') == 'late'
+
+    def test_gives_empty_string_for_missing(self):
+        assert self.loader.data('0FJG') == ''
+        assert self.loader.data('1FJG') == 'first'
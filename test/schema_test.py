@@ -0,0 +1,92 @@
+import os
+import json
+import shutil
+import tempfile
+import datetime as dt
+from unittest import TestCase
+
+from sqlalchemy import Table
+from sqlalchemy import Column
+from sqlalchemy import Float
+from sqlalchemy import String
+from sqlalchemy import Integer
+from sqlalchemy import DateTime
+from sqlalchemy import MetaData
+
+from pymotifs import schema
+
+
+class SnapshotTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.engine = schema.local_engine('sqlite://')
+        metadata = MetaData()
+        Table('pdb_analysis_status', metadata,
+              Column('pdb_id', String(4), primary_key=True),
+              Column('stage', String(100), primary_key=True),
+              Column('time', DateTime))
+        Table('unit_centers', metadata,
+              Column('unit_centers_id', Integer, primary_key=True),
+              Column('unit_id', String(30), nullable=False),
+              Column('pdb_id', String(4)),
+              Column('x', Float))
+        metadata.create_all(self.engine)
+        self.engine.execute(metadata.tables['pdb_analysis_status'].insert(),
+                            [{'pdb_id': '1GID', 'stage': 'units.info',
+                              'time': dt.datetime(2016, 1, 2, 3, 4, 5)},
+                             {'pdb_id': '124D', 'stage': 'units.info',
+                              'time': None}])
+        self.engine.execute(metadata.tables['unit_centers'].insert(),
+                            [{'unit_id': '1GID|1|A|G|1', 'pdb_id': '1GID',
+                              'x': 1.5}])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_records_all_tables(self):
+        data = schema.snapshot(self.engine)
+        assert sorted(data['tables']) == ['pdb_analysis_status',
+                                          'unit_centers']
+
+    def test_records_columns(self):
+        data = schema.snapshot(self.engine)
+        columns = data['tables']['unit_centers']['columns']
+        assert columns[1] == {
+            'name': 'unit_id',
+            'type': 'String',
+            'length': 30,
+            'nullable': False,
+            'primary_key': False,
+        }
+
+    def test_can_build_an_equivalent_database(self):
+        filename = os.path.join(self.directory, 'schema.json')
+        schema.save_snapshot(self.engine, filename)
+        engine = schema.build('sqlite://', filename)
+        assert schema.snapshot(engine) == schema.snapshot(self.engine)
+
+    def test_can_load_dumped_rows(self):
+        snapshot = os.path.join(self.directory, 'schema.json')
+        dump = os.path.join(self.directory, 'dump.json')
+        schema.save_snapshot(self.engine, snapshot)
+        schema.dump(self.engine, ['1GID'], dump)
+        engine = schema.build('sqlite://', snapshot, fixtures=dump)
+        rows = engine.execute('select pdb_id, time from pdb_analysis_status')
+        assert [tuple(r) for r in rows] == \
+            [('1GID', '2016-01-02 03:04:05.000000')]
+
+    def test_creates_missing_declared_tables(self):
+        assert schema.create_declared(self.engine) == schema.DECLARED
+        assert set(schema.DECLARED) <= set(self.engine.table_names())
+
+    def test_does_not_create_existing_declared_tables(self):
+        schema.create_declared(self.engine)
+        assert schema.create_declared(self.engine) == []
+
+    def test_only_dumps_requested_pdbs(self):
+        dump = os.path.join(self.directory, 'dump.json')
+        schema.dump(self.engine, ['124D'], dump)
+        with open(dump, 'rb') as raw:
+            rows = json.load(raw)
+        assert rows['unit_centers'] == []
+        assert len(rows['pdb_analysis_status']) == 1
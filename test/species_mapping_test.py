@@ -3,6 +3,7 @@ from unittest import TestCase
 from test import StageTest
 
 from pymotifs.species_mapping import Parser
+from pymotifs.species_mapping import Taxonomy
 from pymotifs.species_mapping import Loader
 
 
@@ -41,6 +42,50 @@ class ParsingTest(TestCase):
         assert val == ans
 
 
+class TaxonomyTest(TestCase):
+    def setUp(self):
+        self.taxonomy = Taxonomy.load('test/files/species-mapping/taxdump')
+
+    def test_can_get_correct_data_given_species(self):
+        val = self.taxonomy(562)
+        ans = {
+            'species_mapping_id': 562,
+            'species_id': 562,
+            'species_name': 'Escherichia coli'
+        }
+        assert val == ans
+
+    def test_can_get_correct_data_given_subspecies(self):
+        val = self.taxonomy(656435)
+        ans = {
+            'species_mapping_id': 656435,
+            'species_id': 562,
+            'species_name': 'Escherichia coli'
+        }
+        assert val == ans
+
+    def test_can_get_correct_data_given_genus(self):
+        val = self.taxonomy(4930)
+        ans = {
+            'species_mapping_id': 4930,
+            'species_id': None,
+            'species_name': None
+        }
+        assert val == ans
+
+    def test_follows_several_levels_below_species(self):
+        val = self.taxonomy.get_species(511145)
+        assert val == (562, 'Escherichia coli')
+
+    def test_knows_which_ids_it_has(self):
+        assert 559292 in self.taxonomy
+        assert 3 not in self.taxonomy
+        assert 10000000 not in self.taxonomy
+
+    def test_fails_for_unknown_ids(self):
+        self.assertRaises(KeyError, self.taxonomy, 9606)
+
+
 class SpeciesMappingTest(StageTest):
     loader_class = Loader
 
@@ -0,0 +1,153 @@
+import os
+import gzip
+import json
+import pickle
+import shutil
+import tempfile
+from unittest import TestCase
+
+from sqlalchemy import Table
+from sqlalchemy import Column
+from sqlalchemy import Float
+from sqlalchemy import String
+from sqlalchemy import Integer
+from sqlalchemy import MetaData
+
+from pymotifs import models as mod
+from pymotifs import schema
+from pymotifs.transfer import chain_chain as cc
+
+
+def database(chain_offset, comparisons):
+    """Create a SQLite database with the tables used in transfers. Chain ids
+    are shifted by chain_offset, so they differ between databases.
+    """
+
+    engine = schema.local_engine('sqlite://')
+    metadata = MetaData()
+    Table('chain_info', metadata,
+          Column('chain_id', Integer, primary_key=True),
+          Column('pdb_id', String(4)),
+          Column('chain_name', String(4)))
+    Table('correspondence_pdbs', metadata,
+          Column('correspondence_id', Integer, primary_key=True),
+          Column('pdb_id_1', String(4)),
+          Column('pdb_id_2', String(4)),
+          Column('chain_name_1', String(4)),
+          Column('chain_name_2', String(4)),
+          Column('chain_id_1', Integer, primary_key=True),
+          Column('chain_id_2', Integer, primary_key=True))
+    Table('chain_chain_similarity', metadata,
+          Column('chain_chain_similarity_id', Integer, primary_key=True),
+          Column('chain_id_1', Integer),
+          Column('chain_id_2', Integer),
+          Column('model_1', Integer),
+          Column('model_2', Integer),
+          Column('correspondence_id', Integer),
+          Column('discrepancy', Float),
+          Column('num_nucleotides', Integer))
+    metadata.create_all(engine)
+
+    chains = [('%04d' % (index // 2), 'AB'[index % 2]) for index in range(40)]
+    ids = dict((chain, index + chain_offset)
+               for index, chain in enumerate(chains))
+    engine.execute(metadata.tables['chain_info'].insert(),
+                   [{'chain_id': ids[c], 'pdb_id': c[0], 'chain_name': c[1]}
+                    for c in chains])
+
+    pairs = [(c1, c2) for c1 in chains for c2 in chains if c1 != c2]
+    engine.execute(metadata.tables['correspondence_pdbs'].insert(),
+                   [{'correspondence_id': 1000 + index + chain_offset,
+                     'pdb_id_1': c1[0], 'chain_name_1': c1[1],
+                     'pdb_id_2': c2[0], 'chain_name_2': c2[1],
+                     'chain_id_1': ids[c1], 'chain_id_2': ids[c2]}
+                    for index, (c1, c2) in enumerate(pairs)])
+
+    rows = []
+    for index, (c1, c2) in enumerate(pairs[:comparisons]):
+        rows.append({'chain_id_1': ids[c1], 'chain_id_2': ids[c2],
+                     'model_1': 1, 'model_2': 1 + index % 2,
+                     'correspondence_id': 1000 + index + chain_offset,
+                     'discrepancy': index / 7.0,
+                     'num_nucleotides': index})
+    if rows:
+        engine.execute(metadata.tables['chain_chain_similarity'].insert(),
+                       rows)
+    return engine
+
+
+def comparisons(engine):
+    query = ("SELECT c1.pdb_id, c1.chain_name, c2.pdb_id, c2.chain_name, "
+             "s.model_1, s.model_2, s.discrepancy, s.num_nucleotides, "
+             "s.correspondence_id - c1.chain_id "
+             "FROM chain_chain_similarity s "
+             "JOIN chain_info c1 ON c1.chain_id = s.chain_id_1 "
+             "JOIN chain_info c2 ON c2.chain_id = s.chain_id_2")
+    return sorted(tuple(row) for row in engine.execute(query))
+
+
+class RoundTripTest(TestCase):
+    def setUp(self):
+        self.bind = mod.metadata.bind
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'cc.gz')
+        self.source = database(0, 250)
+        self.target = database(500, 0)
+
+    def tearDown(self):
+        mod.metadata.bind = self.bind
+        shutil.rmtree(self.directory)
+
+    def test_writes_a_versioned_header(self):
+        cc.dump(self.filename, engine=self.source, chunk_size=100)
+        with gzip.open(self.filename, 'rb') as raw:
+            header = json.loads(raw.readline())
+        assert header['format'] == 'chain-chain'
+        assert header['version'] == cc.VERSION
+        assert header['columns'] == cc.COLUMNS
+
+    def test_writes_bounded_chunks(self):
+        assert cc.dump(self.filename, engine=self.source, chunk_size=100) == \
+            250
+        sizes = [len(chunk) for chunk in cc.chunks(self.filename)]
+        assert sizes == [100, 100, 50]
+
+    def test_round_trips_all_comparisons(self):
+        cc.dump(self.filename, engine=self.source, chunk_size=100)
+        assert cc.load(self.filename, engine=self.target) == 250
+        assert comparisons(self.target) == comparisons(self.source)
+
+    def test_does_not_import_known_comparisons(self):
+        cc.dump(self.filename, engine=self.source, chunk_size=100)
+        cc.load(self.filename, engine=self.target)
+        assert cc.load(self.filename, engine=self.target) == 0
+        assert len(comparisons(self.target)) == 250
+
+    def test_loads_old_pickled_dumps(self):
+        cc.dump(self.filename, engine=self.source, chunk_size=100)
+        old = os.path.join(self.directory, 'cc.pickle')
+        with open(old, 'wb') as out:
+            rows = [r for chunk in cc.chunks(self.filename) for r in chunk]
+            pickle.dump(rows, out)
+        assert cc.load(old, engine=self.target) == 250
+        assert comparisons(self.target) == comparisons(self.source)
+
+    def test_rejects_unknown_versions(self):
+        with gzip.open(self.filename, 'wb') as out:
+            out.write(json.dumps({'format': 'chain-chain', 'version': 99}))
+            out.write('\n')
+        with self.assertRaises(ValueError):
+            list(cc.chunks(self.filename))
+
+    def test_fails_on_missing_chains(self):
+        cc.dump(self.filename, engine=self.source, chunk_size=100)
+        self.target.execute("DELETE FROM chain_info WHERE pdb_id = '0003'")
+        with self.assertRaises(ValueError):
+            cc.load(self.filename, engine=self.target)
+
+    def test_can_ignore_missing_chains(self):
+        cc.dump(self.filename, engine=self.source, chunk_size=100)
+        self.target.execute("DELETE FROM chain_info WHERE pdb_id = '0003'")
+        count = cc.load(self.filename, engine=self.target,
+                        ignore_missing=True)
+        assert 0 < count < 250
@@ -0,0 +1,32 @@
+from test import StageTest
+
+from pymotifs.units.atom_counts import Loader
+from pymotifs.units.atom_counts import heavy_atoms
+
+
+class CountingTest(StageTest):
+    def test_counts_only_heavy_atoms(self):
+        coordinates = '\n'.join([
+            'ATOM 1 P P . G A 1 1',
+            'ATOM 2 O OP1 . G A 1 1',
+            'ATOM 3 C "C1\'" . G A 1 1',
+            'ATOM 4 N N9 . G A 1 1',
+            'ATOM 5 H H1 . G A 1 1',
+            'HETATM 6 MG MG . MG A 1 1',
+        ])
+        assert heavy_atoms(coordinates) == 4
+
+    def test_counts_nothing_in_empty_coordinates(self):
+        assert heavy_atoms('') == 0
+
+
+class DataTest(StageTest):
+    loader_class = Loader
+
+    def test_counts_each_unit_with_coordinates(self):
+        data = self.loader.data('1GID')
+        assert len(data) == len(set(d.unit_id for d in data))
+        assert all(d.heavy_atoms >= 0 for d in data)
+
+    def test_it_knows_if_has_no_data(self):
+        assert self.loader.has_data('0GID') is False
@@ -1,5 +1,10 @@
+import numpy as np
+
 from test import StageTest
+from test import CifStageTest
 
+from pymotifs.mat_files import Loader as MatLoader
+from pymotifs.units.redundant import Nucleotide
 from pymotifs.units.redundant import RedundantNucleotidesLoader as Loader
 
 
@@ -30,3 +35,95 @@ class QueryingTest(StageTest):
 
     def test_knows_it_has_no_data(self):
         self.assertFalse(self.loader.has_data('0GID'))
+
+
+def nt(chain, number, center, sequence='G', rotation=None):
+    return Nucleotide(unit_id='1ABC|1|%s|%s|%i' % (chain, sequence, number),
+                      sequence=sequence,
+                      model=1,
+                      chain=chain,
+                      sym_op='1_555',
+                      number=number,
+                      ins_code=None,
+                      center=np.array(center, dtype=float),
+                      rotation=np.eye(3) if rotation is None else rotation)
+
+
+class FindingRedundantTest(StageTest):
+    loader_class = Loader
+
+    def test_finds_overlapping_nucleotides(self):
+        nts = [nt('A', 1, [0, 0, 0]), nt('B', 5, [0.5, 0, 0])]
+        val = self.loader.redundant(nts)
+        ans = [(nts[1].unit_id, nts[0].unit_id),
+               (nts[0].unit_id, nts[1].unit_id)]
+        self.assertEquals(ans, val)
+
+    def test_ignores_overlapping_nucleotides_of_different_types(self):
+        nts = [nt('A', 1, [0, 0, 0]), nt('B', 5, [0.5, 0, 0], sequence='A')]
+        self.assertEquals([], self.loader.redundant(nts))
+
+    def test_finds_copies_moved_as_a_chain(self):
+        turn = np.array([[0, -1, 0], [1, 0, 0], [0, 0, 1]], dtype=float)
+        chain_a = [nt('A', i, [4 * i, 0, 0]) for i in range(3)]
+        chain_b = [nt('B', i, np.dot([4 * i, 0, 0], turn) + 50,
+                      rotation=turn.T) for i in range(3)]
+        val = set(self.loader.redundant(chain_a + chain_b))
+        ans = set()
+        for a, b in zip(chain_a, chain_b):
+            ans.add((a.unit_id, b.unit_id))
+            ans.add((b.unit_id, a.unit_id))
+        self.assertEquals(ans, val)
+
+    def test_ignores_copies_with_different_local_geometry(self):
+        chain_a = [nt('A', i, [4 * i, 0, 0]) for i in range(3)]
+        chain_b = [nt('B', 0, [50, 0, 0]),
+                   nt('B', 1, [54, 0, 0]),
+                   nt('B', 2, [90, 0, 0])]
+        val = self.loader.redundant(chain_a + chain_b)
+        self.assertTrue((chain_a[0].unit_id, chain_b[0].unit_id) in val)
+        self.assertFalse((chain_a[2].unit_id, chain_b[2].unit_id) in val)
+
+    def test_ignores_copies_whose_neighbor_moved_a_few_angstroms(self):
+        chain_a = [nt('A', i, [4 * i, 0, 0]) for i in range(3)]
+        chain_b = [nt('B', 0, [50, 0, 0]),
+                   nt('B', 1, [54, 0, 0]),
+                   nt('B', 2, [64, 0, 0])]
+        val = self.loader.redundant(chain_a + chain_b)
+        self.assertTrue((chain_a[0].unit_id, chain_b[0].unit_id) in val)
+        self.assertFalse((chain_a[1].unit_id, chain_b[1].unit_id) in val)
+        self.assertFalse((chain_a[2].unit_id, chain_b[2].unit_id) in val)
+
+    def test_has_nothing_for_a_single_nucleotide(self):
+        self.assertEquals([], self.loader.redundant([nt('A', 1, [0, 0, 0])]))
+
+
+class ComparingToMatlabTest(CifStageTest):
+    loader_class = Loader
+    filename = 'test/files/cif/1GID.cif'
+
+    def setUp(self):
+        super(ComparingToMatlabTest, self).setUp()
+        nts = self.loader.nucleotides(self.structure)
+        self.val = set(self.loader.redundant(nts))
+        with open('test/files/redundant-nts.csv', 'rb') as raw:
+            data = self.loader._parse(raw, '1GID')
+        self.ans = set((d['unit_id_1'], d['unit_id_2']) for d in data)
+
+    def test_only_finds_pairs_matlab_finds(self):
+        self.assertEquals(set(), self.val - self.ans)
+
+    def test_finds_most_pairs_matlab_finds(self):
+        self.assertTrue(len(self.val) >= 0.9 * len(self.ans))
+
+
+class DependenciesTest(StageTest):
+    loader_class = Loader
+
+    def test_needs_matlab_files_by_default(self):
+        self.assertTrue(MatLoader in Loader.configured_dependencies({}))
+
+    def test_does_not_need_matlab_files_with_python(self):
+        config = {'units.redundant': {'backend': 'python'}}
+        val = Loader.configured_dependencies(config)
+        self.assertFalse(MatLoader in val)
@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from pymotifs.utils import atomic_open
+
+
+class AtomicOpenTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'out.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_it_writes_the_file(self):
+        with atomic_open(self.filename) as out:
+            out.write('a')
+        with open(self.filename, 'rb') as raw:
+            assert raw.read() == 'a'
+
+    def test_it_leaves_nothing_on_failure(self):
+        try:
+            with atomic_open(self.filename) as out:
+                out.write('a')
+                raise ValueError()
+        except ValueError:
+            pass
+        assert os.listdir(self.directory) == []
+
+    def test_it_keeps_old_file_on_failure(self):
+        with open(self.filename, 'wb') as raw:
+            raw.write('old')
+        try:
+            with atomic_open(self.filename) as out:
+                out.write('new')
+                raise ValueError()
+        except ValueError:
+            pass
+        with open(self.filename, 'rb') as raw:
+            assert raw.read() == 'old'
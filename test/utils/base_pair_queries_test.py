@@ -1,4 +1,5 @@
 import pytest
+import unittest as ut
 
 from test import QueryUtilTest
 
@@ -134,3 +135,67 @@ class BetweenChainTest(QueryUtilTest):
     @pytest.mark.skip("No example data yet")
     def test_it_searches_only_in_one_symmetry_operator(self):
         pass
+
+
+class BasePairCountsTest(QueryUtilTest):
+    query_class = st.BasePairQueries
+
+    def test_counts_the_same_as_representative(self):
+        counts = self.db_obj.counts('1J5E')
+        val = counts.representative('A')
+        ans = self.db_obj.representative('1J5E', 'A', count=True)
+        self.assertEquals(ans, val)
+
+    def test_counts_the_same_as_representative_by_family(self):
+        counts = self.db_obj.counts('1J5E')
+        self.assertEquals(4, counts.representative('A', family='tHH'))
+
+    def test_counts_the_same_as_representative_given_symmetry_ops(self):
+        counts = self.db_obj.counts('4PMI', sym_op='6_445')
+        self.assertEquals(15, counts.representative('A', family='cWW'))
+        self.assertEquals(17, counts.representative('A'))
+
+    def test_counts_the_whole_structure(self):
+        counts = self.db_obj.counts('4PMI')
+        self.assertEquals(17, counts.representative(None))
+
+    def test_counts_the_same_as_cross_chain(self):
+        counts = self.db_obj.counts('1ET4')
+        self.assertEquals(3, counts.cross_chain('A'))
+        self.assertEquals(6, counts.cross_chain(['A', 'B']))
+        self.assertEquals(3, counts.cross_chain('A', other_chain='B'))
+        self.assertEquals(0, counts.cross_chain('A', other_chain='D'))
+        self.assertEquals(1, counts.cross_chain('A', other_chain=['B', 'E'],
+                                                family='tWS'))
+
+    def test_gives_zero_for_an_unknown_model(self):
+        counts = self.db_obj.counts('1ET4')
+        self.assertEquals(0, counts.cross_chain('A', model=10))
+
+
+class BasePairCountsGroupingTest(ut.TestCase):
+    def setUp(self):
+        self.counts = st.BasePairCounts([
+            (1, 'A', 'A', 'cWW', True, 10),
+            (1, 'A', 'A', 'cWW', False, 10),
+            (1, 'A', 'A', 'tWH', True, 2),
+            (1, 'A', 'B', 'cWW', False, 3),
+            (1, 'B', 'A', 'cWW', True, 3),
+            (2, 'A', 'A', 'cWW', True, 7),
+        ])
+
+    def test_representative_counts_only_deduplicated_pairs(self):
+        self.assertEquals(12, self.counts.representative('A'))
+
+    def test_representative_can_limit_by_family(self):
+        self.assertEquals(10, self.counts.representative('A', family='cWW'))
+
+    def test_representative_uses_the_given_model(self):
+        self.assertEquals(7, self.counts.representative('A', model=2))
+
+    def test_cross_chain_counts_all_pairs(self):
+        self.assertEquals(3, self.counts.cross_chain('A', other_chain='B'))
+        self.assertEquals(3, self.counts.cross_chain('B', other_chain='A'))
+
+    def test_knows_all_models(self):
+        self.assertEquals(set([1, 2]), self.counts.models)
@@ -0,0 +1,26 @@
+from unittest import TestCase
+
+from sqlalchemy import Table
+from sqlalchemy import Column
+from sqlalchemy import String
+from sqlalchemy import MetaData
+from sqlalchemy.dialects import mysql
+from sqlalchemy.dialects import sqlite
+
+from pymotifs.utils import exact
+
+
+class ExactTests(TestCase):
+    def setUp(self):
+        table = Table('units', MetaData(), Column('chain', String(10)))
+        self.chain = table.c.chain
+
+    def test_it_compares_as_binary_in_mysql(self):
+        val = str((exact(self.chain, 'mysql') == 'a').
+                  compile(dialect=mysql.dialect()))
+        assert val == 'binary(units.chain) = %s'
+
+    def test_it_keeps_the_column_elsewhere(self):
+        val = str((exact(self.chain, 'sqlite') == 'a').
+                  compile(dialect=sqlite.dialect()))
+        assert val == 'units.chain = ?'
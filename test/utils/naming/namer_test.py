@@ -36,6 +36,23 @@ class ParentTest(StageTest):
                                   [self.group3, self.group4])
         self.assertEquals([], val)
 
+    def test_it_indexes_the_groups_of_each_member(self):
+        val = self.loader.index([self.group2, self.group3, self.group4])
+        self.assertEquals(set([0, 1, 2]), set.union(*val.values()))
+        self.assertEquals(set([0, 1, 2]), val['E'])
+        self.assertEquals(set([2]), val['F'])
+        self.assertEquals(set([0]), val['A'])
+
+    def test_it_finds_parents_in_order_using_an_index(self):
+        known = [self.group4, self.group1, self.group3]
+        index = self.loader.index(known)
+        val = self.loader.parents(self.group2, known, index=index)
+        self.assertEquals([
+            {'group': self.group4, 'intersection': set(['E'])},
+            {'group': self.group1, 'intersection': set(['A', 'B'])},
+            {'group': self.group3, 'intersection': set(['D', 'E'])},
+        ], val)
+
 
 class OverlapTest(StageTest):
     loader_class = Namer
@@ -2,6 +2,8 @@ from unittest import TestCase
 
 from fr3d.data import Component
 
+from test import QueryUtilTest
+
 from pymotifs.utils import units
 
 
@@ -26,3 +28,44 @@ class ComputingTheType(TestCase):
     def test_gives_none_otherwise(self):
         component = Component([], sequence='gtp')
         self.assertEquals(None, units.component_type(component))
+
+
+class TranslatorTest(QueryUtilTest):
+    query_class = units.Translator
+
+    def known(self):
+        self.db_obj.mapping = {
+            '2GDI_AU_1_X_20_U_': '2GDI|1|X|U|20',
+            '2GDI_AU_1_X_21_G_': '2GDI|1|X|G|21',
+            '1S72_AU_1_0_5_C_': '1S72|1|0|C|5',
+        }
+        self.db_obj.loaded.update(['2GDI', '1S72'])
+
+    def test_gets_the_pdb_of_an_old_id(self):
+        self.assertEquals('2GDI', units.old_pdb('2GDI_AU_1_X_20_U_'))
+
+    def test_translates_a_string_in_order(self):
+        self.known()
+        val = self.db_obj.translate('2GDI_AU_1_X_21_G_,2GDI_AU_1_X_20_U_')
+        self.assertEquals(['2GDI|1|X|G|21', '2GDI|1|X|U|20'], val)
+
+    def test_uses_known_translations_without_the_database(self):
+        self.known()
+        self.db_obj.session = None
+        val = self.db_obj(['1S72_AU_1_0_5_C_'])
+        self.assertEquals(['1S72|1|0|C|5'], val)
+
+    def test_translates_many_lists(self):
+        self.known()
+        val = self.db_obj.translate_many(['2GDI_AU_1_X_20_U_',
+                                          ['1S72_AU_1_0_5_C_']])
+        self.assertEquals([['2GDI|1|X|U|20'], ['1S72|1|0|C|5']], val)
+
+    def test_fails_on_unknown_ids(self):
+        self.assertRaises(units.TranslationFailed, self.db_obj.translate,
+                          ['0000_AU_1_A_1_A_'])
+
+    def test_preloading_only_loads_the_given_structure(self):
+        self.db_obj.preload(['1S72'])
+        self.assertEquals(set(['1S72']), self.db_obj.loaded)
+        assert all(k.startswith('1S72_') for k in self.db_obj.mapping)